@@ -98,11 +98,8 @@ class ClusterProblem(AbstractConnectivityProblem):
             return
 
         # build a tree based on distance from master
-        self.length_to_master = nx.shortest_path_length(
-            self.graph_tran,
-            source=None,
-            target=self.graph.agents[self.master],
-            weight=None,
+        self.length_to_master = self.graph.distance_oracle().lengths(
+            self.graph.agents[self.master], reverse=True
         )
         self.node_children_dict = {v: set() for v in self.graph.nodes}
         for v in self.graph.nodes:
@@ -144,12 +141,11 @@ class ClusterProblem(AbstractConnectivityProblem):
         ).union(master_nodes)
 
         evac = {}
+        oracle = self.graph.distance_oracle(weighted=True)
 
         for r, v in self.graph.agents.items():
             if r in tofront_data.cs.agent_clusters[c]:
-                _, path = nx.multi_source_dijkstra(
-                    self.graph_tran, sources=active_nodes, target=v, weight="weight"
-                )
+                _, path = oracle.nearest(active_nodes, v)
                 path = path[::-1]
                 evac[r] = path
 
@@ -479,21 +475,18 @@ def agent_clustering(cp, num_clusters):
     for r, v in da_agents:
         da_graph.add_node(r)
 
+    oracle = cp.graph.distance_oracle(weighted=True)
     for (r1, v1), (r2, v2) in product(da_agents, da_agents):
         if r1 == r2:
             add_path = False
         else:
             add_path = True
-            sh_path = nx.shortest_path(
-                cp.graph_tran, source=v1, target=v2, weight="weight"
-            )
+            sh_path = oracle.path(v1, v2)
             for v in sh_path:
                 if v in dynamic_agent_nodes and v != v1 and v != v2:
                     add_path = False
         if add_path:
-            w = nx.shortest_path_length(
-                cp.graph_tran, source=v1, target=v2, weight="weight"
-            )
+            w = oracle.distance(v1, v2)
             da_graph.add_edge(r1, r2, weight=w)
 
     # add small weight to every edge to prevent divide by zero. (w += 0.1 -> agents in same node has 10 similarity)
@@ -525,9 +518,7 @@ def agent_clustering(cp, num_clusters):
     for (r, v) in cp.graph_tran.agents.items():
         added = False
         if r in cp.static_agents:
-            start_node = nx.multi_source_dijkstra(
-                cp.graph_tran, sources=dynamic_agent_nodes, target=v
-            )[1][0]
+            start_node = oracle.nearest(dynamic_agent_nodes, v)[1][0]
             for c in agent_clusters:
                 for rc in agent_clusters[c]:
                     if start_node == cp.graph_tran.agents[rc] and not added:
@@ -563,6 +554,7 @@ def inflate_agent_clusters(cp, cs):
 
     child_clusters = {c: set() for c in cs.agent_clusters.keys()}
     parent_clusters = {}
+    oracle = cp.graph.distance_oracle(weighted=True)
 
     # start with master cluster active
     active_clusters = [
@@ -625,9 +617,7 @@ def inflate_agent_clusters(cp, cs):
 
             for n in neighbors & c_neighbors:
 
-                dist, _ = nx.multi_source_dijkstra(
-                    cp.graph_tran, sources=agent_positions, target=n
-                )
+                dist, _ = oracle.nearest(agent_positions, n)
                 if dist < min_dist:
                     min_dist, new_node, new_cluster = dist, n, c
 
@@ -722,6 +712,14 @@ def problem_size(graph, cs, verbose=False):
         cluster_size  : dict(c : int)
     """
 
+    # edges in the subgraphs of all clusters
+    clusters = list(cs.subgraphs)
+    node_lists = [cs.subgraphs[c] for c in clusters]
+    Et_all = graph.number_of_induced_edges(node_lists, "transition")
+    Ec_all = graph.number_of_induced_edges(node_lists, "connectivity")
+    tran_count = dict(zip(clusters, Et_all))
+    conn_count = dict(zip(clusters, Ec_all))
+
     cluster_size = {}
     for c in cs.subgraphs:
 
@@ -732,11 +730,11 @@ def problem_size(graph, cs, verbose=False):
         # number of occupied nodes
         Rp = len(set(v for r, v in graph.agents.items() if r in cs.agent_clusters[c]))
         # number of transition edges
-        Et = graph.number_of_tran_edges(cs.subgraphs[c])
+        Et = int(tran_count[c])
         # number of connectivity edges
-        Ec = graph.number_of_conn_edges(cs.subgraphs[c])
+        Ec = int(conn_count[c])
         # graph diameter
-        D = nx.diameter(nx.subgraph(graph, cs.subgraphs[c]))
+        D = graph.diameter(cs.subgraphs[c])
 
         T = int(max(D / 2, D - int(Rp / 2)))
 
@@ -760,6 +758,7 @@ def kill_largest_frontiers(cp, cs):
 
     # find frontier furthest away from master for large problems
     cluster_size = problem_size(cp.graph, cs)
+    oracle = cp.graph.distance_oracle(weighted=True)
 
     initial_dead = set()
 
@@ -781,9 +780,7 @@ def kill_largest_frontiers(cp, cs):
         max_length = None
         max_frontier = None
         for f in frontiers:
-            length, _ = nx.single_source_dijkstra(
-                cp.graph_tran, source=master_node, target=f
-            )
+            length = oracle.distance(master_node, f)
             if max_length == None:
                 max_length = length
                 max_frontier = f
@@ -48,4 +48,4 @@ def constraint_static_master(problem, master):
     A_iq = sp.coo_matrix(
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
-    return Constraint(A_iq=A_iq, b_iq=b_iq)
+    return Constraint(A_iq=A_iq, b_iq=b_iq, name="static_master")
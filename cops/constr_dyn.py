@@ -18,23 +18,34 @@ def generate_powerset_dynamic_constraints(problem):
     c_29 = _dynamic_constraint_29(problem)
     c_30 = _dynamic_constraint_30(problem)
     c_static = _dynamic_constraint_static(problem)
+    c_final = _dynamic_constraint_final_position(problem)
 
-    return c_27 & c_28 & c_29 & c_30 & c_static
+    return c_27 & c_28 & c_29 & c_30 & c_static & c_final
 
 
-def generate_flow_dynamic_constraints(problem):
+def generate_flow_dynamic_constraints(
+    problem, node_times=None, edge_times=None, terminal=True
+):
+    """constraints on z, xf for node times (default 0..T) and transition
+       times (default 0..T-1), plus the terminal-time constraints if `terminal`"""
 
     # Define number of variables
     if problem.num_vars == None:
         problem.compute_num_var()
 
     # Setup constraints
-    c_46 = _dynamic_constraint_46(problem)
-    c_47 = _dynamic_constraint_47(problem)
-    c_static = _dynamic_constraint_static(problem)
-    c_agent_avoid = _dynamic_constraint_agent_avoidance(problem)
+    c_46 = _dynamic_constraint_46(problem, edge_times)
+    c_47 = _dynamic_constraint_47(problem, edge_times)
+    c_static = _dynamic_constraint_static(problem, node_times)
+    c_agent_avoid = _dynamic_constraint_agent_avoidance(
+        problem, node_times, edge_times
+    )
+
+    ret = c_46 & c_47 & c_static & c_agent_avoid
+    if terminal:
+        ret &= _dynamic_constraint_final_position(problem)
 
-    return c_46 & c_47 & c_static & c_agent_avoid
+    return ret
 
 
 def generate_initial_constraints(problem):
@@ -45,17 +56,18 @@ def generate_initial_constraints(problem):
     b_init = []
 
     constraint_idx = 0
-    for r, v in product(problem.graph.agents, problem.graph.nodes):
+    # agents of a unit share their initial position
+    for unit, v in product(problem.agent_units, problem.graph.nodes):
         A_init_row.append(constraint_idx)
-        A_init_col.append(problem.get_z_idx(r, v, 0))
+        A_init_col.append(problem.get_z_idx(unit[0], v, 0))
         A_init_data.append(1)
-        b_init.append(1 if problem.graph.agents[r] == v else 0)
+        b_init.append(len(unit) if problem.graph.agents[unit[0]] == v else 0)
         constraint_idx += 1
     A_init = sp.coo_matrix(
         (A_init_data, (A_init_row, A_init_col)),
         shape=(constraint_idx, problem.num_vars),
     )
-    return Constraint(A_eq=A_init, b_eq=b_init)
+    return Constraint(A_eq=A_init, b_eq=b_init, name="initial")
 
 
 # Powerset#################################################
@@ -64,160 +76,160 @@ def generate_initial_constraints(problem):
 
 def _dynamic_constraint_27(problem):
     # Constructing A_eq and b_eq for equality for agent existence as sp.coo matrix
-    A_eq_row = []
-    A_eq_col = []
-    A_eq_data = []
+    t, r, v = np.meshgrid(
+        np.arange(problem.T + 1),
+        np.arange(problem.num_r),
+        np.arange(problem.num_v),
+        indexing="ij",
+    )
+    constraint_idx = (problem.T + 1) * problem.num_r
 
-    constraint_idx = 0
-    for t, r in product(range(problem.T + 1), problem.graph.agents):
-        for v in problem.graph.nodes:
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_z_idx(r, v, t))
-            A_eq_data.append(1)
-        constraint_idx += 1
-    A_eq_27 = sp.coo_matrix(
-        (A_eq_data, (A_eq_row, A_eq_col)), shape=(constraint_idx, problem.num_vars)
+    A_eq_row = np.repeat(np.arange(constraint_idx), problem.num_v)
+    A_eq_col = _z_idx(problem, r, v, t).ravel()
+    A_eq_data = np.ones(len(A_eq_col), dtype=int)
+    A_eq_27 = _coo_matrix(
+        A_eq_data, A_eq_row, A_eq_col, (constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_eq=A_eq_27, b_eq=np.ones(constraint_idx))
+    return Constraint(A_eq=A_eq_27, b_eq=np.ones(constraint_idx), name="27")
 
 
 def _dynamic_constraint_28(problem):
-    A_eq_row = []
-    A_eq_col = []
-    A_eq_data = []
-
-    constraint_idx = 0
-    for t, v in product(range(problem.T), problem.graph.nodes):
-        for r in problem.graph.agents:
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_z_idx(r, v, t + 1))
-            A_eq_data.append(1)
-        for edge in problem.graph.tran_in_edges(v):
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_e_idx(edge[0], edge[1], t))
-            A_eq_data.append(-1)
-        constraint_idx += 1
-    A_eq_27 = sp.coo_matrix(
-        (A_eq_data, (A_eq_row, A_eq_col)), shape=(constraint_idx, problem.num_vars)
+    count, edge_k, _ = _tran_pattern(problem, out=False)
+    constraint_idx, row, t, v, _, head, edge = _layered_rows(
+        range(problem.T), count, 1, problem.num_r
     )
+    is_head = head >= 0
 
-    return Constraint(A_eq=A_eq_27, b_eq=np.zeros(constraint_idx))
+    A_eq_col = np.empty(len(row), dtype=int)
+    A_eq_col[is_head] = _z_idx(problem, head[is_head], v[is_head], t[is_head] + 1)
+    A_eq_col[~is_head] = _e_idx(problem, edge_k[edge[~is_head]], t[~is_head])
+    A_eq_data = np.where(is_head, 1, -1)
+    A_eq_27 = _coo_matrix(A_eq_data, row, A_eq_col, (constraint_idx, problem.num_vars))
 
+    return Constraint(A_eq=A_eq_27, b_eq=np.zeros(constraint_idx), name="28")
 
-def _dynamic_constraint_29(problem):
-    A_eq_row = []
-    A_eq_col = []
-    A_eq_data = []
 
-    constraint_idx = 0
-    for t, v in product(range(problem.T), problem.graph.nodes):
-        for r in problem.graph.agents:
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_z_idx(r, v, t))
-            A_eq_data.append(1)
-        for edge in problem.graph.tran_out_edges(v):
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_e_idx(edge[0], edge[1], t))
-            A_eq_data.append(-1)
-        constraint_idx += 1
-    A_eq_45 = sp.coo_matrix(
-        (A_eq_data, (A_eq_row, A_eq_col)), shape=(constraint_idx, problem.num_vars)
+def _dynamic_constraint_29(problem):
+    count, edge_k, _ = _tran_pattern(problem, out=True)
+    constraint_idx, row, t, v, _, head, edge = _layered_rows(
+        range(problem.T), count, 1, problem.num_r
     )
+    is_head = head >= 0
+
+    A_eq_col = np.empty(len(row), dtype=int)
+    A_eq_col[is_head] = _z_idx(problem, head[is_head], v[is_head], t[is_head])
+    A_eq_col[~is_head] = _e_idx(problem, edge_k[edge[~is_head]], t[~is_head])
+    A_eq_data = np.where(is_head, 1, -1)
+    A_eq_45 = _coo_matrix(A_eq_data, row, A_eq_col, (constraint_idx, problem.num_vars))
 
-    return Constraint(A_eq=A_eq_45, b_eq=np.zeros(constraint_idx))
+    return Constraint(A_eq=A_eq_45, b_eq=np.zeros(constraint_idx), name="29")
 
 
 def _dynamic_constraint_30(problem):
     # Constructing A_eq and b_eq for identity dynamics as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+    count, _, nbr = _tran_pattern(problem, out=True)
+    constraint_idx, row, t, v, r, head, edge = _layered_rows(
+        range(problem.T), count, problem.num_r, 1
+    )
+    is_head = head >= 0
 
-    constraint_idx = 0
-    for t, v, r in product(range(problem.T), problem.graph.nodes, problem.graph.agents):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_z_idx(r, v, t))
-        A_iq_data.append(1)
-        for edge in problem.graph.tran_out_edges(v):
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_z_idx(r, edge[1], t + 1))
-            A_iq_data.append(-1)
-        constraint_idx += 1
-    A_iq_46 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    A_iq_col = np.empty(len(row), dtype=int)
+    A_iq_col[is_head] = _z_idx(problem, r[is_head], v[is_head], t[is_head])
+    A_iq_col[~is_head] = _z_idx(
+        problem, r[~is_head], nbr[edge[~is_head]], t[~is_head] + 1
     )
+    A_iq_data = np.where(is_head, 1, -1)
+    A_iq_46 = _coo_matrix(A_iq_data, row, A_iq_col, (constraint_idx, problem.num_vars))
 
-    return Constraint(A_iq=A_iq_46, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_46, b_iq=np.zeros(constraint_idx), name="30")
 
 
 # Flow#####################################################
 ##########################################################
 
-def _dynamic_constraint_46(problem):
-    A_eq_row = []
-    A_eq_col = []
-    A_eq_data = []
+def _dynamic_constraint_46(problem, times=None):
+    if times is None:
+        times = range(problem.T)
 
-    constraint_idx = 0
-    for t, v, r in product(range(problem.T), problem.graph.nodes, problem.graph.agents):
-        A_eq_row.append(constraint_idx)
-        A_eq_col.append(problem.get_z_idx(r, v, t + 1))
-        A_eq_data.append(1)
-        for edge in problem.graph.tran_in_edges(v):
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_xf_idx(r, edge[0], edge[1], t))
-            A_eq_data.append(-1)
-        constraint_idx += 1
-    A_eq_46 = sp.coo_matrix(
-        (A_eq_data, (A_eq_row, A_eq_col)), shape=(constraint_idx, problem.num_vars)
+    count, edge_k, _ = _tran_pattern(problem, out=False)
+    constraint_idx, row, t, v, r, head, edge = _layered_rows(
+        times, count, problem.num_units, 1
     )
-    return Constraint(A_eq=A_eq_46, b_eq=np.zeros(constraint_idx))
+    is_head = head >= 0
 
+    A_eq_col = np.empty(len(row), dtype=int)
+    A_eq_col[is_head] = _z_idx(problem, r[is_head], v[is_head], t[is_head] + 1)
+    A_eq_col[~is_head] = _xf_idx(
+        problem, r[~is_head], edge_k[edge[~is_head]], t[~is_head]
+    )
+    A_eq_data = np.where(is_head, 1, -1)
+    A_eq_46 = _coo_matrix(A_eq_data, row, A_eq_col, (constraint_idx, problem.num_vars))
+    return Constraint(A_eq=A_eq_46, b_eq=np.zeros(constraint_idx), name="46")
 
-def _dynamic_constraint_47(problem):
-    A_eq_row = []
-    A_eq_col = []
-    A_eq_data = []
 
-    constraint_idx = 0
-    for t, v, r in product(range(problem.T), problem.graph.nodes, problem.graph.agents):
-        A_eq_row.append(constraint_idx)
-        A_eq_col.append(problem.get_z_idx(r, v, t))
-        A_eq_data.append(1)
-        for edge in problem.graph.tran_out_edges(v):
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_xf_idx(r, edge[0], edge[1], t))
-            A_eq_data.append(-1)
-        constraint_idx += 1
-    A_eq_47 = sp.coo_matrix(
-        (A_eq_data, (A_eq_row, A_eq_col)), shape=(constraint_idx, problem.num_vars)
+def _dynamic_constraint_47(problem, times=None):
+    if times is None:
+        times = range(problem.T)
+
+    count, edge_k, _ = _tran_pattern(problem, out=True)
+    constraint_idx, row, t, v, r, head, edge = _layered_rows(
+        times, count, problem.num_units, 1
     )
-    return Constraint(A_eq=A_eq_47, b_eq=np.zeros(constraint_idx))
+    is_head = head >= 0
+
+    A_eq_col = np.empty(len(row), dtype=int)
+    A_eq_col[is_head] = _z_idx(problem, r[is_head], v[is_head], t[is_head])
+    A_eq_col[~is_head] = _xf_idx(
+        problem, r[~is_head], edge_k[edge[~is_head]], t[~is_head]
+    )
+    A_eq_data = np.where(is_head, 1, -1)
+    A_eq_47 = _coo_matrix(A_eq_data, row, A_eq_col, (constraint_idx, problem.num_vars))
+    return Constraint(A_eq=A_eq_47, b_eq=np.zeros(constraint_idx), name="47")
 
 
 # Features#################################################
 ##########################################################
 
 
-def _dynamic_constraint_static(problem):
+def _dynamic_constraint_static(problem, times=None):
     # Constructing A_eq and b_eq for dynamic condition on static agents as sp.coo matrix
+    if times is None:
+        times = range(problem.T + 1)
+
+    # Enforce static agents to be static
+    agent = np.array([problem.dict_agent[r] for r in problem.static_agents], dtype=int)
+    start = np.array(
+        [problem.dict_node[problem.graph.agents[r]] for r in problem.static_agents],
+        dtype=int,
+    )
+    t, k, v = np.meshgrid(
+        np.asarray(times, dtype=int),
+        np.arange(len(agent)),
+        np.arange(problem.num_v),
+        indexing="ij",
+    )
+    constraint_idx = t.size
+
+    A_stat_row = np.arange(constraint_idx)
+    A_stat_col = _z_idx(problem, agent[k], v, t).ravel()
+    A_stat_data = np.ones(constraint_idx, dtype=int)
+    b_stat = (v == start[k]).ravel().astype(int)
+
+    A_stat = _coo_matrix(
+        A_stat_data, A_stat_row, A_stat_col, (constraint_idx, problem.num_vars)
+    )
+    return Constraint(A_eq=A_stat, b_eq=b_stat, name="static")
+
+
+def _dynamic_constraint_final_position(problem):
+    # Constructing A_eq and b_eq for final positions at time T as sp.coo matrix
     A_stat_row = []
     A_stat_col = []
     A_stat_data = []
     b_stat = []
 
     constraint_idx = 0
-    # Enforce static agents to be static
-    for t, r, v in product(
-        range(problem.T + 1), problem.static_agents, problem.graph.nodes
-    ):
-        A_stat_row.append(constraint_idx)
-        A_stat_col.append(problem.get_z_idx(r, v, t))
-        A_stat_data.append(1)
-        b_stat.append(1 if problem.graph.agents[r] == v else 0)
-        constraint_idx += 1
-
     if problem.final_position:
         # Enforce final position for agents
         for r, v in problem.final_position.items():
@@ -229,12 +241,17 @@ def _dynamic_constraint_static(problem):
     A_stat = sp.coo_matrix(
         (A_stat_data, (A_stat_row, A_stat_col)),
         shape=(constraint_idx, problem.num_vars),
-    )  # .toarray(
-    return Constraint(A_eq=A_stat, b_eq=b_stat)
+    )
+    return Constraint(A_eq=A_stat, b_eq=b_stat, name="final_position")
 
 
-def _dynamic_constraint_agent_avoidance(problem):
+def _dynamic_constraint_agent_avoidance(problem, node_times=None, edge_times=None):
     # Constructing A_iq and b_iq for agent avoidance as sp.coo matrix
+    if node_times is None:
+        node_times = range(problem.T + 1)
+    if edge_times is None:
+        edge_times = range(problem.T)
+
     A_row = []
     A_col = []
     A_data = []
@@ -243,7 +260,7 @@ def _dynamic_constraint_agent_avoidance(problem):
 
     # Constraint (56)
     for t, v, (r1, r2) in product(
-        range(problem.T + 1), problem.graph.nodes, combinations(problem.big_agents, 2)
+        node_times, problem.graph.nodes, combinations(problem.big_agents, 2)
     ):
 
         if problem.graph.nodes[v]["small"]:
@@ -265,7 +282,7 @@ def _dynamic_constraint_agent_avoidance(problem):
 
     # Constraint (57)
     for t, (v1, v2), (r1, r2) in product(
-        range(problem.T),
+        edge_times,
         problem.graph.tran_edges(),
         combinations(problem.big_agents, 2),
     ):
@@ -295,4 +312,78 @@ def _dynamic_constraint_agent_avoidance(problem):
     A = sp.coo_matrix(
         (A_data, (A_row, A_col)), shape=(constraint_idx, problem.num_vars)
     )  # .toarray(
-    return Constraint(A_iq=A, b_iq=np.ones(constraint_idx))
+    return Constraint(A_iq=A, b_iq=np.ones(constraint_idx), name="agent_avoidance")
+
+
+# Helpers##################################################
+##########################################################
+
+
+def _tran_pattern(problem, out):
+    """
+    Transition edges of all nodes, in the order of graph.nodes and of
+    tran_out_edges (out=True) or tran_in_edges (out=False). Returns the
+    arrays (count, edge_k, nbr): the number of edges of each node and, per
+    edge, its index in dict_tran and the node index of its other end.
+    """
+    index = problem.graph.edge_index("transition")
+    if out:
+        ptr, edge_k = index.out_ptr, index.out_edge
+    else:
+        ptr, edge_k = index.in_ptr, index.in_edge
+    nbr = index.ends[edge_k, 1 if out else 0]
+    return np.diff(ptr), edge_k, nbr
+
+
+def _layered_rows(times, count, rows_per_node, heads_per_row):
+    """
+    Entries of the rows over product(times, nodes, range(rows_per_node)) in
+    loop order, where each row has `heads_per_row` head entries followed by
+    the count[v] edge entries of its node v. Returns the number of rows and
+    the arrays (row, t, v, a, head, edge) per entry, where a is the index in
+    range(rows_per_node), head the head index (-1 for edge entries) and edge
+    the index into the _tran_pattern arrays (-1 for head entries).
+    """
+    first_edge = np.cumsum(count) - count
+
+    # one time layer
+    row_v = np.repeat(np.arange(len(count)), rows_per_node)
+    row_a = np.tile(np.arange(rows_per_node), len(count))
+    length = heads_per_row + count[row_v]
+    row = np.repeat(np.arange(len(row_v)), length)
+    pos = np.arange(len(row)) - np.repeat(np.cumsum(length) - length, length)
+    is_head = pos < heads_per_row
+    head = np.where(is_head, pos, -1)
+    edge = np.where(is_head, -1, first_edge[row_v[row]] + pos - heads_per_row)
+    v = row_v[row]
+    a = row_a[row]
+
+    # repeat the layer for all times
+    times = np.asarray(times, dtype=int)
+    row = (len(row_v) * np.arange(len(times))[:, None] + row).ravel()
+    t = np.repeat(times, len(v))
+    v, a, head, edge = (np.tile(x, len(times)) for x in (v, a, head, edge))
+    return len(times) * len(row_v), row, t, v, a, head, edge
+
+
+def _coo_matrix(data, row, col, shape):
+    """sp.coo_matrix with integer data, or float data if there are no entries
+    like a matrix built from empty lists"""
+    if len(data) == 0:
+        data = np.zeros(0)
+    return sp.coo_matrix((data, (row, col)), shape=shape)
+
+
+def _z_idx(problem, r, v, t):
+    """vectorized get_z_idx for agent indices r and node indices v"""
+    return problem.layout.idx("z", t, v, r)
+
+
+def _xf_idx(problem, r, k, t):
+    """vectorized get_xf_idx for agent indices r and transition edge indices k"""
+    return problem.layout.idx("xf", t, r, k)
+
+
+def _e_idx(problem, k, t):
+    """vectorized get_e_idx for transition edge indices k"""
+    return problem.layout.idx("e", t, k)
@@ -4,164 +4,183 @@ import numpy as np
 import scipy.sparse as sp
 
 from cops.optimization_wrappers import Constraint
+from cops.constr_dyn import _coo_matrix, _xf_idx, _z_idx
 
 
-def generate_flow_bridge_constraints(problem):
+def generate_flow_bridge_constraints(
+    problem, node_times=None, edge_times=None, terminal=True
+):
+    """constraints on z, xf, f, fbar, y for node times (default 0..T) and
+       transition times (default 0..T-1), plus constraint (50) if `terminal`"""
 
-    c_48 = _dynamic_constraint_48(problem)
-    c_49 = _dynamic_constraint_49(problem)
-    c_50 = _dynamic_constraint_50(problem)
+    c_48 = _dynamic_constraint_48(problem, node_times)
+    c_49 = _dynamic_constraint_49(problem, edge_times)
 
-    return c_48 & c_49 & c_50
+    ret = c_48 & c_49
+    if terminal:
+        ret &= _dynamic_constraint_50(problem)
 
+    return ret
 
-def generate_flow_connectivity_constraints(problem):
 
-    c_52_53 = _dynamic_constraint_52_53(problem)
+def generate_flow_connectivity_constraints(problem, edge_times=None, terminal=True):
+    """flow conservation (52, 53) at times in edge_times (default 0..T-1),
+       plus the terminal time T if `terminal`"""
+
+    if edge_times is None:
+        edge_times = range(problem.T)
+
+    c_52_53 = _dynamic_constraint_52_53(problem, edge_times)
+    if terminal:
+        c_52_53 &= _dynamic_constraint_52_53(problem, [problem.T])
 
     return c_52_53
 
 
-def generate_flow_master_constraints(problem):
+def generate_flow_master_constraints(
+    problem, node_times=None, edge_times=None, terminal=True
+):
+    """master constraints for node times (default 0..T) and transition times
+       (default 0..T-1), plus the terminal-time constraints if `terminal`.
+
+       With problem.cumulative_master the sums over earlier times in (55),
+       (58) and the outflow bound are replaced by the cumulative master
+       information variables mc, which have O(T) nonzeros per node"""
+
+    if edge_times is None:
+        edge_times = range(problem.T)
+
+    c_48 = _dynamic_constraint_48_m(problem, node_times)
+    c_49 = _dynamic_constraint_49_m(problem, edge_times)
+    c_54 = _dynamic_constraint_54(problem, edge_times)
+
+    if problem.cumulative_master:
+        c_mc = _dynamic_constraint_master_info(problem, edge_times)
+        c_55 = _dynamic_constraint_55_cumulative(problem, node_times)
+        c_59 = _dynamic_constraint_outflow_bound_cumulative(problem, edge_times)
+        ret = c_48 & c_49 & c_54 & c_mc & c_55 & c_59
+    else:
+        c_55 = _dynamic_constraint_55(problem, node_times)
+        c_59 = _dynamic_constraint_outflow_bound(problem, edge_times)
+        ret = c_48 & c_49 & c_54 & c_55 & c_59
+
+    if terminal:
+        ret &= _dynamic_constraint_54(problem, [problem.T])
+        if problem.cumulative_master:
+            ret &= _dynamic_constraint_master_info(problem, [problem.T])
+            ret &= _dynamic_constraint_58_cumulative(problem)
+            ret &= _dynamic_constraint_outflow_bound_cumulative(problem, [problem.T])
+        else:
+            ret &= _dynamic_constraint_58(problem)
+            ret &= _dynamic_constraint_outflow_bound(problem, [problem.T])
+
+    return ret
+
 
-    c_48 = _dynamic_constraint_48_m(problem)
-    c_49 = _dynamic_constraint_49_m(problem)
-    c_54 = _dynamic_constraint_54(problem)
-    c_55 = _dynamic_constraint_55(problem)
-    c_58 = _dynamic_constraint_58(problem)
-    c_59 = _dynamic_constraint_outflow_bound(problem)
+def generate_flow_finish_constraints(problem):
+    """constraints on d, xf for the minimum-horizon formulation: d(t) is 1 if
+       the mission is finished at or before t, it is monotone and 1 at T,
+       and agents do not move after the mission is finished"""
 
-    return c_48 & c_49 & c_54 & c_55 & c_58 & c_59
+    return _finish_constraint_monotone(problem) & _finish_constraint_freeze(problem)
 
 
 ##########################################################
 ##########################################################
 
 
-def _dynamic_constraint_48(problem):
+def _dynamic_constraint_48(problem, times=None):
     # Constructing A_eq and b_eq for equality (48) as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+    if times is None:
+        times = range(problem.T + 1)
 
     N = len(problem.graph.agents)
+    k, ends = _edge_arrays(problem, problem.graph.conn_edges(), problem.dict_conn)
 
-    constraint_idx = 0
-    for t, b, (v1, v2) in product(
-        range(problem.T + 1), range(problem.num_min_src_snk), problem.graph.conn_edges()
-    ):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_fbar_idx(b, v1, v2, t))
-        A_iq_data.append(1)
-        for r in problem.graph.agents:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_z_idx(r, v1, t))
-            A_iq_data.append(-N)
-        constraint_idx += 1
-
-    for t, b, (v1, v2) in product(
-        range(problem.T + 1), range(problem.num_min_src_snk), problem.graph.conn_edges()
-    ):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_fbar_idx(b, v1, v2, t))
-        A_iq_data.append(1)
-        for r in problem.graph.agents:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_z_idx(r, v2, t))
-            A_iq_data.append(-N)
-        constraint_idx += 1
+    # rows (end, t, b, edge), fbar_b(edge, t) - N * sum_r z_r(end, t) <= 0
+    t = np.asarray(times, dtype=int)[None, :, None, None, None]
+    b = np.arange(problem.num_min_src_snk)[None, None, :, None, None]
+    head = _fbar_idx(problem, b, k[None, None, None, :, None], t)
+    r = np.arange(problem.num_units)
+    tail = _z_idx(problem, r, ends[:, None, None, :, None], t)
 
-    A_iq_48 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    constraint_idx, A_iq_row, A_iq_col, A_iq_data = _head_tail_entries(
+        head, tail, 1, -N
     )
-    return Constraint(A_iq=A_iq_48, b_iq=np.zeros(constraint_idx))
+    A_iq_48 = _coo_matrix(
+        A_iq_data, A_iq_row, A_iq_col, (constraint_idx, problem.num_vars)
+    )
+    return Constraint(A_iq=A_iq_48, b_iq=np.zeros(constraint_idx), name="48")
 
 
-def _dynamic_constraint_48_m(problem):
+def _dynamic_constraint_48_m(problem, times=None):
     # Constructing A_eq and b_eq for equality (48) for master as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+    if times is None:
+        times = range(problem.T + 1)
 
     N = len(problem.graph.agents)
+    k, ends = _edge_arrays(problem, problem.graph.conn_edges(), problem.dict_conn)
 
-    constraint_idx = 0
-    for t, (v1, v2) in product(range(problem.T + 1), problem.graph.conn_edges()):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_mbar_idx(v1, v2, t))
-        A_iq_data.append(1)
-        for r in problem.graph.agents:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_z_idx(r, v1, t))
-            A_iq_data.append(-N)
-        constraint_idx += 1
-
-    for t, (v1, v2) in product(range(problem.T + 1), problem.graph.conn_edges()):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_mbar_idx(v1, v2, t))
-        A_iq_data.append(1)
-        for r in problem.graph.agents:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_z_idx(r, v2, t))
-            A_iq_data.append(-N)
-        constraint_idx += 1
+    # rows (end, t, edge), mbar(edge, t) - N * sum_r z_r(end, t) <= 0
+    t = np.asarray(times, dtype=int)[None, :, None, None]
+    head = _mbar_idx(problem, k[None, None, :, None], t)
+    r = np.arange(problem.num_units)
+    tail = _z_idx(problem, r, ends[:, None, :, None], t)
 
-    A_iq_48 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    constraint_idx, A_iq_row, A_iq_col, A_iq_data = _head_tail_entries(
+        head, tail, 1, -N
     )
-    return Constraint(A_iq=A_iq_48, b_iq=np.zeros(constraint_idx))
+    A_iq_48 = _coo_matrix(
+        A_iq_data, A_iq_row, A_iq_col, (constraint_idx, problem.num_vars)
+    )
+    return Constraint(A_iq=A_iq_48, b_iq=np.zeros(constraint_idx), name="48_m")
 
 
-def _dynamic_constraint_49(problem):
+def _dynamic_constraint_49(problem, times=None):
     # Constructing A_eq and b_eq for equality (49) as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+    if times is None:
+        times = range(problem.T)
 
     N = len(problem.graph.agents)
+    k, _ = _edge_arrays(problem, problem.graph.tran_edges(), problem.dict_tran)
 
-    constraint_idx = 0
-    for t, b, (v1, v2) in product(
-        range(problem.T), range(problem.num_min_src_snk), problem.graph.tran_edges()
-    ):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_f_idx(b, v1, v2, t))
-        A_iq_data.append(1)
-        for r in problem.graph.agents:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_xf_idx(r, v1, v2, t))
-            A_iq_data.append(-N)
-        constraint_idx += 1
+    # rows (t, b, edge), f_b(edge, t) - N * sum_r xf_r(edge, t) <= 0
+    t = np.asarray(times, dtype=int)[:, None, None, None]
+    b = np.arange(problem.num_min_src_snk)[None, :, None, None]
+    head = _f_idx(problem, b, k[None, None, :, None], t)
+    r = np.arange(problem.num_units)
+    tail = _xf_idx(problem, r, k[None, None, :, None], t)
 
-    A_iq_49 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    constraint_idx, A_iq_row, A_iq_col, A_iq_data = _head_tail_entries(
+        head, tail, 1, -N
+    )
+    A_iq_49 = _coo_matrix(
+        A_iq_data, A_iq_row, A_iq_col, (constraint_idx, problem.num_vars)
     )
-    return Constraint(A_iq=A_iq_49, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_49, b_iq=np.zeros(constraint_idx), name="49")
 
 
-def _dynamic_constraint_49_m(problem):
+def _dynamic_constraint_49_m(problem, times=None):
     # Constructing A_eq and b_eq for equality (49) as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+    if times is None:
+        times = range(problem.T)
 
     N = len(problem.graph.agents)
+    k, _ = _edge_arrays(problem, problem.graph.tran_edges(), problem.dict_tran)
 
-    constraint_idx = 0
-    for t, (v1, v2) in product(range(problem.T), problem.graph.tran_edges()):
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_m_idx(v1, v2, t))
-        A_iq_data.append(1)
-        for r in problem.graph.agents:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_xf_idx(r, v1, v2, t))
-            A_iq_data.append(-N)
-        constraint_idx += 1
+    # rows (t, edge), m(edge, t) - N * sum_r xf_r(edge, t) <= 0
+    t = np.asarray(times, dtype=int)[:, None, None]
+    head = _m_idx(problem, k[None, :, None], t)
+    r = np.arange(problem.num_units)
+    tail = _xf_idx(problem, r, k[None, :, None], t)
 
-    A_iq_49 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    constraint_idx, A_iq_row, A_iq_col, A_iq_data = _head_tail_entries(
+        head, tail, 1, -N
     )
-    return Constraint(A_iq=A_iq_49, b_iq=np.zeros(constraint_idx))
+    A_iq_49 = _coo_matrix(
+        A_iq_data, A_iq_row, A_iq_col, (constraint_idx, problem.num_vars)
+    )
+    return Constraint(A_iq=A_iq_49, b_iq=np.zeros(constraint_idx), name="49_m")
 
 
 def _dynamic_constraint_50(problem):
@@ -177,6 +196,9 @@ def _dynamic_constraint_50(problem):
         problem.graph.nodes,
     )
 
+    # the agents of a unit share the count z, their entries sum to -z / k
+    size = problem.unit_sizes
+
     constraint_idx = 0
     for v, k in product(problem.graph.nodes, range(1, problem.num_r + 1)):
         A_iq_row.append(constraint_idx)
@@ -187,278 +209,517 @@ def _dynamic_constraint_50(problem):
                 if r in problem.eagents:
                     A_iq_row.append(constraint_idx)
                     A_iq_col.append(problem.get_z_idx(r, v, problem.T))
-                    A_iq_data.append(-1 / k)
+                    A_iq_data.append(-1 / (k * size[problem.dict_agent[r]]))
             else:
                 A_iq_row.append(constraint_idx)
                 A_iq_col.append(problem.get_z_idx(r, v, problem.T))
-                A_iq_data.append(-1 / k)
+                A_iq_data.append(-1 / (k * size[problem.dict_agent[r]]))
         constraint_idx += 1
 
     A_iq_50 = sp.coo_matrix(
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
-    return Constraint(A_iq=A_iq_50, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_50, b_iq=np.zeros(constraint_idx), name="50")
 
 
-def _dynamic_constraint_52_53(problem):
+def _dynamic_constraint_52_53(problem, times=None):
     # Constructing A_eq and b_eq for equality (52,53) as sp.coo matrix
-    A_eq_row = []
-    A_eq_col = []
-    A_eq_data = []
+    if times is None:
+        times = range(problem.T + 1)
+
+    patterns = _node_patterns(problem)
+    B = problem.num_min_src_snk
+    b_r = np.array([problem.dict_agent[r] for r in problem.min_src_snk], dtype=int)
+
+    # rows (t, v, b)
+    t, v, b = (
+        x.ravel()
+        for x in np.meshgrid(
+            np.asarray(times, dtype=int),
+            np.arange(problem.num_v),
+            np.arange(B),
+            indexing="ij",
+        )
+    )
+    rows = np.arange(len(t))
+    constraint_idx = len(rows)
 
-    constraint_idx = 0
-    for t, v, (b, b_r) in product(
-        range(problem.T + 1), problem.graph.nodes, enumerate(problem.min_src_snk)
+    blocks = []
+    # flow over transition and connectivity edges into and out of v
+    for seg, (kind, sign) in enumerate(
+        [("tran_in", 1), ("conn_in", 1), ("tran_out", -1), ("conn_out", -1)]
     ):
-        if t > 0:
-            for edge in problem.graph.tran_in_edges(v):
-                A_eq_row.append(constraint_idx)
-                A_eq_col.append(problem.get_f_idx(b, edge[0], edge[1], t - 1))
-                A_eq_data.append(1)
-
-        for edge in problem.graph.conn_in_edges(v):
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_fbar_idx(b, edge[0], edge[1], t))
-            A_eq_data.append(1)
-
-        if t < problem.T:
-            for edge in problem.graph.tran_out_edges(v):
-                A_eq_row.append(constraint_idx)
-                A_eq_col.append(problem.get_f_idx(b, edge[0], edge[1], t))
-                A_eq_data.append(-1)
-
-        for edge in problem.graph.conn_out_edges(v):
-            A_eq_row.append(constraint_idx)
-            A_eq_col.append(problem.get_fbar_idx(b, edge[0], edge[1], t))
-            A_eq_data.append(-1)
-
-        if problem.always_src or len(problem.src) <= len(problem.snk):
-            # case (52)
-            if t == 0:
-                A_eq_row.append(constraint_idx)
-                A_eq_col.append(problem.get_z_idx(b_r, v, t))
-                A_eq_data.append(len(problem.snk))
-            elif t == problem.T:
-                for r in problem.snk:
-                    A_eq_row.append(constraint_idx)
-                    A_eq_col.append(problem.get_z_idx(r, v, t))
-                    A_eq_data.append(-1)
+        if kind == "tran_in":
+            sel = t > 0
+        elif kind == "tran_out":
+            sel = t < problem.T
         else:
-            # case (53)
-            if t == 0:
-                for r in problem.src:
-                    A_eq_row.append(constraint_idx)
-                    A_eq_col.append(problem.get_z_idx(r, v, t))
-                    A_eq_data.append(1)
-            elif t == problem.T:
-                A_eq_row.append(constraint_idx)
-                A_eq_col.append(problem.get_z_idx(b_r, v, t))
-                A_eq_data.append(-len(problem.src))
+            sel = np.ones(len(rows), dtype=bool)
+        row, pos, k = _node_edges(patterns[kind], rows[sel], v[sel])
+        if kind == "tran_in":
+            col = _f_idx(problem, b[row], k, t[row] - 1)
+        elif kind == "tran_out":
+            col = _f_idx(problem, b[row], k, t[row])
+        else:
+            col = _fbar_idx(problem, b[row], k, t[row])
+        blocks.append((row, 0, seg, pos, col, np.full(len(row), sign)))
+
+    # sources at t = 0 and sinks at t = T
+    start = rows[t == 0]
+    end = rows[(t == problem.T) & (t != 0)]
+    if problem.always_src or len(problem.src) <= len(problem.snk):
+        # case (52)
+        col = _z_idx(problem, b_r[b[start]], v[start], 0)
+        blocks.append((start, 0, 4, 0, col, np.full(len(start), len(problem.snk))))
+        snk = np.array([problem.dict_agent[r] for r in problem.snk], dtype=int)
+        row = np.repeat(end, len(snk))
+        pos = np.tile(np.arange(len(snk)), len(end))
+        col = _z_idx(problem, snk[pos], v[row], problem.T)
+        blocks.append((row, 0, 4, pos, col, np.full(len(row), -1)))
+    else:
+        # case (53)
+        src = np.array([problem.dict_agent[r] for r in problem.src], dtype=int)
+        row = np.repeat(start, len(src))
+        pos = np.tile(np.arange(len(src)), len(start))
+        col = _z_idx(problem, src[pos], v[row], 0)
+        blocks.append((row, 0, 4, pos, col, np.full(len(row), 1)))
+        col = _z_idx(problem, b_r[b[end]], v[end], problem.T)
+        blocks.append((end, 0, 4, 0, col, np.full(len(end), -len(problem.src))))
+
+    A_eq_52 = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_eq=A_eq_52, b_eq=np.zeros(constraint_idx), name="52_53")
+
+
+def _dynamic_constraint_54(problem, times=None):
+    # Constructing A_eq and b_eq for equality (55) as sp.coo matrix
+    if times is None:
+        times = range(problem.T + 1)
+
+    patterns = _node_patterns(problem)
+    v0 = [problem.dict_node[problem.graph.agents[r]] for r in problem.master]
+
+    # rows (t, v), master flow out of v minus flow into v at t
+    t, v = (
+        x.ravel()
+        for x in np.meshgrid(
+            np.asarray(times, dtype=int), np.arange(problem.num_v), indexing="ij"
+        )
+    )
+    rows = np.arange(len(t))
+    constraint_idx = len(rows)
 
-        constraint_idx += 1
+    blocks = _master_balance(problem, patterns, rows, v, t, 1)
+    A_iq_54 = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    b_iq_54 = np.where((t == 0) & np.isin(v, v0), len(problem.graph), 0)
 
-    A_eq_52 = sp.coo_matrix(
-        (A_eq_data, (A_eq_row, A_eq_col)), shape=(constraint_idx, problem.num_vars)
-    )
-    return Constraint(A_eq=A_eq_52, b_eq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_54, b_iq=b_iq_54, name="54")
 
 
-def _dynamic_constraint_54(problem):
+def _dynamic_constraint_55(problem, times=None):
     # Constructing A_eq and b_eq for equality (55) as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
-    b_iq_54 = []
+    if times is None:
+        times = range(problem.T + 1)
+
+    patterns = _node_patterns(problem)
+    r_idx, r_v0, r_n = _non_master_agents(problem)
+
+    # rows (t, r), z_t is locked unless info arrived at some point before t-1,
+    # scaled by the number of agents r_n of the unit
+    t, a = (
+        x.ravel()
+        for x in np.meshgrid(
+            np.asarray(times, dtype=int), np.arange(len(r_idx)), indexing="ij"
+        )
+    )
+    rows = np.arange(len(t))
+    constraint_idx = len(rows)
+
+    col = _z_idx(problem, r_idx[a], r_v0[a], t)
+    blocks = [(rows, -1, 0, 0, col, np.full(len(rows), -1))]
+    row, tau = _time_ranges(rows, t)
+    blocks += _master_balance(
+        problem, patterns, row, r_v0[a[row]], tau, r_n[a[row]]
+    )
 
-    v0 = [problem.graph.agents[r] for r in problem.master]
+    A_iq_55 = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_iq=A_iq_55, b_iq=-r_n[a], name="55")
 
-    constraint_idx = 0
-    for t, v in product(range(problem.T + 1), problem.graph.nodes):
 
-        if t > 0:
-            for edge in problem.graph.tran_in_edges(v):
-                A_iq_row.append(constraint_idx)
-                A_iq_col.append(problem.get_m_idx(edge[0], edge[1], t - 1))
-                A_iq_data.append(-1)
+def _dynamic_constraint_58(problem):
+    # Constructing A_iq and b_iq for equality (58) as sp.coo matrix
+    patterns = _node_patterns(problem)
+
+    # rows (v, k), y(v, k) is bounded by the master flow out of v
+    v, k = (
+        x.ravel()
+        for x in np.meshgrid(
+            _non_master_nodes(problem), np.arange(1, problem.num_r + 1), indexing="ij"
+        )
+    )
+    rows = np.arange(len(v))
+    constraint_idx = len(rows)
 
-        for edge in problem.graph.conn_in_edges(v):
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], t))
-            A_iq_data.append(-1)
+    blocks = [(rows, -1, 0, 0, _y_idx(problem, v, k), np.full(len(rows), 1))]
+    row, tau = _time_ranges(rows, np.full(len(rows), problem.T + 1))
+    blocks += _master_balance(problem, patterns, row, v[row], tau, 1)
 
-        if t < problem.T:
-            for edge in problem.graph.tran_out_edges(v):
-                A_iq_row.append(constraint_idx)
-                A_iq_col.append(problem.get_m_idx(edge[0], edge[1], t))
-                A_iq_data.append(1)
+    A_iq_58 = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_iq=A_iq_58, b_iq=np.zeros(constraint_idx), name="58")
 
-        for edge in problem.graph.conn_out_edges(v):
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], t))
-            A_iq_data.append(1)
 
-        if t == 0 and v in v0:
-            b_iq_54.append(len(problem.graph))
-        else:
-            b_iq_54.append(0)
-        constraint_idx += 1
+def _dynamic_constraint_outflow_bound(problem, times=None):
+    # Constructing A_iq and b_iq
+    if times is None:
+        times = range(problem.T + 1)
 
-    A_iq_54 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    N = len(problem.graph.agents)
+    patterns = _node_patterns(problem)
+    _, r_v0, _ = _non_master_agents(problem)
+
+    # rows (r, b, t), fbar_b out of v0 at t is bounded by master flow out of v0
+    v, b, t = (
+        x.ravel()
+        for x in np.meshgrid(
+            r_v0,
+            np.arange(problem.num_min_src_snk),
+            np.asarray(times, dtype=int),
+            indexing="ij",
+        )
     )
+    rows = np.arange(len(v))
+    constraint_idx = len(rows)
 
-    return Constraint(A_iq=A_iq_54, b_iq=b_iq_54)
+    row, tau = _time_ranges(rows, t + 1)
+    blocks = _master_balance(problem, patterns, row, v[row], tau, N)
+    # fbar out of v0 after all master terms
+    row, pos, k = _node_edges(patterns["conn_out"], rows, v)
+    col = _fbar_idx(problem, b[row], k, t[row])
+    blocks.append((row, problem.T + 1, 0, pos, col, np.full(len(row), 1)))
 
+    A_iq = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_iq=A_iq, b_iq=np.zeros(constraint_idx), name="outflow_bound")
 
-def _dynamic_constraint_55(problem):
-    # Constructing A_eq and b_eq for equality (55) as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
-    b_iq_55 = []
-
-    constraint_idx = 0
-    m_v0 = [problem.graph.agents[r] for r in problem.master]
-    for t, r in product(range(problem.T + 1), problem.graph.agents):
-        v0 = problem.graph.agents[r]
-        if r not in problem.master and v0 not in m_v0:
-            A_iq_row.append(constraint_idx)
-            A_iq_col.append(problem.get_z_idx(r, v0, t))
-            A_iq_data.append(-1)
-
-            for tau in range(t):
-                # z_t is locked unless info arrived at some point before t-1
-                if tau > 0:
-                    for edge in problem.graph.tran_in_edges(v0):
-                        A_iq_row.append(constraint_idx)
-                        A_iq_col.append(problem.get_m_idx(edge[0], edge[1], tau - 1))
-                        A_iq_data.append(-1)
-
-                for edge in problem.graph.conn_in_edges(v0):
-                    A_iq_row.append(constraint_idx)
-                    A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], tau))
-                    A_iq_data.append(-1)
 
-                if tau < problem.T:
-                    for edge in problem.graph.tran_out_edges(v0):
-                        A_iq_row.append(constraint_idx)
-                        A_iq_col.append(problem.get_m_idx(edge[0], edge[1], tau))
-                        A_iq_data.append(1)
+# Cumulative master information###########################
+##########################################################
 
-                for edge in problem.graph.conn_out_edges(v0):
-                    A_iq_row.append(constraint_idx)
-                    A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], tau))
-                    A_iq_data.append(1)
 
-            b_iq_55.append(-1)
+def _dynamic_constraint_master_info(problem, times=None):
+    """
+    Cumulative master information mc(v, t) received by the non-master nodes,
+        mc(v, t) = mc(v, t - 1) + master flow into v - master flow out of v
+    at time t. By (54) the flow out of a non-master node never exceeds the
+    flow into it, so mc >= 0 does not cut off any solution.
+    """
+    if times is None:
+        times = range(problem.T + 1)
 
-            constraint_idx += 1
+    patterns = _node_patterns(problem)
 
-    A_iq_55 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    t, v = (
+        x.ravel()
+        for x in np.meshgrid(
+            np.asarray(times, dtype=int), _non_master_nodes(problem), indexing="ij"
+        )
+    )
+    rows = np.arange(len(t))
+    constraint_idx = len(rows)
+
+    prev = rows[t > 0]
+    col = _mc_idx(problem, v[prev], t[prev] - 1)
+    blocks = [
+        (rows, -1, 0, 0, _mc_idx(problem, v, t), np.full(len(rows), 1)),
+        (prev, -1, 1, 0, col, np.full(len(prev), -1)),
+    ]
+    blocks += _master_balance(problem, patterns, rows, v, t, 1)
+
+    A_eq = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_eq=A_eq, b_eq=np.zeros(constraint_idx), name="master_info")
+
+
+def _dynamic_constraint_55_cumulative(problem, times=None):
+    # (55) in terms of mc, z_t is locked unless info arrived before t-1
+    if times is None:
+        times = range(problem.T + 1)
+
+    r_idx, r_v0, r_n = _non_master_agents(problem)
+    t, a = (
+        x.ravel()
+        for x in np.meshgrid(
+            np.asarray(times, dtype=int), np.arange(len(r_idx)), indexing="ij"
+        )
+    )
+    rows = np.arange(len(t))
+    constraint_idx = len(rows)
+
+    prev = rows[t > 0]
+    col_z = _z_idx(problem, r_idx[a], r_v0[a], t)
+    col_mc = _mc_idx(problem, r_v0[a[prev]], t[prev] - 1)
+    blocks = [
+        (rows, 0, 0, 0, col_z, np.full(len(rows), -1)),
+        (prev, 0, 1, 0, col_mc, -r_n[a[prev]]),
+    ]
+
+    A_iq_55 = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_iq=A_iq_55, b_iq=-r_n[a], name="55")
+
+
+def _dynamic_constraint_58_cumulative(problem):
+    # (58) in terms of mc, y(v, k) is bounded by the master info at v at time T
+    v, k = (
+        x.ravel()
+        for x in np.meshgrid(
+            _non_master_nodes(problem), np.arange(1, problem.num_r + 1), indexing="ij"
+        )
     )
-    return Constraint(A_iq=A_iq_55, b_iq=b_iq_55)
+    rows = np.arange(len(v))
+    constraint_idx = len(rows)
 
+    blocks = [
+        (rows, 0, 0, 0, _y_idx(problem, v, k), np.full(len(rows), 1)),
+        (rows, 0, 1, 0, _mc_idx(problem, v, problem.T), np.full(len(rows), -1)),
+    ]
 
-def _dynamic_constraint_58(problem):
-    # Constructing A_iq and b_iq for equality (58) as sp.coo matrix
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+    A_iq_58 = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_iq=A_iq_58, b_iq=np.zeros(constraint_idx), name="58")
 
-    m_v0 = [problem.graph.agents[r] for r in problem.master]
 
-    constraint_idx = 0
-    for v, k in product(problem.graph.nodes, range(1, problem.num_r + 1)):
+def _dynamic_constraint_outflow_bound_cumulative(problem, times=None):
+    # outflow bound in terms of mc, fbar out of v0 at t needs master info at v0
+    if times is None:
+        times = range(problem.T + 1)
 
-        if v in m_v0:
-            continue
+    N = len(problem.graph.agents)
+    patterns = _node_patterns(problem)
+    _, r_v0, _ = _non_master_agents(problem)
+
+    v, b, t = (
+        x.ravel()
+        for x in np.meshgrid(
+            r_v0,
+            np.arange(problem.num_min_src_snk),
+            np.asarray(times, dtype=int),
+            indexing="ij",
+        )
+    )
+    rows = np.arange(len(v))
+    constraint_idx = len(rows)
 
-        A_iq_row.append(constraint_idx)
-        A_iq_col.append(problem.get_y_idx(v, k))
-        A_iq_data.append(1)
+    blocks = [(rows, 0, 0, 0, _mc_idx(problem, v, t), np.full(len(rows), -N))]
+    row, pos, k = _node_edges(patterns["conn_out"], rows, v)
+    col = _fbar_idx(problem, b[row], k, t[row])
+    blocks.append((row, 0, 1, pos, col, np.full(len(row), 1)))
 
-        for tau in range(problem.T + 1):
+    A_iq = _sorted_coo_matrix(blocks, constraint_idx, problem.num_vars)
+    return Constraint(A_iq=A_iq, b_iq=np.zeros(constraint_idx), name="outflow_bound")
 
-            if tau > 0:
-                for edge in problem.graph.tran_in_edges(v):
-                    A_iq_row.append(constraint_idx)
-                    A_iq_col.append(problem.get_m_idx(edge[0], edge[1], tau - 1))
-                    A_iq_data.append(-1)
 
-            for edge in problem.graph.conn_in_edges(v):
-                A_iq_row.append(constraint_idx)
-                A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], tau))
-                A_iq_data.append(-1)
+# Helpers##################################################
+##########################################################
 
-            if tau < problem.T:
-                for edge in problem.graph.tran_out_edges(v):
-                    A_iq_row.append(constraint_idx)
-                    A_iq_col.append(problem.get_m_idx(edge[0], edge[1], tau))
-                    A_iq_data.append(1)
 
-            for edge in problem.graph.conn_out_edges(v):
-                A_iq_row.append(constraint_idx)
-                A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], tau))
-                A_iq_data.append(1)
+def _edge_arrays(problem, edges, dict_edge):
+    """edge indices in dict_edge and node indices (2, num_edges) of the end
+    points of `edges`, in the order of `edges`"""
+    edges = list(edges)
+    k = np.array([dict_edge[e] for e in edges], dtype=int)
+    ends = np.array(
+        [[problem.dict_node[v] for v in e] for e in edges], dtype=int
+    ).reshape(-1, 2)
+    return k, ends.T
+
+
+def _node_patterns(problem):
+    """
+    Transition and connectivity edges into and out of every node, in the order
+    of graph.nodes and of tran_in_edges etc. Returns dict(kind: (first, count,
+    edge_k)) with the offset and number of edges of each node and the edge
+    indices in dict_tran or dict_conn.
+    """
+    patterns = {}
+    for kind, edge_type in [
+        ("tran_in", "transition"),
+        ("conn_in", "connectivity"),
+        ("tran_out", "transition"),
+        ("conn_out", "connectivity"),
+    ]:
+        index = problem.graph.edge_index(edge_type)
+        if kind.endswith("_in"):
+            ptr, edge_k = index.in_ptr, index.in_edge
+        else:
+            ptr, edge_k = index.out_ptr, index.out_edge
+        patterns[kind] = (ptr[:-1], np.diff(ptr), edge_k)
+    return patterns
+
+
+def _node_edges(pattern, rows, nodes):
+    """entries (row, pos, edge_k) of all edges of node nodes[i] in row rows[i],
+    where pos is the position of the edge in the edge list of the node"""
+    first, count, edge_k = pattern
+    n = count[nodes]
+    idx = np.repeat(np.arange(len(rows)), n)
+    pos = np.arange(len(idx)) - np.repeat(np.cumsum(n) - n, n)
+    return rows[idx], pos, edge_k[first[nodes][idx] + pos]
+
+
+def _time_ranges(rows, num_times):
+    """entries (row, tau) for tau in range(num_times[i]) for each row rows[i]"""
+    row = np.repeat(rows, num_times)
+    tau = np.arange(len(row)) - np.repeat(np.cumsum(num_times) - num_times, num_times)
+    return row, tau
+
+
+def _master_balance(problem, patterns, rows, nodes, taus, scale):
+    """
+    Entry blocks of scale * (master flow out of node minus master flow into
+    node) at time tau, for the nodes and times in rows, scale is a number or
+    an array with one entry per row
+    """
+    scale = np.broadcast_to(scale, np.shape(rows))
+    blocks = []
+    for seg, (kind, sign) in enumerate(
+        [("tran_in", -1), ("conn_in", -1), ("tran_out", 1), ("conn_out", 1)]
+    ):
+        if kind == "tran_in":
+            sel = taus > 0
+        elif kind == "tran_out":
+            sel = taus < problem.T
+        else:
+            sel = np.ones(len(rows), dtype=bool)
+        idx = np.flatnonzero(sel)
+        i, pos, k = _node_edges(patterns[kind], idx, nodes[sel])
+        if kind == "tran_in":
+            col = _m_idx(problem, k, taus[i] - 1)
+        elif kind == "tran_out":
+            col = _m_idx(problem, k, taus[i])
+        else:
+            col = _mbar_idx(problem, k, taus[i])
+        blocks.append((rows[i], taus[i], seg, pos, col, sign * scale[i]))
+    return blocks
+
+
+def _head_tail_entries(head, tail, head_data, tail_data):
+    """
+    Entries of rows that hold one head entry followed by the tail entries,
+    where head has shape (..., 1) and tail (..., num_tail) broadcast to the
+    same row shape. Returns (num_rows, row, col, data) in row order.
+    """
+    shape = np.broadcast_shapes(head.shape[:-1], tail.shape[:-1])
+    head = np.broadcast_to(head, shape + (1,))
+    tail = np.broadcast_to(tail, shape + tail.shape[-1:])
+    col = np.concatenate([head, tail], axis=-1)
+    num_rows = int(np.prod(shape))
+    row = np.repeat(np.arange(num_rows), col.shape[-1])
+    data = np.tile(
+        np.hstack([[head_data], np.full(tail.shape[-1], tail_data)]), num_rows
+    ).astype(int)
+    return num_rows, row, col.ravel(), data
+
+
+def _finish_constraint_monotone(problem):
+    # rows t, d(t) - d(t + 1) <= 0, and d(T) == 1
+    t = np.arange(problem.T)
+    A_iq_row = np.repeat(t, 2)
+    A_iq_col = _d_idx(problem, np.stack([t, t + 1], axis=1)).ravel()
+    A_iq_data = np.tile([1, -1], problem.T)
+    A_iq = _coo_matrix(A_iq_data, A_iq_row, A_iq_col, (problem.T, problem.num_vars))
+    A_eq = _coo_matrix([1], [0], [_d_idx(problem, problem.T)], (1, problem.num_vars))
+    return Constraint(
+        A_iq=A_iq, b_iq=np.zeros(problem.T), A_eq=A_eq, b_eq=[1], name="finish"
+    )
 
-        constraint_idx += 1
 
-    A_iq_58 = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+def _finish_constraint_freeze(problem):
+    # rows t, sum_r xf_r(edge, t) over edges that are not self loops + R d(t) <= R
+    R = problem.num_r
+    tran = problem.edge_ends(problem.dict_tran)
+    k = np.flatnonzero(tran[:, 0] != tran[:, 1])
+
+    t, r, k = (
+        x.ravel()
+        for x in np.meshgrid(
+            np.arange(problem.T), np.arange(problem.num_units), k, indexing="ij"
+        )
+    )
+    A_iq_row = np.hstack([t, np.arange(problem.T)])
+    A_iq_col = np.hstack(
+        [_xf_idx(problem, r, k, t), _d_idx(problem, np.arange(problem.T))]
     )
-    return Constraint(A_iq=A_iq_58, b_iq=np.zeros(constraint_idx))
+    A_iq_data = np.hstack([np.ones(len(t), dtype=int), np.full(problem.T, R)])
+    A_iq = _coo_matrix(A_iq_data, A_iq_row, A_iq_col, (problem.T, problem.num_vars))
+    return Constraint(A_iq=A_iq, b_iq=np.full(problem.T, R), name="freeze")
+
+
+def _sorted_coo_matrix(blocks, num_rows, num_vars):
+    """
+    COO matrix of entry blocks (row, tau, seg, pos, col, data), with the entries
+    sorted by row, time, segment and position in the order the entries of a
+    row are listed in the constraint
+    """
+    keys = [[], [], [], [], [], []]
+    for block in blocks:
+        row = np.asarray(block[0])
+        for key, x in zip(keys, block):
+            key.append(np.broadcast_to(x, row.shape))
+    row, tau, seg, pos, col, data = (
+        np.hstack(key).astype(int) if key else np.zeros(0, dtype=int) for key in keys
+    )
+    order = np.lexsort((pos, seg, tau, row))
+    return _coo_matrix(data[order], row[order], col[order], (num_rows, num_vars))
 
 
-def _dynamic_constraint_outflow_bound(problem):
-    # Constructing A_iq and b_iq
-    A_iq_row = []
-    A_iq_col = []
-    A_iq_data = []
+def _y_idx(problem, v, k):
+    """vectorized get_y_idx for node indices v"""
+    return problem.layout.idx("y", v, k - 1)
 
-    N = len(problem.graph.agents)
-    m_v0 = [problem.graph.agents[r] for r in problem.master]
 
-    constraint_idx = 0
-    for r, (b, _), t in product(
-        problem.graph.agents, enumerate(problem.min_src_snk), range(problem.T + 1)
-    ):
+def _f_idx(problem, b, k, t):
+    """vectorized get_f_idx for transition edge indices k"""
+    return problem.layout.idx("f", t, b, k)
 
-        v0 = problem.graph.agents[r]
 
-        if v0 not in m_v0:
-            for tau in range(t + 1):
+def _fbar_idx(problem, b, k, t):
+    """vectorized get_fbar_idx for connectivity edge indices k"""
+    return problem.layout.idx("fbar", t, b, k)
 
-                if tau > 0:
-                    for edge in problem.graph.tran_in_edges(v0):
-                        A_iq_row.append(constraint_idx)
-                        A_iq_col.append(problem.get_m_idx(edge[0], edge[1], tau - 1))
-                        A_iq_data.append(-N)
 
-                for edge in problem.graph.conn_in_edges(v0):
-                    A_iq_row.append(constraint_idx)
-                    A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], tau))
-                    A_iq_data.append(-N)
+def _m_idx(problem, k, t):
+    """vectorized get_m_idx for transition edge indices k"""
+    return problem.layout.idx("m", t, k)
 
-                if tau < problem.T:
-                    for edge in problem.graph.tran_out_edges(v0):
-                        A_iq_row.append(constraint_idx)
-                        A_iq_col.append(problem.get_m_idx(edge[0], edge[1], tau))
-                        A_iq_data.append(N)
 
-                for edge in problem.graph.conn_out_edges(v0):
-                    A_iq_row.append(constraint_idx)
-                    A_iq_col.append(problem.get_mbar_idx(edge[0], edge[1], tau))
-                    A_iq_data.append(N)
+def _mbar_idx(problem, k, t):
+    """vectorized get_mbar_idx for connectivity edge indices k"""
+    return problem.layout.idx("mbar", t, k)
 
-            for edge in problem.graph.conn_out_edges(v0):
-                A_iq_row.append(constraint_idx)
-                A_iq_col.append(problem.get_fbar_idx(b, edge[0], edge[1], t))
-                A_iq_data.append(1)
 
-            constraint_idx += 1
+def _mc_idx(problem, v, t):
+    """vectorized get_mc_idx for node indices v"""
+    return problem.layout.idx("mc", t, v)
 
-    A_iq = sp.coo_matrix(
-        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+
+def _d_idx(problem, t):
+    """vectorized index of the finished indicator d(t)"""
+    return problem.layout.idx("d", t)
+
+
+def _non_master_nodes(problem):
+    """indices of the nodes that are not the initial position of a master"""
+    m_v0 = [problem.graph.agents[r] for r in problem.master]
+    return np.array(
+        [problem.dict_node[v] for v in problem.graph.nodes if v not in m_v0],
+        dtype=int,
+    )
+
+
+def _non_master_agents(problem):
+    """agent unit indices, initial node indices and number of agents of the
+    units that do not start at the initial position of a master"""
+    m_v0 = [problem.graph.agents[r] for r in problem.master]
+    units = [u for u in problem.agent_units if problem.graph.agents[u[0]] not in m_v0]
+    r_idx = np.array([problem.dict_agent[u[0]] for u in units], dtype=int)
+    r_v0 = np.array(
+        [problem.dict_node[problem.graph.agents[u[0]]] for u in units], dtype=int
     )
-    return Constraint(A_iq=A_iq, b_iq=np.zeros(constraint_idx))
+    r_n = np.array([len(u) for u in units], dtype=int)
+    return r_idx, r_v0, r_n
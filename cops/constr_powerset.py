@@ -2,6 +2,7 @@ from itertools import product
 
 import numpy as np
 import scipy.sparse as sp
+from scipy.sparse.csgraph import breadth_first_order, maximum_flow
 
 from cops.optimization_wrappers import Constraint
 
@@ -73,7 +74,115 @@ def generate_connectivity_constraint(problem, b_list, add_S):
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_iq=A_iq_38, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_38, b_iq=np.zeros(constraint_idx), name="38")
+
+
+def separate_connectivity_constraint(problem, x, tol=1e-6):
+    """Return the connectivity constraints (38) that are violated by the
+       (possibly fractional) solution x, found by max-flow/min-cut per source
+       on the time-expanded graph with capacities x, xbar.
+
+       A target (v, t) of base b is violated if yb(b, v, t) is larger than
+       the minimum cut between the source and (v, t). For each violated cut
+       S one row per violated target in S is returned."""
+
+    T, V = problem.T, problem.num_v
+    x = np.asarray(x)
+
+    # time-expanded edges, node (v, t) has id t * V + v
+    tran = problem.edge_ends(problem.dict_tran)
+    conn = problem.edge_ends(problem.dict_conn)
+    conn_k = np.flatnonzero(conn[:, 0] != conn[:, 1])
+    t_tran = np.repeat(np.arange(T), len(tran))
+    t_conn = np.repeat(np.arange(T + 1), len(conn_k))
+    tail = np.hstack(
+        [
+            t_tran * V + np.tile(tran[:, 0], T),
+            t_conn * V + np.tile(conn[conn_k, 0], T + 1),
+        ]
+    )
+    head = np.hstack(
+        [
+            (t_tran + 1) * V + np.tile(tran[:, 1], T),
+            t_conn * V + np.tile(conn[conn_k, 1], T + 1),
+        ]
+    )
+    num_nodes = (T + 1) * V
+
+    A_iq_row = []
+    A_iq_col = []
+    A_iq_data = []
+    constraint_idx = 0
+    for b, b_r in enumerate(problem.src):
+        # edge variables and capacities of base b
+        cols = np.hstack(
+            [
+                problem.layout.tensor("x")[:, b, :].ravel(),
+                problem.layout.tensor("xbar")[:, b, conn_k].ravel(),
+            ]
+        )
+        cap = np.maximum(x[cols], 0)
+        yb = problem.layout.block(x, "yb")[:, b, :].ravel()
+
+        source = problem.dict_node[problem.graph.agents[b_r]]
+        targets = np.flatnonzero(yb > tol)
+        targets = targets[targets != source]
+        targets = targets[np.argsort(-yb[targets], kind="stable")]
+
+        def cut(S):
+            """cut columns into S and the targets in S it is violated for"""
+            into = S[head] & ~S[tail]
+            value = cap[into].sum()
+            return cols[into], targets[S[targets] & (yb[targets] > value + tol)]
+
+        # nodes reachable over edges with positive capacity
+        pos = cap > tol
+        graph = sp.csr_matrix(
+            (np.ones(pos.sum()), (tail[pos], head[pos])), shape=(num_nodes,) * 2
+        )
+        S = np.ones(num_nodes, dtype=bool)
+        S[breadth_first_order(graph, source, return_predecessors=False)] = False
+        cuts = [cut(S)]
+        covered = S.copy()
+
+        # fractional capacities: min cut between the source and each target
+        if not np.all(np.abs(cap - np.round(cap)) < tol):
+            scale = 1 / tol
+            capacity = sp.csr_matrix(
+                (np.floor(cap * scale).astype(np.int32), (tail, head)),
+                shape=(num_nodes,) * 2,
+            )
+            capacity.sum_duplicates()
+            for target in targets:
+                if covered[target]:
+                    continue
+                res = maximum_flow(capacity, source, target)
+                if res.flow_value >= (yb[target] - tol) * scale:
+                    continue
+                residual = capacity - res.flow
+                residual.data[residual.data < 0] = 0
+                residual.eliminate_zeros()
+                S = np.ones(num_nodes, dtype=bool)
+                S[breadth_first_order(residual, source, return_predecessors=False)] = (
+                    False
+                )
+                cuts.append(cut(S))
+                covered[cuts[-1][1]] = True
+
+        # rows yb(b, v, t) - sum of x, xbar into S <= 0
+        for cut_cols, violated in cuts:
+            for target in violated:
+                t, v = np.divmod(target, V)
+                A_iq_row += [constraint_idx] * (len(cut_cols) + 1)
+                A_iq_col += [problem.layout.idx("yb", t, b, v)] + list(cut_cols)
+                A_iq_data += [1] + [-1] * len(cut_cols)
+                constraint_idx += 1
+
+    A_iq_38 = sp.coo_matrix(
+        (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
+    )
+
+    return Constraint(A_iq=A_iq_38, b_iq=np.zeros(constraint_idx), name="38")
 
 
 ##########################################################
@@ -101,7 +210,7 @@ def _dynamic_constraint_30(problem):
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_iq=A_iq_30, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_30, b_iq=np.zeros(constraint_idx), name="30_bridge")
 
 
 def _dynamic_constraint_33(problem):
@@ -127,7 +236,7 @@ def _dynamic_constraint_33(problem):
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_iq=A_iq_33, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_33, b_iq=np.zeros(constraint_idx), name="33")
 
 
 def _dynamic_constraint_34(problem):
@@ -153,7 +262,7 @@ def _dynamic_constraint_34(problem):
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_iq=A_iq_34, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_34, b_iq=np.zeros(constraint_idx), name="34")
 
 
 def _dynamic_constraint_35(problem):
@@ -179,7 +288,7 @@ def _dynamic_constraint_35(problem):
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_iq=A_iq_35, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_35, b_iq=np.zeros(constraint_idx), name="35")
 
 
 def _dynamic_constraint_36(problem):
@@ -205,4 +314,4 @@ def _dynamic_constraint_36(problem):
         (A_iq_data, (A_iq_row, A_iq_col)), shape=(constraint_idx, problem.num_vars)
     )
 
-    return Constraint(A_iq=A_iq_36, b_iq=np.zeros(constraint_idx))
+    return Constraint(A_iq=A_iq_36, b_iq=np.zeros(constraint_idx), name="36")
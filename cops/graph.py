@@ -1,15 +1,296 @@
+from functools import wraps
+
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
 
 from networkx.drawing.nx_agraph import to_agraph
+from scipy.sparse.csgraph import shortest_path
 from copy import deepcopy
 
 
+class EdgeIndex(object):
+    """
+    Arrays of the edges of one type ("transition" or "connectivity") of a
+    Graph. Nodes are numbered in the order of graph.nodes and edges in the
+    order of graph.edges, which lists the edges out of each node together.
+    The edges out of (into) node v are out_edge[out_ptr[v] : out_ptr[v + 1]]
+    (in_edge[in_ptr[v] : in_ptr[v + 1]]) in the order of graph.out_edges
+    (graph.in_edges).
+    """
+
+    def __init__(self, graph, edge_type):
+        self.nodes = list(graph.nodes)
+        self.node_id = {v: k for k, v in enumerate(self.nodes)}
+        V = len(self.nodes)
+
+        self.edges = []  # list((i, j)) of edge end points
+        key_id = {}
+        weight = []
+        for i, j, key, data in graph.edges(keys=True, data=True):
+            if data["type"] == edge_type:
+                key_id[(i, j, key)] = len(self.edges)
+                self.edges.append((i, j))
+                weight.append(data.get("weight", 1))
+        # edge id of (i, j), the last one if there are parallel edges
+        self.edge_id = {e: k for k, e in enumerate(self.edges)}
+        self.weight = np.array(weight, dtype=float)
+        E = len(self.edges)
+
+        # node ids (E, 2) of the end points
+        self.ends = np.array(
+            [[self.node_id[i], self.node_id[j]] for i, j in self.edges], dtype=int
+        ).reshape(-1, 2)
+
+        self.out_edge = np.argsort(self.ends[:, 0], kind="stable")
+        self.out_ptr = _csr_ptr(self.ends[:, 0], V)
+        self.in_edge = np.array(
+            [
+                key_id[(i, j, key)]
+                for v in self.nodes
+                for i, j, key, t in graph.in_edges(v, keys=True, data="type")
+                if t == edge_type
+            ],
+            dtype=int,
+        )
+        self.in_ptr = _csr_ptr(self.ends[:, 1], V)
+
+        # (V, V) number of edges from i to j, (V, E) edges out of and into v
+        ones = np.ones(E, dtype=int)
+        self.adjacency = sp.csr_matrix(
+            (ones, (self.ends[:, 0], self.ends[:, 1])), shape=(V, V)
+        )
+        self.out_incidence = sp.csr_matrix(
+            (ones, (self.ends[:, 0], np.arange(E))), shape=(V, E)
+        )
+        self.in_incidence = sp.csr_matrix(
+            (ones, (self.ends[:, 1], np.arange(E))), shape=(V, E)
+        )
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.edges)
+
+    def adjacency_matrix(self, weighted=False):
+        """CSR matrix (V, V) with an entry at (i, j) if there is an edge from
+        node i to node j, 1 or the smallest weight of these edges if
+        `weighted`. Zero weights are stored as explicit entries, which
+        scipy.sparse.csgraph reads as edges."""
+        return _adjacency(self.ends, self.weight, self.num_nodes, weighted)
+
+    def induced_edge_counts(self, node_lists):
+        """array with the number of edges with both end points in node list
+        node_lists[s] for each s, nodes that are not in the graph are ignored"""
+        row = []
+        col = []
+        for s, node_list in enumerate(node_lists):
+            ids = [self.node_id[v] for v in set(node_list) if v in self.node_id]
+            row += [s] * len(ids)
+            col += ids
+        member = sp.csc_matrix(
+            (np.ones(len(row), dtype=bool), (row, col)),
+            shape=(len(node_lists), self.num_nodes),
+        )
+        both = member[:, self.ends[:, 0]].multiply(member[:, self.ends[:, 1]])
+        return np.asarray(both.sum(axis=1), dtype=int).ravel()
+
+    def out_edges(self, v):
+        """list((v, j)) of the edges out of node v"""
+        k = self.node_id[v]
+        first, last = self.out_ptr[k], self.out_ptr[k + 1]
+        return [self.edges[e] for e in self.out_edge[first:last]]
+
+    def in_edges(self, v):
+        """list((i, v)) of the edges into node v"""
+        k = self.node_id[v]
+        first, last = self.in_ptr[k], self.in_ptr[k + 1]
+        return [self.edges[e] for e in self.in_edge[first:last]]
+
+
+class DistanceOracle(object):
+    """
+    Shortest path distances over the edges of some types of a Graph, in hops
+    or, if `weighted`, in edge weights, computed with scipy.sparse.csgraph.
+    Distances and predecessors from a node (or to a node, on the reversed
+    edges) are computed on demand and kept, hops as int16 (-1 if there is no
+    path) and weights as float32 (inf if there is no path).
+    """
+
+    def __init__(self, graph, edge_types, weighted):
+        indexes = [graph.edge_index(edge_type) for edge_type in edge_types]
+        self.nodes = list(graph.nodes)
+        self.node_id = {v: k for k, v in enumerate(self.nodes)}
+        self.weighted = weighted
+        self.adjacency = _adjacency(
+            np.vstack([np.zeros((0, 2), dtype=int)] + [i.ends for i in indexes]),
+            np.hstack([np.zeros(0)] + [i.weight for i in indexes]),
+            len(self.nodes),
+            weighted,
+        )
+        if weighted:
+            self.dtype = np.float32
+        else:
+            self.dtype = np.int16 if len(self.nodes) < 2**15 else np.int32
+        self._rows = {}  # dict((reverse, k): (dist, pred)) per node id k
+
+    def _compute(self, ids, reverse):
+        """distance and predecessor rows from (to if `reverse`) node ids"""
+        missing = [k for k in dict.fromkeys(ids) if (reverse, k) not in self._rows]
+        if len(missing) > 0:
+            A = self.adjacency.T.tocsr() if reverse else self.adjacency
+            dist, pred = shortest_path(
+                A,
+                indices=missing,
+                unweighted=not self.weighted,
+                return_predecessors=True,
+            )
+            if not self.weighted:
+                dist[np.isinf(dist)] = -1
+            for k, d, p in zip(missing, dist, pred):
+                self._rows[(reverse, k)] = (d.astype(self.dtype), p.astype(np.int32))
+        return [self._rows[(reverse, k)] for k in ids]
+
+    def _as_float(self, dist):
+        if self.weighted:
+            return dist.astype(float)
+        return np.where(dist < 0, np.inf, dist).astype(float)
+
+    def distances(self, sources, reverse=False):
+        """array (len(sources), V) of the distances from (to if `reverse`) each
+        node in sources to all nodes in graph.nodes order, inf if there is no
+        path"""
+        rows = self._compute([self.node_id[v] for v in sources], reverse)
+        dist = np.array([d for d, _ in rows]).reshape(-1, len(self.nodes))
+        return self._as_float(dist)
+
+    def all_pairs(self):
+        """array (V, V) of the distances between all pairs of nodes"""
+        return self.distances(self.nodes)
+
+    def lengths(self, v, reverse=False):
+        """dict(u: d) of the distance d from v to u (from u to v if `reverse`)
+        for the nodes u that can be reached"""
+        dist = self.distances([v], reverse)[0]
+        return {
+            self.nodes[k]: (float(dist[k]) if self.weighted else int(dist[k]))
+            for k in np.flatnonzero(dist < np.inf)
+        }
+
+    def distance(self, source, target):
+        """distance from source to target, inf if there is no path"""
+        return self.distances([source])[0, self.node_id[target]]
+
+    def path(self, source, target):
+        """list of the nodes on a shortest path from source to target"""
+        t = self.node_id[target]
+        (_, pred), = self._compute([self.node_id[source]], False)
+        if self.distance(source, target) == np.inf:
+            raise Exception("No path from {} to {}".format(source, target))
+        path = [t]
+        while path[-1] != self.node_id[source]:
+            path.append(pred[path[-1]])
+        return [self.nodes[k] for k in path[::-1]]
+
+    def nearest(self, sources, target):
+        """(distance, path) of a shortest path to target from the nearest node
+        in sources, from one search on the reversed edges"""
+        t = self.node_id[target]
+        (_, pred), = self._compute([t], True)
+        dist = self.distances([target], reverse=True)[0]
+        ids = [self.node_id[v] for v in sources]
+        s = ids[int(np.argmin(dist[ids]))]
+        if dist[s] == np.inf:
+            raise Exception("No path from {} to {}".format(sources, target))
+        # the predecessors on the reversed edges lead from s to target
+        path = [s]
+        while path[-1] != t:
+            path.append(pred[path[-1]])
+        return dist[s], [self.nodes[k] for k in path]
+
+
+def _adjacency(ends, weight, num_nodes, weighted):
+    """CSR matrix (V, V) of the edges with end points `ends`, with entry 1 or
+    the smallest weight of the parallel edges if `weighted`"""
+    if not weighted:
+        data = np.ones(len(ends))
+        sel = np.arange(len(ends))
+    else:
+        data = weight
+        key = ends[:, 0] * num_nodes + ends[:, 1]
+        order = np.lexsort((data, key))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = key[order][1:] != key[order][:-1]
+        sel = order[first]
+    A = sp.coo_matrix(
+        (data[sel], (ends[sel, 0], ends[sel, 1])), shape=(num_nodes, num_nodes)
+    ).tocsr()
+    if not weighted:
+        A.data[:] = 1  # parallel edges
+    return A
+
+
+def _csr_ptr(node, num_nodes):
+    """CSR row pointers (num_nodes + 1,) of entries in rows `node`"""
+    return np.hstack([0, np.cumsum(np.bincount(node, minlength=num_nodes))])
+
+
+def _grid_pairs(free, offsets):
+    """array (n, 2) of the cell indices of the pairs of free cells (r, c) and
+    (r + dr, c + dc) of a grid, for the offsets (dr, dc)"""
+    cell = np.arange(free.size).reshape(free.shape)
+    R, C = free.shape
+    pairs = []
+    for dr, dc in offsets:
+        src = (slice(0, max(R - dr, 0)), slice(max(-dc, 0), max(C - dc, 0)))
+        dst = (slice(dr, R), slice(max(dc, 0), max(C + dc, 0)))
+        both = free[src] & free[dst]
+        pairs.append(np.stack([cell[src][both], cell[dst][both]], axis=1))
+    return np.vstack(pairs) if pairs else np.zeros((0, 2), dtype=int)
+
+
+def _drops_edge_index(method):
+    """networkx method that modifies the graph and drops the cached indexes"""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._edge_index = {}
+        self._distance_oracle = {}
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class Graph(nx.MultiDiGraph):
     def __init__(self):
         super(Graph, self).__init__()
         self.agents = None
         self.std_tran_weight = 1
         self.std_con_weight = 0.01
+        self._edge_index = {}  # dict(edge_type: EdgeIndex) built on demand
+        self._distance_oracle = {}  # dict((edge_types, weighted): DistanceOracle)
+
+    add_node = _drops_edge_index(nx.MultiDiGraph.add_node)
+    add_nodes_from = _drops_edge_index(nx.MultiDiGraph.add_nodes_from)
+    remove_node = _drops_edge_index(nx.MultiDiGraph.remove_node)
+    remove_nodes_from = _drops_edge_index(nx.MultiDiGraph.remove_nodes_from)
+    add_edge = _drops_edge_index(nx.MultiDiGraph.add_edge)
+    add_edges_from = _drops_edge_index(nx.MultiDiGraph.add_edges_from)
+    remove_edge = _drops_edge_index(nx.MultiDiGraph.remove_edge)
+    remove_edges_from = _drops_edge_index(nx.MultiDiGraph.remove_edges_from)
+    clear = _drops_edge_index(nx.MultiDiGraph.clear)
+    clear_edges = _drops_edge_index(nx.MultiDiGraph.clear_edges)
+
+    def edge_index(self, edge_type):
+        """EdgeIndex of the edges of `edge_type`, cached until the graph is
+        modified. Edge types and weights are read when the index is built,
+        edge attributes changed in place afterwards are not seen."""
+        if edge_type not in self._edge_index:
+            self._edge_index[edge_type] = EdgeIndex(self, edge_type)
+        return self._edge_index[edge_type]
 
     def plot_graph(self, filename=None):
 
@@ -73,15 +354,66 @@ class Graph(nx.MultiDiGraph):
         nx.add_path(self, connectivity_list, type="connectivity", weight=w)
         nx.add_path(self, connectivity_list[::-1], type="connectivity", weight=w)
 
+    def add_transition_edges(self, edges, w=None):
+        """add transition edges in both directions between the node pairs in
+        `edges` (list or array (n, 2)) with weight w (number or one per pair),
+        then the missing self loops once"""
+        if w is None:
+            w = self.std_tran_weight
+        self._add_edge_pairs(edges, "transition", w)
+        self.add_self_loops()
+
+    def add_connectivity_edges(self, edges, w=None):
+        """add connectivity edges in both directions between the node pairs in
+        `edges` (list or array (n, 2)) with weight w (number or one per pair)"""
+        if w is None:
+            w = self.std_con_weight
+        self._add_edge_pairs(edges, "connectivity", w)
+
+    def add_grid(self, occupancy, conn_dist=1, tran_w=None, conn_w=None):
+        """add a node for each free cell (occupancy == 0) of a 2D occupancy
+        grid, labeled by the cell index row * num_cols + col and placed at
+        x = col, y = row. Free 4-neighbors get transition edges and free cells
+        at euclidean distance at most conn_dist connectivity edges."""
+        free = np.asarray(occupancy) == 0
+        cell = np.arange(free.size).reshape(free.shape)
+        rows, cols = np.nonzero(free)
+        self.set_node_positions(
+            {int(cell[r, c]): (int(c), int(r)) for r, c in zip(rows, cols)}
+        )
+
+        # offsets (dr, dc) to the cells after each cell in row-major order
+        d = int(np.floor(conn_dist))
+        conn_offsets = [
+            (dr, dc)
+            for dr in range(0, d + 1)
+            for dc in range(-d, d + 1)
+            if (dr > 0 or dc > 0) and dr**2 + dc**2 <= conn_dist**2
+        ]
+        self.add_transition_edges(_grid_pairs(free, [(0, 1), (1, 0)]), tran_w)
+        self.add_connectivity_edges(_grid_pairs(free, conn_offsets), conn_w)
+
+    def _add_edge_pairs(self, edges, edge_type, w):
+        if isinstance(edges, np.ndarray):
+            edges = edges.reshape(-1, 2).tolist()
+        w = np.broadcast_to(w, (len(edges),)).tolist()
+        data = [{"type": edge_type, "weight": wk} for wk in w]
+        self.add_edges_from([(i, j, d) for (i, j), d in zip(edges, data)])
+        self.add_edges_from([(j, i, dict(d)) for (i, j), d in zip(edges, data)])
+
     def add_self_loops(self):
-        for n in self:
-            add_transition = True
-            for edge in self.edges(n, data=True):
-                if edge[0] == edge[1]:
-                    if edge[2]["type"] == "transition":
-                        add_transition = False
-            if add_transition:
-                self.add_edge(n, n, type="transition", weight=0)
+        """add a transition self loop to every node that does not have one"""
+        missing = [
+            n
+            for n in self
+            if not any(
+                data["type"] == "transition"
+                for data in (self.get_edge_data(n, n) or {}).values()
+            )
+        ]
+        self.add_edges_from(
+            [(n, n, {"type": "transition", "weight": 0}) for n in missing]
+        )
 
     def set_frontiers(self, frontiers):
         for v in self:
@@ -124,72 +456,49 @@ class Graph(nx.MultiDiGraph):
             self.nodes[n]["dead"] = False
 
     def conn_edges(self):
-        for (i, j, data) in self.edges(data=True):
-            if data["type"] == "connectivity":
-                yield (i, j)
+        yield from self.edge_index("connectivity").edges
 
     def tran_edges(self):
-        for (i, j, data) in self.edges(data=True):
-            if data["type"] == "transition":
-                yield (i, j)
+        yield from self.edge_index("transition").edges
 
     def number_of_conn_edges(self, node_list=None):
         """return number of connectivity edges in subgraph induced by node_list"""
+        index = self.edge_index("connectivity")
         if node_list is None:
-            return sum(1 for e1, e2 in self.conn_edges())
-        return sum(
-            1
-            for e1, e2 in self.conn_edges()
-            if e1 in set(node_list) and e2 in set(node_list)
-        )
+            return index.num_edges
+        return int(index.induced_edge_counts([node_list])[0])
 
     def number_of_tran_edges(self, node_list=None):
         """return number of transition edges in subgraph induced by node_list"""
+        index = self.edge_index("transition")
         if node_list is None:
-            return sum(1 for e1, e2 in self.tran_edges())
-        return sum(
-            1
-            for e1, e2 in self.tran_edges()
-            if e1 in set(node_list) and e2 in set(node_list)
-        )
+            return index.num_edges
+        return int(index.induced_edge_counts([node_list])[0])
+
+    def number_of_induced_edges(self, node_lists, edge_type):
+        """array with the number of edges of `edge_type` in the subgraph
+        induced by each node list in node_lists"""
+        return self.edge_index(edge_type).induced_edge_counts(node_lists)
 
     def conn_in_edges(self, k):
-        for (i, j, data) in self.in_edges(k, data=True):
-            if data["type"] == "connectivity":
-                yield (i, j)
+        yield from self.edge_index("connectivity").in_edges(k)
 
     def tran_in_edges(self, k):
-        for (i, j, data) in self.in_edges(k, data=True):
-            if data["type"] == "transition":
-                yield (i, j)
+        yield from self.edge_index("transition").in_edges(k)
 
     def conn_out_edges(self, k):
-        for (i, j, data) in self.out_edges(k, data=True):
-            if data["type"] == "connectivity":
-                yield (i, j)
+        yield from self.edge_index("connectivity").out_edges(k)
 
     def tran_out_edges(self, k):
-        for (i, j, data) in self.out_edges(k, data=True):
-            if data["type"] == "transition":
-                yield (i, j)
+        yield from self.edge_index("transition").out_edges(k)
 
     def has_tran_edge(self, n0, n1):
         """check if transition edge exists from n0 to n1"""
-        if self.has_edge(n0, n1):
-            return any(
-                data["type"] == "transition"
-                for data in self.get_edge_data(n0, n1).values()
-            )
-        return False
+        return (n0, n1) in self.edge_index("transition").edge_id
 
     def has_conn_edge(self, n0, n1):
         """check if connectivity edge exists from n0 to n1"""
-        if self.has_edge(n0, n1):
-            return any(
-                data["type"] == "connectivity"
-                for data in self.get_edge_data(n0, n1).values()
-            )
-        return False
+        return (n0, n1) in self.edge_index("connectivity").edge_id
 
     def post_tran(self, S):
         """return outgoing transition neighbors from S"""
@@ -231,7 +540,39 @@ class Graph(nx.MultiDiGraph):
             self.nodes[position]["number_of_agents"] += 1
             self.nodes[position]["agents"].append(agent)
 
-    def transition_adjacency_matrix(self):
+    def distance_oracle(self, weighted=False, edge_types=("transition",)):
+        """DistanceOracle over the edges of edge_types, cached until the graph
+        is modified"""
+        key = (tuple(edge_types), weighted)
+        if key not in self._distance_oracle:
+            self._distance_oracle[key] = DistanceOracle(self, edge_types, weighted)
+        return self._distance_oracle[key]
+
+    def diameter(self, node_list=None, edge_types=("transition", "connectivity")):
+        """largest number of edges of edge_types on a shortest path between two
+        nodes of the graph, or of the subgraph induced by node_list"""
+        oracle = self.distance_oracle(edge_types=edge_types)
+        if node_list is None:
+            dist = oracle.all_pairs()
+        else:
+            k = [oracle.node_id[v] for v in dict.fromkeys(node_list)]
+            dist = shortest_path(oracle.adjacency[k][:, k], unweighted=True)
+        if np.isinf(dist).any():
+            raise Exception("Graph is not strongly connected, diameter is infinite")
+        return int(dist.max())
+
+    def adjacency_matrix(self, edge_type, weighted=False):
+        """(A, node_id): CSR adjacency matrix (V, V) of the edges of
+        `edge_type` (see EdgeIndex.adjacency_matrix) and dict(v: k) of the
+        row and column of node v"""
+        index = self.edge_index(edge_type)
+        return index.adjacency_matrix(weighted), dict(index.node_id)
+
+    def transition_adjacency_matrix(self, sparse=False, weighted=False):
+        """dense adjacency list of lists for nodes labeled 0..V-1, or if
+        `sparse` (A, node_id) for any labels, see adjacency_matrix"""
+        if sparse:
+            return self.adjacency_matrix("transition", weighted)
         num_nodes = self.number_of_nodes()
         adj = [[0 for i in range(num_nodes)] for j in range(num_nodes)]
         for n in self:
@@ -239,7 +580,11 @@ class Graph(nx.MultiDiGraph):
                 adj[edge[0]][edge[1]] = 1
         return adj
 
-    def connectivity_adjacency_matrix(self):
+    def connectivity_adjacency_matrix(self, sparse=False, weighted=False):
+        """dense adjacency list of lists for nodes labeled 0..V-1, or if
+        `sparse` (A, node_id) for any labels, see adjacency_matrix"""
+        if sparse:
+            return self.adjacency_matrix("connectivity", weighted)
         num_nodes = self.number_of_nodes()
         adj = [[0 for i in range(num_nodes)] for j in range(num_nodes)]
         for n in self:
@@ -1,5 +1,5 @@
 import sys
-from dataclasses import dataclass
+import time
 
 import scipy.sparse as sp
 import numpy as np
@@ -7,57 +7,109 @@ import numpy as np
 
 RETURN_CODES = {1: "unknown", 2: "optimal", 3: "infeasible", 5: "dual infeasible"}
 
+# entries of the vtype array of variable types
+CONTINUOUS = 0
+INTEGER = 1
+BINARY = 2
 
-@dataclass
-class Constraint:
-    A_eq: sp.coo_matrix = None
-    b_eq: np.array = None
-    A_iq: sp.coo_matrix = None
-    b_iq: np.array = None
+
+class Constraint(object):
+    """
+    Linear constraints
+        A_iq x <= b_iq
+        A_eq x == b_eq
+    stored as a list of named blocks (constraint families). Combining
+    constraints with & and &= only appends blocks; the blocks are stacked
+    once into CSR matrices when the constraint is consumed by solve_ilp.
+    """
+
+    def __init__(self, A_eq=None, b_eq=None, A_iq=None, b_iq=None, name=None):
+        self.eq_blocks = []  # list of (name, A, b)
+        self.iq_blocks = []  # list of (name, A, b)
+        self._cache = {}
+
+        if A_eq is not None:
+            self.eq_blocks.append((name, A_eq, np.asarray(b_eq, dtype=float)))
+        if A_iq is not None:
+            self.iq_blocks.append((name, A_iq, np.asarray(b_iq, dtype=float)))
 
     @property
     def has_iq(self):
-        return self.A_iq is not None
+        return len(self.iq_blocks) > 0
 
     @property
     def has_eq(self):
-        return self.A_eq is not None
+        return len(self.eq_blocks) > 0
 
-    def __and__(self, other):
-        A_eq = None
-        b_eq = None
+    @property
+    def A_eq(self):
+        return self._assemble("eq")[0]
 
-        if self.has_eq or other.has_eq:
-            A_eq = sp.bmat([[c.A_eq] for c in [self, other] if c.A_eq is not None])
-            b_eq = np.hstack([c.b_eq for c in [self, other] if c.b_eq is not None])
+    @property
+    def b_eq(self):
+        return self._assemble("eq")[1]
 
-        A_iq = None
-        b_iq = None
+    @property
+    def A_iq(self):
+        return self._assemble("iq")[0]
 
-        if self.has_iq or other.has_iq:
-            A_iq = sp.bmat([[c.A_iq] for c in [self, other] if c.A_iq is not None])
-            b_iq = np.hstack([c.b_iq for c in [self, other] if c.b_iq is not None])
+    @property
+    def b_iq(self):
+        return self._assemble("iq")[1]
+
+    def _assemble(self, kind):
+        blocks = self.eq_blocks if kind == "eq" else self.iq_blocks
+        if len(blocks) == 0:
+            return None, None
+        if kind not in self._cache:
+            A = sp.vstack([A for _, A, _ in blocks], format="csr")
+            b = np.hstack([b for _, _, b in blocks])
+            self._cache[kind] = (A, b)
+        return self._cache[kind]
+
+    def assemble(self, num_var):
+        """return (A_iq, b_iq, A_eq, b_eq) as CSR matrices with num_var columns"""
+        A_iq, b_iq = self._assemble("iq")
+        A_eq, b_eq = self._assemble("eq")
+        if A_iq is None:
+            A_iq, b_iq = sp.csr_matrix((0, num_var)), np.array([])
+        if A_eq is None:
+            A_eq, b_eq = sp.csr_matrix((0, num_var)), np.array([])
+        return A_iq, b_iq, A_eq, b_eq
+
+    def family_sizes(self):
+        """return dict(name: (num_rows, nnz)) summed over the blocks of each family"""
+        sizes = {}
+        for name, A, _ in self.eq_blocks + self.iq_blocks:
+            rows, nnz = sizes.get(name, (0, 0))
+            sizes[name] = (rows + A.shape[0], nnz + A.nnz)
+        return sizes
 
-        return Constraint(A_eq=A_eq, b_eq=b_eq, A_iq=A_iq, b_iq=b_iq)
+    def __and__(self, other):
+        ret = Constraint()
+        ret.eq_blocks = self.eq_blocks + other.eq_blocks
+        ret.iq_blocks = self.iq_blocks + other.iq_blocks
+        return ret
 
     def __iand__(self, other):
-        if self.has_eq and other.has_eq:
-            self.A_eq = sp.bmat([[self.A_eq], [other.A_eq]])
-            self.b_eq = np.hstack([self.b_eq, other.b_eq])
-        elif other.has_eq:
-            self.A_eq = other.A_eq
-            self.b_eq = other.b_eq
-        if self.has_iq and other.has_iq:
-            self.A_iq = sp.bmat([[self.A_iq], [other.A_iq]])
-            self.b_iq = np.hstack([self.b_iq, other.b_iq])
-        elif other.has_iq:
-            self.A_iq = other.A_iq
-            self.b_iq = other.b_iq
-
+        self.eq_blocks += other.eq_blocks
+        self.iq_blocks += other.iq_blocks
+        self._cache = {}
         return self
 
 
-def solve_ilp(c, constraint, J_int=None, J_bin=None, solver="gurobi", output=0):
+def solve_ilp(
+    c,
+    constraint,
+    J_int=None,
+    J_bin=None,
+    solver="gurobi",
+    output=0,
+    x0=None,
+    J_zero=None,
+    vtype=None,
+    lazy=None,
+):
     """
     Solve the ILP
         min c' x
@@ -66,65 +118,149 @@ def solve_ilp(c, constraint, J_int=None, J_bin=None, solver="gurobi", output=0):
              x[J_int] are integers in N
              x[J_bin] are binary {0, 1}
              x >= 0
-    using the solver `solver`.
+    using the solver `solver` ("gurobi", "mosek" or "highs").
     If `J_int` and `J_bin` are not given, all variables are treated as integers.
+    Instead of J_int and J_bin the variable types can be given as a uint8 array
+    `vtype` with entries CONTINUOUS, INTEGER or BINARY.
+
+    `x0` is an optional MIP start, entries that are nan are left to the solver.
+    Gurobi completes partial starts, Mosek only uses x0 if all integer entries
+    are given, and the HiGHS interface in scipy does not take a start.
+
+    The variables in `J_zero` are fixed to zero: their columns are removed
+    before the solver model is built and they are zero in the returned x.
+
+    `lazy` is an optional function that maps an integer solution x to a
+    Constraint of rows violated by x (without rows if x is feasible). Gurobi
+    calls it for each new incumbent and adds the rows as lazy constraints,
+    the other backends re-solve with the rows added until none is returned.
 
     Returns a dict sol with the fields
       'status': solver status
       'rcode': return code (2: optimal, 3: infeasible, 5: dual infeasible, 1: unknown)
       'x': the primary solution
+    Backends that separate model construction from optimization also report
+      'build time': seconds spent building the solver model
+      'solve time': seconds spent in the solver
     """
 
     if solver is None:
         solver = "gurobi"
 
-    if J_int is None and J_bin is None:
-        J_int = range(constraint.Aiq.shape[1])
-        J_bin = []
-    elif J_int is None:
-        J_int = []
-    elif J_bin is None:
-        J_bin = []
-
-    if set(J_bin) & set(J_int):
-        raise Exception("J_int and J_bin overlap")
-
-    if constraint.has_eq and not constraint.has_iq:
-        constraint.A_iq = sp.coo_matrix((0, constraint.A_eq.shape[1]))
-        constraint.b_iq = np.array([])
-
-    if constraint.has_iq and not constraint.has_eq:
-        constraint.A_eq = sp.coo_matrix((0, constraint.A_iq.shape[1]))
-        constraint.b_eq = np.array([])
+    if vtype is None:
+        vtype = index_vtype(len(c), J_int, J_bin)
+    elif J_int is not None or J_bin is not None:
+        raise Exception("Give either vtype or J_int and J_bin")
+    vtype = np.asarray(vtype, dtype=np.uint8)
+
+    # backends without callbacks re-solve until lazy returns no rows
+    if lazy is not None and solver != "gurobi":
+        while True:
+            sol = solve_ilp(
+                c,
+                constraint,
+                solver=solver,
+                output=output,
+                x0=x0,
+                J_zero=J_zero,
+                vtype=vtype,
+            )
+            if sol["status"] != "optimal":
+                return sol
+            cuts = lazy(sol["x"])
+            if sum(rows for rows, _ in cuts.family_sizes().values()) == 0:
+                return sol
+            constraint = constraint & cuts
+
+    A_iq, b_iq, A_eq, b_eq = constraint.assemble(len(c))
+
+    # Remove the columns of variables that are fixed to zero
+    num_var = len(c)
+    keep = None
+    if J_zero is not None and len(J_zero) > 0:
+        keep = np.ones(num_var, dtype=bool)
+        keep[np.asarray(J_zero, dtype=int)] = False
+        c = np.asarray(c)[keep]
+        A_iq = A_iq[:, keep]
+        A_eq = A_eq[:, keep]
+        vtype = vtype[keep]
+        if x0 is not None:
+            x0 = np.asarray(x0)[keep]
+        if lazy is not None:
+            lazy_all = lazy
+
+            def lazy(x_keep):
+                x = np.zeros(num_var)
+                x[keep] = x_keep
+                A_iq, b_iq, A_eq, b_eq = lazy_all(x).assemble(num_var)
+                return Constraint(
+                    A_eq=A_eq[:, keep], b_eq=b_eq, A_iq=A_iq[:, keep], b_iq=b_iq
+                )
 
     if solver == "gurobi":
         sol = _solve_gurobi(
             c,
-            constraint.A_iq,
-            constraint.b_iq,
-            constraint.A_eq,
-            constraint.b_eq,
-            J_int,
-            J_bin,
+            A_iq,
+            b_iq,
+            A_eq,
+            b_eq,
+            vtype,
             output,
+            x0,
+            lazy,
         )
     elif solver == "mosek":
         sol = _solve_mosek(
             c,
-            constraint.A_iq,
-            constraint.b_iq,
-            constraint.A_eq,
-            constraint.b_eq,
-            J_int,
-            J_bin,
+            A_iq,
+            b_iq,
+            A_eq,
+            b_eq,
+            vtype,
             output,
+            x0,
         )
-    
+    elif solver == "highs":
+        sol = _solve_highs(
+            c,
+            A_iq,
+            b_iq,
+            A_eq,
+            b_eq,
+            vtype,
+            output,
+            x0,
+        )
+    else:
+        raise Exception("Unknown solver '{}'".format(solver))
+
+    if keep is not None and "x" in sol:
+        x = np.zeros(num_var)
+        x[keep] = sol["x"]
+        sol["x"] = x
+
     sol["status"] = RETURN_CODES[sol["rcode"]]
     return sol
 
 
-def _solve_mosek(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
+def index_vtype(num_var, J_int=None, J_bin=None):
+    """vtype array of num_var variables with integers J_int and binaries J_bin,
+    all variables are integers if neither is given"""
+    if J_int is None and J_bin is None:
+        return np.full(num_var, INTEGER, dtype=np.uint8)
+
+    J_int = np.asarray([] if J_int is None else J_int, dtype=int)
+    J_bin = np.asarray([] if J_bin is None else J_bin, dtype=int)
+    if len(np.intersect1d(J_int, J_bin)) > 0:
+        raise Exception("J_int and J_bin overlap")
+
+    vtype = np.full(num_var, CONTINUOUS, dtype=np.uint8)
+    vtype[J_int] = INTEGER
+    vtype[J_bin] = BINARY
+    return vtype
+
+
+def _solve_mosek(c, Aiq, biq, Aeq, beq, vtype, output, x0=None):
     """
         Solve optimization problem
         min c' x
@@ -147,6 +283,12 @@ def _solve_mosek(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
     num_iq = Aiq.shape[0]
     num_eq = Aeq.shape[0]
 
+    Aiq = Aiq.tocoo()
+    Aeq = Aeq.tocoo()
+
+    J_bin = np.flatnonzero(vtype == BINARY).tolist()
+    J_int = np.flatnonzero(vtype == INTEGER).tolist()
+
     env = mosek.Env()
     env.set_Stream(mosek.streamtype.log, streamprinter)
 
@@ -185,6 +327,11 @@ def _solve_mosek(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
         num_iq, num_iq + num_eq, [mosek.boundkey.fx] * num_eq, beq, beq
     )
 
+    # MIP start, only if all integer variables are given
+    if x0 is not None and not np.any(np.isnan(np.asarray(x0)[J_bin + J_int])):
+        task.putxxslice(mosek.soltype.itg, 0, num_var, np.nan_to_num(x0))
+        task.putintparam(mosek.iparam.mio_construct_sol, mosek.onoff.on)
+
     task.putobjsense(mosek.objsense.minimize)
     task.optimize()
 
@@ -215,7 +362,7 @@ def _solve_mosek(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
     return sol
 
 
-def _solve_gurobi(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
+def _solve_gurobi(c, Aiq, biq, Aeq, beq, vtype, output, x0=None, lazy=None):
     """
         Solve optimization problem
         min c' x
@@ -223,10 +370,11 @@ def _solve_gurobi(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
              Aeq x == beq
              x[J] are integers
              x >= 0
-        using the Gurobi solver
+        using the Gurobi solver, rows returned by lazy(x) for new
+        incumbents x are added as lazy constraints
     """
 
-    from gurobipy import GRB, Model, LinExpr
+    from gurobipy import GRB, LinExpr, Model
 
     def solCallback(model, where):
         if where == GRB.callback.MIPSOL:
@@ -234,6 +382,20 @@ def _solve_gurobi(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
             runtime = model.cbGet(GRB.callback.RUNTIME)
             if solcnt > 0 and runtime > 10 * 3600:
                 model.terminate()
+            if lazy is not None:
+                x_sol = np.array(model.cbGetSolution(x_list))
+                x_sol = np.where(vtype == CONTINUOUS, x_sol, np.round(x_sol))
+                A_iq, b_iq, A_eq, b_eq = lazy(x_sol).assemble(num_var)
+                for A, b, sense in [
+                    (A_iq, b_iq, GRB.LESS_EQUAL),
+                    (A_eq, b_eq, GRB.EQUAL),
+                ]:
+                    for i in range(A.shape[0]):
+                        row = A[i]
+                        expr = LinExpr(
+                            row.data.tolist(), [x_list[j] for j in row.indices]
+                        )
+                        model.cbLazy(expr, sense, b[i])
 
     num_var = Aiq.shape[1]
 
@@ -249,39 +411,38 @@ def _solve_gurobi(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
     # http://www.gurobi.com/documentation/6.0/refman/mip_models.html
     m.setParam(GRB.Param.TimeLimit, 10 * 3600)
     m.setParam(GRB.Param.MIPFocus, 1)
+    if lazy is not None:
+        m.setParam(GRB.Param.LazyConstraints, 1)
 
-    x = []
-    for i in range(num_var):
-        if i in J_int:
-            x.append(m.addVar(vtype=GRB.INTEGER, obj=c[i]))
-        elif i in J_bin:
-            x.append(m.addVar(vtype=GRB.BINARY, obj=c[i]))
-        else:
-            x.append(m.addVar(obj=c[i]))
-    m.update()
+    t0 = time.time()
+
+    # Variable types and bounds, binary constrained to [0, 1]
+    grb_vtype = np.array([GRB.CONTINUOUS, GRB.INTEGER, GRB.BINARY])[vtype]
+    ub = np.where(vtype == BINARY, 1, GRB.INFINITY)
+
+    x = m.addMVar(
+        num_var, lb=0.0, ub=ub, obj=np.asarray(c, dtype=float), vtype=grb_vtype
+    )
+    x_list = x.tolist()
+
+    if Aiq.shape[0] > 0:
+        m.addMConstr(Aiq, x, GRB.LESS_EQUAL, np.asarray(biq, dtype=float))
 
-    for i in range(Aiq.shape[0]):
-        start = Aiq.indptr[i]
-        end = Aiq.indptr[i + 1]
-        variables = [x[j] for j in Aiq.indices[start:end]]
-        coeff = Aiq.data[start:end]
-        expr = LinExpr(coeff, variables)
-        m.addConstr(lhs=expr, sense=GRB.LESS_EQUAL, rhs=biq[i])
-
-    for i in range(Aeq.shape[0]):
-        start = Aeq.indptr[i]
-        end = Aeq.indptr[i + 1]
-        variables = [x[j] for j in Aeq.indices[start:end]]
-        coeff = Aeq.data[start:end]
-        expr = LinExpr(coeff, variables)
-        m.addConstr(lhs=expr, sense=GRB.EQUAL, rhs=beq[i])
+    if Aeq.shape[0] > 0:
+        m.addMConstr(Aeq, x, GRB.EQUAL, np.asarray(beq, dtype=float))
+
+    # MIP start, nan entries are completed by Gurobi
+    if x0 is not None:
+        x.Start = np.where(np.isnan(x0), GRB.UNDEFINED, x0)
 
     m.update()
+    build_time = time.time() - t0
+
     m.optimize(solCallback)
 
-    sol = {}
+    sol = {"build time": build_time, "solve time": m.Runtime}
     if m.status == GRB.status.OPTIMAL:
-        sol["x"] = np.array([var.x for var in x])
+        sol["x"] = x.X
         sol["primal objective"] = m.objVal
     if m.status in [2, 3, 5]:
         sol["rcode"] = m.status
@@ -289,3 +450,246 @@ def _solve_gurobi(c, Aiq, biq, Aeq, beq, J_int, J_bin, output):
         sol["rcode"] = 1
     
     return sol
+
+
+def _solve_highs(c, Aiq, biq, Aeq, beq, vtype, output, x0=None):
+    """
+        Solve optimization problem
+        min c' x
+        s.t. Aiq x <= biq
+             Aeq x == beq
+             x[J] are integers
+             x >= 0
+        using the HiGHS solver shipped with scipy (x0 is ignored, scipy's
+        milp does not accept a MIP start)
+    """
+
+    from scipy.optimize import milp, Bounds, LinearConstraint
+
+    num_var = Aiq.shape[1]
+    num_iq = Aiq.shape[0]
+
+    # Integers
+    integrality = (vtype != CONTINUOUS).astype(np.uint8)
+
+    # Positivity, binary constrained to [0, 1]
+    ub = np.where(vtype == BINARY, 1, np.inf)
+
+    # Stack inequality and equality constraints into one row block
+    A = sp.vstack([Aiq, Aeq], format="csr")
+    lb_A = np.hstack([np.full(num_iq, -np.inf), beq])
+    ub_A = np.hstack([biq, beq])
+
+    constraints = []
+    if A.shape[0] > 0:
+        constraints.append(LinearConstraint(A, lb_A, ub_A))
+
+    res = milp(
+        c=np.asarray(c, dtype=float),
+        constraints=constraints,
+        integrality=integrality,
+        bounds=Bounds(np.zeros(num_var), ub),
+        options={"disp": bool(output), "time_limit": 10 * 3600},
+    )
+
+    sol = {}
+    if res.x is not None:
+        # HiGHS returns integer variables within tolerance, snap them
+        sol["x"] = np.where(integrality == 1, np.round(res.x), res.x)
+        sol["primal objective"] = res.fun
+    if res.status == 0:
+        sol["rcode"] = 2
+    elif res.status == 2:
+        sol["rcode"] = 3
+    elif res.status == 3:
+        sol["rcode"] = 5
+    else:
+        sol["rcode"] = 1
+
+    return sol
+
+
+class PersistentModel(object):
+    """
+    ILP that is kept alive while a problem grows, e.g. over a horizon search.
+
+    Constraints are added with add_constraint, with their columns mapped to
+    model columns through `col_map` (see add_vars). Rows added under a
+    `group` are tracked per constraint family and can be removed again with
+    remove_group, all other rows stay in the model. With Gurobi the rows live
+    in a Gurobi model that is modified in place, other solvers keep the rows
+    per family and rebuild the model on each solve.
+    """
+
+    def __init__(self, solver="gurobi", output=0):
+        if solver is None:
+            solver = "gurobi"
+        if solver not in ["gurobi", "mosek", "highs"]:
+            raise Exception("Unknown solver '{}'".format(solver))
+        self.solver = solver
+        self.output = output
+
+        self.num_var = 0
+        self.binary = np.zeros(0, dtype=bool)
+        self.groups = {}  # dict(group: dict(name: rows)) of removable rows
+
+        if self.solver == "gurobi":
+            from gurobipy import GRB, Model
+
+            self._m = Model()
+            self._m.setParam(GRB.Param.OutputFlag, output)
+            self._m.setParam(GRB.Param.TimeLimit, 10 * 3600)
+            self._m.setParam(GRB.Param.MIPFocus, 1)
+        else:
+            self._rows = []  # list of (A_iq, b_iq, A_eq, b_eq) of permanent rows
+
+    def add_vars(self, num, binary):
+        """append num integer (binary if `binary`) columns, return their indices"""
+        if self.solver == "gurobi":
+            from gurobipy import GRB
+
+            self._m.addMVar(
+                num,
+                lb=0.0,
+                ub=1.0 if binary else GRB.INFINITY,
+                vtype=GRB.BINARY if binary else GRB.INTEGER,
+            )
+        cols = np.arange(self.num_var, self.num_var + num)
+        self.num_var += num
+        self.binary = np.hstack([self.binary, np.full(num, binary)])
+        return cols
+
+    def _map_block(self, A, col_map):
+        """map the columns of A from the caller's layout to model columns"""
+        A = A.tocsr()
+        return sp.csr_matrix(
+            (A.data, col_map[A.indices], A.indptr), shape=(A.shape[0], self.num_var)
+        )
+
+    def _widen(self, A):
+        """pad A with zero columns for model columns added after A"""
+        return sp.csr_matrix(
+            (A.data, A.indices, A.indptr), shape=(A.shape[0], self.num_var)
+        )
+
+    def _add_rows(self, A_iq, b_iq, A_eq, b_eq):
+        """add rows in model columns, return handle to remove them"""
+        if self.solver == "gurobi":
+            from gurobipy import GRB
+
+            self._m.update()
+            A_iq = self._widen(A_iq)
+            A_eq = self._widen(A_eq)
+            handle = []
+            if A_iq.shape[0] > 0:
+                handle += self._m.addMConstr(A_iq, None, GRB.LESS_EQUAL, b_iq).tolist()
+            if A_eq.shape[0] > 0:
+                handle += self._m.addMConstr(A_eq, None, GRB.EQUAL, b_eq).tolist()
+            return handle
+        else:
+            return (A_iq, b_iq, A_eq, b_eq)
+
+    def add_constraint(self, constraint, col_map, group=None):
+        """
+        Add the rows of `constraint`, whose columns are mapped to model columns
+        by col_map. If `group` is given the rows are tracked per constraint
+        family and can be removed with remove_group(group).
+        """
+        families = {}
+        for blocks, k in [(constraint.iq_blocks, 0), (constraint.eq_blocks, 2)]:
+            for name, A, b in blocks:
+                family = families.setdefault(name, ([], [], [], []))
+                family[k].append(self._map_block(A, col_map))
+                family[k + 1].append(b)
+
+        for name, (A_iq, b_iq, A_eq, b_eq) in families.items():
+            handle = self._add_rows(
+                sp.vstack(A_iq + [sp.csr_matrix((0, self.num_var))], format="csr"),
+                np.hstack(b_iq + [np.array([])]),
+                sp.vstack(A_eq + [sp.csr_matrix((0, self.num_var))], format="csr"),
+                np.hstack(b_eq + [np.array([])]),
+            )
+            if group is not None:
+                self.groups.setdefault(group, {}).setdefault(name, []).append(handle)
+            elif self.solver != "gurobi":
+                self._rows.append(handle)
+
+    def remove_group(self, group):
+        """remove all rows added under `group`"""
+        for handles in self.groups.pop(group, {}).values():
+            if self.solver == "gurobi":
+                for handle in handles:
+                    self._m.remove(handle)
+
+    def group_sizes(self, group):
+        """return dict(name: num_rows) of the rows in `group`"""
+        sizes = {}
+        for name, handles in self.groups.get(group, {}).items():
+            if self.solver == "gurobi":
+                sizes[name] = sum(len(handle) for handle in handles)
+            else:
+                sizes[name] = sum(h[0].shape[0] + h[2].shape[0] for h in handles)
+        return sizes
+
+    def solve(self, c, col_map, x0=None):
+        """
+        Solve min c' x s.t. the rows in the model, where x, c and the MIP start
+        x0 are in the caller's layout given by col_map. Model columns that are
+        not in col_map get zero cost and no start value.
+        """
+        c_model = np.zeros(self.num_var)
+        c_model[col_map] = c
+        x0_model = None
+        if x0 is not None:
+            x0_model = np.full(self.num_var, np.nan)
+            x0_model[col_map] = x0
+
+        if self.solver == "gurobi":
+            from gurobipy import GRB
+
+            t0 = time.time()
+            self._m.update()
+            x = self._m.getVars()
+            self._m.setAttr("Obj", x, c_model.tolist())
+            if x0_model is not None:
+                x0_model[np.isnan(x0_model)] = GRB.UNDEFINED
+                self._m.setAttr("Start", x, x0_model.tolist())
+            else:
+                self._m.setAttr("Start", x, [GRB.UNDEFINED] * self.num_var)
+            self._m.update()
+            build_time = time.time() - t0
+
+            self._m.optimize()
+
+            sol = {"build time": build_time, "solve time": self._m.Runtime}
+            if self._m.status == GRB.status.OPTIMAL:
+                sol["x"] = np.array(self._m.getAttr("X", x))[col_map]
+                sol["primal objective"] = self._m.objVal
+            sol["rcode"] = self._m.status if self._m.status in [2, 3, 5] else 1
+            sol["status"] = RETURN_CODES[sol["rcode"]]
+            return sol
+
+        # other solvers: rebuild the model from the stored rows
+        rows = self._rows + [
+            handle
+            for families in self.groups.values()
+            for handles in families.values()
+            for handle in handles
+        ]
+        constraint = Constraint()
+        for A_iq, b_iq, A_eq, b_eq in rows:
+            constraint &= Constraint(
+                A_iq=self._widen(A_iq), b_iq=b_iq, A_eq=self._widen(A_eq), b_eq=b_eq
+            )
+        vtype = np.where(self.binary, BINARY, INTEGER).astype(np.uint8)
+        sol = solve_ilp(
+            c_model,
+            constraint,
+            solver=self.solver,
+            output=self.output,
+            x0=x0_model,
+            vtype=vtype,
+        )
+        if "x" in sol:
+            sol["x"] = sol["x"][col_map]
+        return sol
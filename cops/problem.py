@@ -4,11 +4,18 @@ from copy import deepcopy
 from itertools import chain, combinations, product
 
 import numpy as np
-import networkx as nx
+import scipy.sparse as sp
+from scipy.sparse.csgraph import shortest_path
 
 from colorama import Fore, Style
 
-from cops.optimization_wrappers import solve_ilp, Constraint
+from cops.optimization_wrappers import (
+    solve_ilp,
+    Constraint,
+    PersistentModel,
+    BINARY,
+    INTEGER,
+)
 from cops.graph import Graph
 
 from cops.constr_dyn import (
@@ -20,14 +27,19 @@ from cops.constr_flow import (
     generate_flow_bridge_constraints,
     generate_flow_connectivity_constraints,
     generate_flow_master_constraints,
+    generate_flow_finish_constraints,
 )
 from cops.constr_powerset import (
     generate_powerset_bridge_constraints,
     generate_connectivity_constraint,
     generate_connectivity_constraint_all,
+    separate_connectivity_constraint,
 )
 from cops.constr_cluster import constraint_static_master
 
+# largest horizon proven infeasible for each problem (see horizon_key)
+INFEASIBLE_HORIZONS = {}
+
 
 @dataclass
 class Variable(object):
@@ -36,6 +48,52 @@ class Variable(object):
     binary: bool = False
 
 
+class VariableLayout(object):
+    """
+    Variables of an ILP as consecutive blocks, each block is a tensor of the
+    given shape stored in C order. The index functions take integer ids
+    (positions in dict_node, dict_agent, dict_tran, dict_conn) that can be
+    arrays, and broadcast them against each other.
+    """
+
+    def __init__(self, blocks):
+        """`blocks` is a list of (name, shape, binary)"""
+        self.vars = {}
+        self.shapes = {}
+        start = 0
+        for name, shape, binary in blocks:
+            size = int(np.prod(shape))
+            self.vars[name] = Variable(start=start, size=size, binary=binary)
+            self.shapes[name] = tuple(shape)
+            start += size
+        self.num_vars = start
+
+    def idx(self, name, *ids):
+        """indices of entries ids = (i0, i1, ...) of block `name`"""
+        ids = tuple(np.asarray(i).astype(int, copy=False) for i in ids)
+        return self.vars[name].start + np.ravel_multi_index(ids, self.shapes[name])
+
+    def vtype(self):
+        """uint8 array of the variable types, the variables of binary blocks
+        are BINARY and all others INTEGER"""
+        vtype = np.empty(self.num_vars, dtype=np.uint8)
+        for var in self.vars.values():
+            vtype[var.start : var.start + var.size] = BINARY if var.binary else INTEGER
+        return vtype
+
+    def tensor(self, name):
+        """all indices of block `name` as an array of the block shape"""
+        var = self.vars[name]
+        return np.arange(var.start, var.start + var.size).reshape(self.shapes[name])
+
+    def block(self, x, name):
+        """the entries of x in block `name` as an array of the block shape"""
+        var = self.vars[name]
+        return np.asarray(x)[var.start : var.start + var.size].reshape(
+            self.shapes[name]
+        )
+
+
 class AbstractConnectivityProblem(object):
     def __init__(self, **kwargs):
 
@@ -106,10 +164,15 @@ class ConnectivityProblem(AbstractConnectivityProblem):
         self.src = None  # set(r) of source agents
         self.snk = None  # set(r) of sink agents
         self.always_src = False  # if true, always use source->sink type constraint
+        self.cumulative_master = False  # if true, use O(T) master info constraints
+        self.prune_unreachable = True  # if true, drop provably zero variables
+        self.min_horizon = False  # if true, minimize the finishing time up to T
+        self.aggregate_agents = False  # if true, count identical agents in solve_flow
 
         self.reward_demand = 0.4  # fraction of total reward demanded
         self.max_reward_demand_iter = 5 # max number of iterations to find a better solutions
         self.extra_constr = None  # additional constraints
+        self.warm_start = True  # start the solver from the stored solution
 
         if "src" in kwargs:
             self.src = kwargs["src"]
@@ -117,21 +180,39 @@ class ConnectivityProblem(AbstractConnectivityProblem):
             self.snk = kwargs["snk"]
         if "always_src" in kwargs:
             self.always_src = kwargs["always_src"]
+        if "cumulative_master" in kwargs:
+            self.cumulative_master = kwargs["cumulative_master"]
+        if "prune_unreachable" in kwargs:
+            self.prune_unreachable = kwargs["prune_unreachable"]
+        if "min_horizon" in kwargs:
+            self.min_horizon = kwargs["min_horizon"]
+        if "aggregate_agents" in kwargs:
+            self.aggregate_agents = kwargs["aggregate_agents"]
         if "reward_demand" in kwargs:
             self.reward_demand = kwargs["reward_demand"]
         if "extra_constr" in kwargs:
             self.extra_constr = kwargs["extra_constr"]
+        if "warm_start" in kwargs:
+            self.warm_start = kwargs["warm_start"]
 
         ##########################
         #### INTERNAL MEMORY #####
         ##########################
 
         # ILP SETUP
-        self.vars = None
+        self.layout = None  # VariableLayout of the current ILP
+        self.vars = None  # dict(name: Variable) of the variable blocks in layout
         self.dict_tran = None
         self.dict_conn = None
         self.dict_node = None
         self.dict_agent = None
+        self.agent_units = None  # list(list(r)) of agents that share z, xf
+        self.te_pred_cache = None  # (key, pred) of time_expanded_predecessors
+
+        # PERSISTENT SOLVER MODEL (incremental horizon search)
+        self.persistent_model = None
+        self.persistent_cols = None  # dict(name: array) of model columns per variable
+        self.persistent_T = None  # horizon currently in the persistent model
 
     ##PROPERTIES##
     @property
@@ -158,6 +239,14 @@ class ConnectivityProblem(AbstractConnectivityProblem):
     def num_r(self):
         return len(self.graph.agents)
 
+    @property
+    def num_units(self):
+        return len(self.agent_units)
+
+    @property
+    def unit_sizes(self):
+        return np.array([len(unit) for unit in self.agent_units], dtype=int)
+
     @property
     def num_v(self):
         return self.graph.number_of_nodes()
@@ -197,190 +286,440 @@ class ConnectivityProblem(AbstractConnectivityProblem):
         if type(self.master) is not list:
             self.master = [self.master]
 
-        # Create dictionaries for (i,j)->k mapping for edges
-        self.dict_tran = {(i, j): k for k, (i, j) in enumerate(self.graph.tran_edges())}
-        self.dict_conn = {(i, j): k for k, (i, j) in enumerate(self.graph.conn_edges())}
+        # Create dictionaries for (i,j)->k mapping for edges, in the edge order
+        # of the graph's edge index
+        self.dict_tran = dict(self.graph.edge_index("transition").edge_id)
+        self.dict_conn = dict(self.graph.edge_index("connectivity").edge_id)
         # Create dictionary for v -> k mapping for nodes
         self.dict_node = {v: k for k, v in enumerate(self.graph.nodes)}
-        # Create agent dictionary
-        self.dict_agent = {r: k for k, r in enumerate(self.graph.agents)}
+        # Create agent dictionary, agents in the same unit share an index
+        if self.aggregate_agents:
+            self.agent_units = self.identical_agents()
+        else:
+            self.agent_units = [[r] for r in self.graph.agents]
+        self.dict_agent = {r: k for k, rs in enumerate(self.agent_units) for r in rs}
+
+    def identical_agents(self):
+        """list of units of interchangeable agents in the order of their first
+        agent: agents that are not sources, sinks, masters, static, big or
+        have a final position are grouped by eagents membership and initial
+        node, all other agents are units of their own"""
+        special = set(self.src) | set(self.snk) | set(self.master)
+        special |= set(self.static_agents) | set(self.big_agents)
+        special |= set(self.final_position or {})
+
+        units = []
+        unit_of = {}
+        for r, v in self.graph.agents.items():
+            if r in special:
+                units.append([r])
+                continue
+            key = (r in self.eagents, v)
+            if key not in unit_of:
+                unit_of[key] = len(units)
+                units.append([])
+            units[unit_of[key]].append(r)
+        return units
 
     def get_z_idx(self, r, v, t):
-        R = self.dict_agent[r]
-        k = self.dict_node[v]
-        return self.vars["z"].start + np.ravel_multi_index(
-            (t, k, R), (self.T + 1, self.num_v, self.num_r)
-        )
+        return self.layout.idx("z", t, self.dict_node[v], self.dict_agent[r])
 
     def get_e_idx(self, i, j, t):
-        k = self.dict_tran[(i, j)]
-        idx = np.ravel_multi_index((t, k), (self.T, len(self.dict_tran)))
-        return self.vars["e"].start + idx
+        return self.layout.idx("e", t, self.dict_tran[(i, j)])
 
     def get_y_idx(self, v, k):
-        V = self.dict_node[v]
-        K = k - 1
-        idx = np.ravel_multi_index((V, K), (len(self.dict_node), self.num_r))
-        return self.vars["y"].start + idx
+        return self.layout.idx("y", self.dict_node[v], k - 1)
 
     def get_yb_idx(self, b, v, t):
-        idx = np.ravel_multi_index((t, b, v), (self.T + 1, self.num_src, self.num_v))
-        return self.vars["yb"].start + idx
+        return self.layout.idx("yb", t, b, v)
 
     def get_f_idx(self, b, i, j, t):
-        k = self.dict_tran[(i, j)]
-        idx = np.ravel_multi_index(
-            (t, b, k), (self.T, self.num_min_src_snk, len(self.dict_tran))
-        )
-        return self.vars["f"].start + idx
+        return self.layout.idx("f", t, b, self.dict_tran[(i, j)])
 
     def get_fbar_idx(self, b, i, j, t):
-        k = self.dict_conn[(i, j)]
-        idx = np.ravel_multi_index(
-            (t, b, k), (self.T + 1, self.num_min_src_snk, len(self.dict_conn))
-        )
-        return self.vars["fbar"].start + idx
+        return self.layout.idx("fbar", t, b, self.dict_conn[(i, j)])
 
     def get_x_idx(self, b, i, j, t):
-        k = self.dict_tran[(i, j)]
-        idx = np.ravel_multi_index(
-            (t, b, k), (self.T, self.num_src, len(self.dict_tran))
-        )
-        return self.vars["x"].start + idx
+        return self.layout.idx("x", t, b, self.dict_tran[(i, j)])
 
     def get_xbar_idx(self, b, i, j, t):
-        k = self.dict_conn[(i, j)]
-        idx = np.ravel_multi_index(
-            (t, b, k), (self.T + 1, self.num_src, len(self.dict_conn))
-        )
-        return self.vars["xbar"].start + idx
+        return self.layout.idx("xbar", t, b, self.dict_conn[(i, j)])
 
     def get_xf_idx(self, r, i, j, t):
-        R = self.dict_agent[r]
-        k = self.dict_tran[(i, j)]
-        idx = np.ravel_multi_index(
-            (t, R, k), (self.T, len(self.graph.agents), len(self.dict_tran))
-        )
-        return self.vars["xf"].start + idx
+        return self.layout.idx("xf", t, self.dict_agent[r], self.dict_tran[(i, j)])
 
     def get_m_idx(self, i, j, t):
-        k = self.dict_tran[(i, j)]
-        idx = np.ravel_multi_index((t, k), (self.T, len(self.dict_tran)))
-        return self.vars["m"].start + idx
+        return self.layout.idx("m", t, self.dict_tran[(i, j)])
 
     def get_mbar_idx(self, i, j, t):
-        k = self.dict_conn[(i, j)]
-        idx = np.ravel_multi_index((t, k), (self.T + 1, len(self.dict_conn)))
-        return self.vars["mbar"].start + idx
+        return self.layout.idx("mbar", t, self.dict_conn[(i, j)])
+
+    def get_mc_idx(self, v, t):
+        return self.layout.idx("mc", t, self.dict_node[v])
+
+    def edge_ends(self, dict_edge):
+        """node ids (num_edges, 2) of the end points of the edges in dict_edge,
+        ordered by edge id"""
+        return np.array(
+            [[self.dict_node[i], self.dict_node[j]] for i, j in dict_edge], dtype=int
+        ).reshape(-1, 2)
+
+    ##PRESOLVE##
+
+    def reachable_z(self):
+        """bool array (T+1, U, V) that is False where z[r, v, t] is provably
+        zero: v is not reachable from the initial position of r in exactly t
+        transitions, or the final position of r is not reachable from v in
+        exactly T - t transitions. Static agents stay at their initial node."""
+
+        tran = self.edge_ends(self.dict_tran)
+
+        def step(S, fwd):
+            src, dst = (tran[:, 0], tran[:, 1]) if fwd else (tran[:, 1], tran[:, 0])
+            ret = np.zeros(S.shape, dtype=int)
+            np.add.at(ret.T, dst, S[:, src].T)
+            return ret > 0
+
+        reach = np.zeros((self.T + 1, self.num_units, self.num_v), dtype=bool)
+        for r, v in self.graph.agents.items():
+            reach[0, self.dict_agent[r], self.dict_node[v]] = True
+        for t in range(self.T):
+            reach[t + 1] = step(reach[t], True)
+
+        # backwards from final positions
+        back = np.ones((self.num_units, self.num_v), dtype=bool)
+        final_agents = np.zeros(self.num_units, dtype=bool)
+        if self.final_position:
+            for r, v in self.final_position.items():
+                back[self.dict_agent[r]] = False
+                back[self.dict_agent[r], self.dict_node[v]] = True
+                final_agents[self.dict_agent[r]] = True
+        for t in range(self.T, -1, -1):
+            reach[t] &= back
+            if t > 0:
+                back = np.where(final_agents[:, None], step(back, False), True)
+
+        for r in self.static_agents:
+            R = self.dict_agent[r]
+            reach[:, R, :] = False
+            reach[:, R, self.dict_node[self.graph.agents[r]]] = True
+
+        return reach
+
+    def unreachable_flow_vars(self):
+        """indices of the flow variables that are provably zero because the
+        time-expanded nodes or edges they live on can not be reached by an
+        agent (see reachable_z)"""
+
+        reach = self.reachable_z()
+        occupied = reach.any(axis=1)  # (T+1, V)
+
+        tran = self.edge_ends(self.dict_tran)
+        conn = self.edge_ends(self.dict_conn)
+
+        # (T, U, Et): agent r can move along the edge from t to t + 1
+        moving = reach[:-1][:, :, tran[:, 0]] & reach[1:][:, :, tran[:, 1]]
+        # (T, Et) and (T+1, Ec): some agent can carry flow over the edge
+        tran_used = moving.any(axis=1)
+        conn_used = occupied[:, conn[:, 0]] & occupied[:, conn[:, 1]]
+
+        B = self.num_min_src_snk
+        unreachable = [
+            ("z", ~reach.transpose(0, 2, 1)),
+            ("xf", ~moving),
+            ("f", np.repeat(~tran_used[:, None, :], B, axis=1)),
+            ("fbar", np.repeat(~conn_used[:, None, :], B, axis=1)),
+            ("m", ~tran_used),
+            ("mbar", ~conn_used),
+        ]
+        return np.hstack([self.layout.tensor(name)[mask] for name, mask in unreachable])
+
+    def horizon_lower_bound(self, connectivity=True, **kwargs):
+        """lower bound on the smallest horizon T for which solve_flow can be
+        feasible, from BFS distances on the transition and connectivity edges,
+        or None if the problem is infeasible for every T. It is the largest of
+
+          - the distance of each agent to its final position,
+          - for each source b and sink s: min over nodes v of the time s needs
+            to reach v and the earliest time information from b can be at v,
+            and T >= 1 since the flow constraints need a transition step.
+
+        The information of b can be at (w, t) only if it can be at a node u
+        at time t - 1 with a transition edge (u, w), or at time t with a
+        connectivity edge (u, w) and some agent can reach w by time t. Static
+        agents stay at their initial node."""
+
+        tran, dict_node = self.graph.adjacency_matrix("transition")
+        conn, _ = self.graph.adjacency_matrix("connectivity")
+        V = len(dict_node)
+        static = set(self.static_agents or [])
+
+        # dist[r, v]: transitions agent r needs to reach v
+        agents = list(self.graph.agents)
+        pos = np.array([dict_node[self.graph.agents[r]] for r in agents], dtype=int)
+        dist = shortest_path(tran, indices=pos, unweighted=True)
+        for i, r in enumerate(agents):
+            if r in static:
+                dist[i] = np.inf
+                dist[i, pos[i]] = 0
+        occupied = dist.min(axis=0)  # earliest time some agent can be at v
+
+        bound = 0
+        for r, v in (self.final_position or {}).items():
+            bound = max(bound, dist[agents.index(r), dict_node[v]])
+
+        if connectivity:
+            src = agents if self.src is None else self.src
+            snk = agents if self.snk is None else self.snk
+            if len(src) > 0 and len(snk) > 0:
+                # the flow constraints (52, 53) have no sink demand at T = 0
+                bound = max(bound, 1)
+            for b in src:
+                arrival = self._information_arrival(
+                    dict_node[self.graph.agents[b]], occupied, tran, conn
+                )
+                for r in snk:
+                    reach = dist[agents.index(r)].copy()
+                    if self.final_position and r in self.final_position:
+                        final = dict_node[self.final_position[r]]
+                        reach[np.arange(V) != final] = np.inf
+                    bound = max(bound, np.maximum(arrival, reach).min())
+
+        if np.isinf(bound):
+            return None
+        return int(bound)
+
+    def _information_arrival(self, v0, occupied, tran, conn):
+        """earliest time information that is at node v0 at time 0 can be at
+        each node (see horizon_lower_bound)"""
+
+        arrival = np.full(len(occupied), np.inf)
+        arrival[v0] = 0
+        informed = arrival == 0
+        t_occupied = occupied[occupied < np.inf].max()
+
+        for t in range(len(occupied) + int(t_occupied) + 1):
+            if t == 0:
+                new = informed.copy()
+            else:
+                # transition edges from informed nodes at t - 1
+                new = (tran.T @ informed > 0) & ~informed
+                arrival[new] = t
+                informed |= new
+            # connectivity edges into nodes that can be occupied at t
+            frontier = informed.copy()
+            while frontier.any():
+                frontier = (conn.T @ frontier > 0) & (occupied <= t) & ~informed
+                arrival[frontier] = t
+                informed |= frontier
+                new |= frontier
+            if t >= t_occupied and not new.any():
+                break
+
+        return arrival
 
     ##OBJECTIVE FUNCTION##
 
+    def edge_time_weights(self, dict_edge, edge_type, num_times):
+        """array (num_times, num_edges) of weights 1.01^t * w(edge) of the edges
+        of type `edge_type` in dict_edge"""
+        w = np.zeros(len(dict_edge))
+        for i, j, data in self.graph.edges(data=True):
+            if data["type"] == edge_type:
+                w[dict_edge[(i, j)]] = data["weight"]
+        return np.array([1.01**t for t in range(num_times)])[:, None] * w[None, :]
+
+    def frontier_values(self):
+        """array (V,) of the frontier value of each node, 0 if not set"""
+        return np.array(
+            [self.graph.nodes[v].get("frontiers", 0) for v in self.graph.nodes],
+            dtype=float,
+        )
+
     def generate_powerset_objective(self, add_frontier_rewards):
 
         obj = np.zeros(self.num_vars)
+        z = self.layout.tensor("z")
+        discount = np.array([0.9**t for t in range(self.T + 1)])[:, None, None]
 
         # add user-defined rewards
         if self.reward_dict != None:
-            for t, r in product(range(self.T + 1), self.graph.agents):
-                for v, R in self.reward_dict.items():
-                    obj[self.get_z_idx(r, v, t)] = -(0.9 ** t) * R
+            v = np.array([self.dict_node[v] for v in self.reward_dict], dtype=int)
+            R = np.array(list(self.reward_dict.values()), dtype=float)
+            obj[z[:, v, :]] = -discount * R[None, :, None]
 
         # add frontier rewards
         if add_frontier_rewards:
-            for t, r, v in product(
-                range(self.T + 1), self.graph.agents, self.graph.nodes
-            ):
-                if (
-                    "frontiers" in self.graph.nodes[v]
-                    and self.graph.nodes[v]["frontiers"] != 0
-                ):
-                    obj[self.get_z_idx(r, v, t)] -= (0.9 ** t) * self.frontier_reward
+            v = np.flatnonzero(self.frontier_values() != 0)
+            obj[z[:, v, :]] -= discount * self.frontier_reward
 
         # add transition weights
-        for e, t in product(self.graph.edges(data=True), range(self.T)):
-            if e[2]["type"] == "transition":
-                obj[self.get_e_idx(e[0], e[1], t)] = (1.01 ** t) * e[2]["weight"]
+        obj[self.layout.tensor("e")] = self.edge_time_weights(
+            self.dict_tran, "transition", self.T
+        )
 
         return obj
 
     def generate_flow_objective(self, add_frontier_rewards):
 
         obj = np.zeros(self.num_vars)
+        y = self.layout.tensor("y")
 
         # add user-defined rewards
         if self.reward_dict != None:
-            for v, r in self.reward_dict.items():
-                obj[self.get_y_idx(v, 1)] -= r
+            v = np.array([self.dict_node[v] for v in self.reward_dict], dtype=int)
+            R = np.array(list(self.reward_dict.values()), dtype=float)
+            obj[y[v, 0]] -= R
 
         # add frontier rewards
         if add_frontier_rewards:
-            max_weight = 0
-            for v in self.graph.nodes:
-                if (
-                    "frontiers" in self.graph.nodes[v]
-                    and self.graph.nodes[v]["frontiers"] > max_weight
-                ):
-                    max_weight = self.graph.nodes[v]["frontiers"]
-            for v in self.graph.nodes:
-                if (
-                    "frontiers" in self.graph.nodes[v]
-                    and self.graph.nodes[v]["frontiers"] > 0
-                ):
-                    for k in range(1, self.num_r + 1):
-                        obj[self.get_y_idx(v, k)] -= (
-                            self.frontier_reward_decay ** (k - 1)
-                        ) * self.frontier_reward * (
-                        self.graph.nodes[v]["frontiers"] / max_weight)
+            frontiers = self.frontier_values()
+            v = np.flatnonzero(frontiers > 0)
+            if len(v) > 0:
+                decay = np.array(
+                    [self.frontier_reward_decay**k for k in range(self.num_r)]
+                )
+                obj[y[v, :]] -= (decay[None, :] * self.frontier_reward) * (
+                    frontiers[v, None] / frontiers.max()
+                )
 
         # add transition weights
-        for e, t, r in product(
-            self.graph.edges(data=True), range(self.T), self.graph.agents
-        ):
-            if e[2]["type"] == "transition":
-                obj[self.get_xf_idx(r, e[0], e[1], t)] = (1.01 ** t) * e[2]["weight"]
+        tran_weights = self.edge_time_weights(self.dict_tran, "transition", self.T)
+        obj[self.layout.tensor("xf")] = tran_weights[:, None, :]
 
         # add regular communication weights
+        conn_weights = self.edge_time_weights(
+            self.dict_conn, "connectivity", self.T + 1
+        )
         if "fbar" in self.vars:
-            for b, e, t in product(
-                range(len(self.min_src_snk)),
-                self.graph.edges(data=True),
-                range(self.T + 1),
-            ):
-                if e[2]["type"] == "connectivity":
-                    obj[self.get_fbar_idx(b, e[0], e[1], t)] = (1.01 ** t) * e[2][
-                        "weight"
-                    ]
+            obj[self.layout.tensor("fbar")] = conn_weights[:, None, :]
 
         # add master communication weights
         if "mbar" in self.vars:
-            for e, t in product(self.graph.edges(data=True), range(self.T + 1)):
-                if e[2]["type"] == "connectivity":
-                    obj[self.get_mbar_idx(e[0], e[1], t)] = (1.01 ** t) * e[2]["weight"]
+            obj[self.layout.tensor("mbar")] = conn_weights
+
+        # finishing time, weighted above any difference in the other terms
+        if "d" in self.vars:
+            obj[self.layout.tensor("d")] = -self.finish_weight(obj)
 
         return obj
 
+    def finish_weight(self, obj):
+        """weight of one time step in the minimum-horizon objective, larger
+        than the range of obj: binary variables are at most 1 and the flows
+        f, fbar, m, mbar at most R^2 by (48, 49)"""
+        ub = np.full(self.num_vars, self.num_r**2)
+        ub[self.layout.vtype() == BINARY] = 1
+        return 1 + np.abs(obj) @ ub
+
     ##SOLVER FUNCTIONS##
 
+    def generate_flow_warm_start(self):
+        """MIP start for solve_flow from the stored solution (traj, conn, tran)
+        with the agents staying at their final positions up to horizon T.
+
+        The trajectory variables z, xf are set and flows are zero where the
+        stored solution has no flow, the remaining entries are nan and are
+        completed by the solver. Returns None if there is no stored solution
+        that fits the current problem."""
+
+        if not self.warm_start or not self.traj or self.T_sol > self.T:
+            return None
+
+        def pos(r, t):
+            return self.traj.get((r, min(t, self.T_sol)))
+
+        for r, v in self.graph.agents.items():
+            if pos(r, 0) != v:
+                return None
+            for t in range(self.T):
+                if (pos(r, t), pos(r, t + 1)) not in self.dict_tran:
+                    return None
+
+        x0 = np.full(self.num_vars, np.nan)
+        for var in [self.vars["z"], self.vars["xf"]]:
+            x0[var.start : var.start + var.size] = 0
+        for r in self.graph.agents:
+            for t in range(self.T + 1):
+                x0[self.get_z_idx(r, pos(r, t), t)] += 1
+            for t in range(self.T):
+                x0[self.get_xf_idx(r, pos(r, t), pos(r, t + 1), t)] += 1
+
+        # no flow outside of the stored flow edges up to T_sol
+        for t in range(self.T_sol + 1):
+            for (v1, v2), b in product(self.dict_conn, range(self.num_min_src_snk)):
+                x0[self.get_fbar_idx(b, v1, v2, t)] = 0
+            for v1, v2 in self.dict_conn:
+                x0[self.get_mbar_idx(v1, v2, t)] = 0
+        for t in range(self.T_sol):
+            for (v1, v2), b in product(self.dict_tran, range(self.num_min_src_snk)):
+                x0[self.get_f_idx(b, v1, v2, t)] = 0
+            for v1, v2 in self.dict_tran:
+                x0[self.get_m_idx(v1, v2, t)] = 0
+
+        for flows, get_idx, dict_edge in [
+            (self.conn, self.get_fbar_idx, self.dict_conn),
+            (self.tran, self.get_f_idx, self.dict_tran),
+        ]:
+            for t, edges in flows.items():
+                for v1, v2, b_r in edges:
+                    if (v1, v2) not in dict_edge:
+                        return None
+                    if b_r == "master":
+                        get_master_idx = (
+                            self.get_mbar_idx if flows is self.conn else self.get_m_idx
+                        )
+                        x0[get_master_idx(v1, v2, t)] = np.nan
+                    elif b_r in self.min_src_snk:
+                        b = self.min_src_snk.index(b_r)
+                        x0[get_idx(b, v1, v2, t)] = np.nan
+                    else:
+                        return None
+
+        return x0
+
     def cut_solution(self, solution):
-        t = self.T
-        cut = True
-        while cut and t > 0:
-            for r, v in product(self.graph.agents, self.graph.nodes):
-                if (
-                    abs(
-                        solution["x"][self.get_z_idx(r, v, t)]
-                        - solution["x"][self.get_z_idx(r, v, t - 1)]
-                    )
-                    > 0.5
-                ):
-                    cut = False
-            if cut:
-                t -= 1
-        self.T_sol = t
+        """set T_sol to the last time step at which an agent moves"""
+        z = self.layout.block(solution["x"], "z")
+        moves = np.flatnonzero((np.abs(np.diff(z, axis=0)) > 0.5).any(axis=(1, 2)))
+        self.T_sol = moves[-1] + 1 if len(moves) > 0 else 0
 
         return solution
 
-    def solve_powerset(self, **kwargs):
+    def solution_traj(self, solution, T):
+        """dict(r,t: v) of agent positions in solution for t <= T"""
+        z = self.layout.block(solution["x"], "z")[: T + 1]
+        nodes = list(self.graph.nodes)
+        agents = [unit[0] for unit in self.agent_units]
+        # (r, v, t) order, if several nodes are set the last one is kept
+        r, v, t = np.nonzero(z.transpose(2, 1, 0) > 0.5)
+        traj = {
+            (agents[r_], int(t_)): nodes[v_]
+            for r_, v_, t_ in zip(r, v, t)
+            if len(self.agent_units[r_]) == 1
+        }
+
+        # agents of a unit follow the counts on xf, at each step the agents
+        # sorted by position are matched to the used edges sorted by tail
+        tran = self.edge_ends(self.dict_tran)
+        for u, unit in enumerate(self.agent_units):
+            if len(unit) == 1:
+                continue
+            xf = np.rint(self.layout.block(solution["x"], "xf")[:, u]).astype(int)
+            pos = np.array([self.dict_node[self.graph.agents[r]] for r in unit])
+            for t in range(T + 1):
+                traj.update({(r, t): nodes[v] for r, v in zip(unit, pos)})
+                if t == T:
+                    break
+                k = np.repeat(np.arange(len(tran)), xf[t])
+                k = k[np.argsort(tran[k, 0], kind="stable")]
+                pos[np.argsort(pos, kind="stable")] = tran[k, 1]
+        return traj
+
+    def solve_powerset(self, separate=True, **kwargs):
+        """solve the powerset formulation, if `separate` the connectivity
+        constraints (38) are added in rounds as they are violated by the
+        solution, otherwise all of them are enumerated up front"""
 
         if self.snk is not None:
             print(
@@ -388,33 +727,12 @@ class ConnectivityProblem(AbstractConnectivityProblem):
             )
             self.snk = None
 
-        self.prepare_problem()
+        if self.aggregate_agents:
+            raise Exception("Powerset formulation does not support aggregate_agents")
 
-        zvar = Variable(
-            size=(self.T + 1) * self.num_r * self.num_v, start=0, binary=True
-        )
-        evar = Variable(
-            size=self.T * len(self.dict_tran),
-            start=zvar.start + zvar.size,
-            binary=False,
-        )
-        ybvar = Variable(
-            size=(self.T + 1) * self.num_src * self.num_v,
-            start=evar.start + evar.size,
-            binary=True,
-        )
-        xvar = Variable(
-            size=self.T * self.num_src * len(self.dict_tran),
-            start=ybvar.start + ybvar.size,
-            binary=True,
-        )
-        xbarvar = Variable(
-            size=(self.T + 1) * self.num_src * len(self.dict_conn),
-            start=xvar.start + xvar.size,
-            binary=True,
-        )
+        self.prepare_problem()
 
-        self.vars = {"z": zvar, "e": evar, "yb": ybvar, "x": xvar, "xbar": xbarvar}
+        self.setup_powerset_variables()
         t0 = time.time()
 
         # Initial constraints on z
@@ -424,43 +742,34 @@ class ConnectivityProblem(AbstractConnectivityProblem):
         # Bridge z, e to x, xbar, yb
         constraint &= generate_powerset_bridge_constraints(self)
         # Connectivity constraints on x, xbar, yb
-        constraint &= generate_connectivity_constraint_all(self)
+        if not separate:
+            constraint &= generate_connectivity_constraint_all(self)
         # Objective
         obj = self.generate_powerset_objective(add_frontier_rewards=True)
 
         print("Constraints setup time {:.2f}s".format(time.time() - t0))
 
-        self._solve(obj, constraint, **kwargs)
+        while True:
+            solution = self._solve(obj, constraint, **kwargs)
+            if not separate or solution["status"] == "infeasible":
+                break
+            cuts = separate_connectivity_constraint(self, solution["x"])
+            if sum(rows for rows, _ in cuts.family_sizes().values()) == 0:
+                break
+            constraint &= cuts
 
-    def solve_adaptive(self, **kwargs):
+    def solve_adaptive(self, lazy=False, **kwargs):
+        """solve the powerset formulation and add the connectivity constraints
+        (38) violated by the solution, if `lazy` they are added as lazy
+        constraints in a single solver run, otherwise the ILP is re-solved
+        after each round"""
 
-        self.prepare_problem()
+        if self.aggregate_agents:
+            raise Exception("Powerset formulation does not support aggregate_agents")
 
-        zvar = Variable(
-            size=(self.T + 1) * self.num_r * self.num_v, start=0, binary=True
-        )
-        evar = Variable(
-            size=self.T * len(self.dict_tran),
-            start=zvar.start + zvar.size,
-            binary=False,
-        )
-        ybvar = Variable(
-            size=(self.T + 1) * self.num_src * self.num_v,
-            start=evar.start + evar.size,
-            binary=True,
-        )
-        xvar = Variable(
-            size=self.T * self.num_src * len(self.dict_tran),
-            start=ybvar.start + ybvar.size,
-            binary=True,
-        )
-        xbarvar = Variable(
-            size=(self.T + 1) * self.num_src * len(self.dict_conn),
-            start=xvar.start + xvar.size,
-            binary=True,
-        )
+        self.prepare_problem()
 
-        self.vars = {"z": zvar, "e": evar, "yb": ybvar, "x": xvar, "xbar": xbarvar}
+        self.setup_powerset_variables()
         t0 = time.time()
 
         # Initial constraints on z
@@ -474,76 +783,92 @@ class ConnectivityProblem(AbstractConnectivityProblem):
 
         print("Constraints setup time {:.2f}s".format(time.time() - t0))
 
-        valid_solution = False
+        def connectivity_cuts(x):
+            _, add_S = self.test_solution({"x": x})
+            return generate_connectivity_constraint(self, range(self.num_src), add_S)
 
-        while not valid_solution:
-            solution = self._solve(obj, constraint, cut=False, **kwargs)
-            if solution["status"] == "infeasible":
-                break
-            valid_solution, add_S = self.test_solution(solution)
-            constraint &= generate_connectivity_constraint(
-                self, range(self.num_src), add_S
+        if lazy:
+            solution = self._solve(
+                obj, constraint, cut=False, lazy=connectivity_cuts, **kwargs
             )
+        else:
+            valid_solution = False
+            while not valid_solution:
+                solution = self._solve(obj, constraint, cut=False, **kwargs)
+                if solution["status"] == "infeasible":
+                    break
+                valid_solution, add_S = self.test_solution(solution)
+                constraint &= connectivity_cuts(solution["x"])
 
         # cut static part of solution
         solution = self.cut_solution(solution)
 
         # save info
-        self.traj = {}
+        self.traj = self.solution_traj(solution, self.T)
         self.conn = {t: set() for t in range(self.T + 1)}
         self.tran = {t: set() for t in range(self.T)}
 
-        for r, v, t in product(self.graph.agents, self.graph.nodes, range(self.T + 1)):
-            if solution["x"][self.get_z_idx(r, v, t)] > 0.5:
-                self.traj[(r, t)] = v
+    def setup_powerset_variables(self):
+        B = self.num_src
+        self.layout = VariableLayout(
+            [
+                ("z", (self.T + 1, self.num_v, self.num_r), True),
+                ("e", (self.T, len(self.dict_tran)), False),
+                ("yb", (self.T + 1, B, self.num_v), True),
+                ("x", (self.T, B, len(self.dict_tran)), True),
+                ("xbar", (self.T + 1, B, len(self.dict_conn)), True),
+            ]
+        )
+        self.vars = self.layout.vars
+
+    def setup_flow_variables(self):
+        B = self.num_min_src_snk
+        U = self.num_units
+        # counts of the agents of each unit, binary if all units are single agents
+        single = U == self.num_r
+        blocks = [
+            ("z", (self.T + 1, self.num_v, U), single),
+            ("xf", (self.T, U, len(self.dict_tran)), single),
+            ("y", (self.num_v, self.num_r), True),
+            ("f", (self.T, B, len(self.dict_tran)), False),
+            ("fbar", (self.T + 1, B, len(self.dict_conn)), False),
+            ("m", (self.T, len(self.dict_tran)), False),
+            ("mbar", (self.T + 1, len(self.dict_conn)), False),
+        ]
+        if self.cumulative_master:
+            # master info received by each node up to t
+            blocks.append(("mc", (self.T + 1, self.num_v), False))
+        if self.min_horizon:
+            # mission finished at or before t
+            blocks.append(("d", (self.T + 1,), True))
+
+        self.layout = VariableLayout(blocks)
+        self.vars = self.layout.vars
+
+    def generate_extra_constraints(self):
+        """user specified additional constraints"""
+        constraint = Constraint()
+        if self.extra_constr != None:
+            for func in self.extra_constr:
+                try:
+                    constraint &= eval(func[0])(self, func[1])
+                except:
+                    print("Couldn't find constraint function", func)
+        return constraint
 
     def solve_flow(
         self, master=False, connectivity=True, frontier_reward=True, **kwargs
     ):
 
-        self.prepare_problem()
-
-        zvar = Variable(
-            size=(self.T + 1) * self.num_r * self.num_v, start=0, binary=True
-        )
-        xfvar = Variable(
-            size=self.T * len(self.graph.agents) * len(self.dict_tran),
-            start=zvar.start + zvar.size,
-            binary=True,
-        )
-        yvar = Variable(
-            size=self.num_v * self.num_r, start=xfvar.start + xfvar.size, binary=True
-        )
-        fvar = Variable(
-            size=self.T * self.num_min_src_snk * len(self.dict_tran),
-            start=yvar.start + yvar.size,
-            binary=False,
-        )
-        fbarvar = Variable(
-            size=(self.T + 1) * self.num_min_src_snk * len(self.dict_conn),
-            start=fvar.start + fvar.size,
-            binary=False,
-        )
-        mvar = Variable(
-            size=self.T * len(self.dict_tran),
-            start=fbarvar.start + fbarvar.size,
-            binary=False,
-        )
-        mbarvar = Variable(
-            size=(self.T + 1) * len(self.dict_conn),
-            start=mvar.start + mvar.size,
-            binary=False,
-        )
+        if self.persistent_model is not None:
+            if self.min_horizon:
+                raise Exception("Persistent model does not support min_horizon")
+            return self._solve_flow_persistent(
+                master, connectivity, frontier_reward, **kwargs
+            )
 
-        self.vars = {
-            "z": zvar,
-            "xf": xfvar,
-            "y": yvar,
-            "f": fvar,
-            "fbar": fbarvar,
-            "m": mvar,
-            "mbar": mbarvar,
-        }
+        self.prepare_problem()
+        self.setup_flow_variables()
         t0 = time.time()
 
         # Initial Constraints on z
@@ -558,36 +883,223 @@ class ConnectivityProblem(AbstractConnectivityProblem):
         # Flow connectivity constraints on z, e, f, fbar
         if connectivity:
             constraint &= generate_flow_connectivity_constraints(self)
+        # Finishing time indicators on d, xf
+        if self.min_horizon:
+            constraint &= generate_flow_finish_constraints(self)
         # Flow objective
         obj = self.generate_flow_objective(frontier_reward)
 
         # User specified as additional constraints
-        if self.extra_constr != None:
-            for func in self.extra_constr:
-                try:
-                    constraint &= eval(func[0])(self, func[1])
-                except:
-                    print("Couldn't find constraint function", func)
+        constraint &= self.generate_extra_constraints()
 
         if "verbose" in kwargs and kwargs["verbose"]:
             print("Constraints setup time {:.2f}s".format(time.time() - t0))
 
-        return self._solve(obj, constraint, **kwargs)
+        x0 = self.generate_flow_warm_start()
+
+        # Variables that no agent can reach are removed from the solver model
+        J_zero = self.unreachable_flow_vars() if self.prune_unreachable else None
+
+        solution = self._solve(obj, constraint, x0=x0, J_zero=J_zero, **kwargs)
+
+        if self.min_horizon and "primal objective" in solution:
+            # report the objective without the finishing time
+            d = self.layout.tensor("d")
+            solution["finish time"] = int(round(self.T + 1 - solution["x"][d].sum()))
+            solution["primal objective"] -= obj[d] @ solution["x"][d]
 
-    def diameter_solve_flow(self, **kwargs):
+        return solution
+
+    def _solve_flow_persistent(self, master, connectivity, frontier_reward, **kwargs):
+        """solve_flow on the persistent model: only the time layers added since
+        the previous solve are built and appended, and the terminal-time
+        constraints are moved from the previous last layer to the new one"""
+
+        T_prev = self.persistent_T
+        if T_prev is None:
+            self.prepare_problem()
+            T_prev = -1
+        elif self.T <= T_prev:
+            raise Exception("Persistent model requires an increasing horizon 'T'")
+
+        self.setup_flow_variables()
+        col_map = self.persistent_col_map()
+        t0 = time.time()
+
+        # new node layers T_prev+1..T and transition steps T_prev..T-1
+        node_times = range(T_prev + 1, self.T + 1)
+        edge_times = range(max(T_prev, 0), self.T)
+
+        if T_prev < 0:
+            constraint = generate_initial_constraints(self)
+        else:
+            constraint = Constraint()
+        constraint &= generate_flow_dynamic_constraints(
+            self, node_times, edge_times, terminal=False
+        )
+        constraint &= generate_flow_bridge_constraints(
+            self, node_times, edge_times, terminal=False
+        )
+        if master:
+            constraint &= generate_flow_master_constraints(
+                self, node_times, edge_times, terminal=False
+            )
+        if connectivity:
+            constraint &= generate_flow_connectivity_constraints(
+                self, edge_times, terminal=False
+            )
+        self.persistent_model.add_constraint(constraint, col_map)
+
+        # constraints on the last layer (50, final_position, t == T of 52/53, ...)
+        terminal = generate_flow_dynamic_constraints(self, [], [])
+        terminal &= generate_flow_bridge_constraints(self, [], [])
+        if master:
+            terminal &= generate_flow_master_constraints(self, [], [])
+        if connectivity:
+            terminal &= generate_flow_connectivity_constraints(self, [])
+        terminal &= self.generate_extra_constraints()
+        self.persistent_model.remove_group("terminal")
+        self.persistent_model.add_constraint(terminal, col_map, group="terminal")
+        self.persistent_T = self.T
+
+        obj = self.generate_flow_objective(frontier_reward)
+
+        if "verbose" in kwargs and kwargs["verbose"]:
+            print(
+                "Constraints setup time {:.2f}s, {} rows added".format(
+                    time.time() - t0,
+                    sum(rows for rows, _ in constraint.family_sizes().values())
+                    + sum(rows for rows, _ in terminal.family_sizes().values()),
+                )
+            )
+
+        x0 = self.generate_flow_warm_start()
+
+        return self._solve(obj, None, x0=x0, **kwargs)
+
+    def horizon_key(self, master=False, connectivity=True, **kwargs):
+        """hashable key of everything that decides whether solve_flow is
+        feasible for a given horizon: the graph, agent positions and
+        constraints, but not the objective"""
+
+        def frozen(items, default=()):
+            if items is None:
+                return default
+            if isinstance(items, dict):
+                return frozenset(items.items())
+            if isinstance(items, (list, tuple, set, frozenset)):
+                return tuple(items)
+            return (items,)
+
+        # unset attributes as prepare_problem fills them in
+        agents = tuple(self.graph.agents)
+        return (
+            frozenset(self.graph.tran_edges()),
+            frozenset(self.graph.conn_edges()),
+            frozen(self.graph.agents),
+            frozen(self.static_agents),
+            frozen(self.big_agents),
+            frozen(self.final_position, frozenset()),
+            frozen(self.master, (None,)),
+            frozen(self.src, agents),
+            frozen(self.snk, agents),
+            self.always_src,
+            frozen(self.extra_constr),
+            master,
+            connectivity,
+        )
+
+    def _horizon_search(
+        self, T_min, search="linear", incremental=False, T_max=None, **kwargs
+    ):
+        """solve_flow for the smallest feasible horizon T >= T_min and return
+        the solution. `search` is "linear" (T_min, T_min + 1, ...) or "bisect"
+        (galloping steps 1, 2, 4, ... then bisection, relies on feasibility
+        being monotone in T). Horizons that are known to be infeasible from
+        INFEASIBLE_HORIZONS are skipped and new ones are recorded."""
+
+        if search not in ["linear", "bisect"]:
+            raise Exception("Unknown horizon search '{}'".format(search))
+        if search == "bisect" and incremental:
+            raise Exception("Horizon bisection requires a non-incremental model")
+
+        bound = self.horizon_lower_bound(**kwargs)
+        if bound is None:
+            raise Exception("No feasible solution for any horizon T")
+
+        key = self.horizon_key(**kwargs)
+        T_lo = max(T_min, bound, INFEASIBLE_HORIZONS.get(key, -1) + 1)
+
+        def solve(T):
+            if T_max is not None and T > T_max:
+                raise Exception("No feasible solution for T <= {}".format(T_max))
+
+            solution = self._solve_flow_horizon(T, **kwargs)
+            if solution["status"] == "infeasible":
+                INFEASIBLE_HORIZONS[key] = max(INFEASIBLE_HORIZONS.get(key, -1), T)
+            return solution
+
+        if search == "linear":
+            solution = solve(T_lo)
+            while solution["status"] == "infeasible":
+                solution = solve(self.T + 1)
+            return solution
+
+        # galloping: T_lo, T_lo + 1, T_lo + 3, T_lo + 7, ...
+        step = 1
+        solution = solve(T_lo)
+        while solution["status"] == "infeasible":
+            T_lo = self.T + 1
+            T = self.T + step
+            if T_max is not None and T_lo <= T_max:
+                T = min(T, T_max)
+            step *= 2
+            solution = solve(T)
+
+        # bisection on [T_lo, T_hi], T_hi is feasible
+        T_hi = self.T
+        best = (solution, self._solution_state())
+        while T_lo < T_hi:
+            solution = solve((T_lo + T_hi) // 2)
+            if solution["status"] == "infeasible":
+                T_lo = self.T + 1
+            else:
+                T_hi = self.T
+                best = (solution, self._solution_state())
+
+        solution, state = best
+        for name, value in state.items():
+            setattr(self, name, value)
+        return solution
+
+    def _solve_flow_horizon(self, T, **kwargs):
+        """solve_flow with horizon T"""
+        self.T = T
+
+        if "verbose" in kwargs and kwargs["verbose"]:
+            print("Trying" + Style.BRIGHT + " T={}".format(self.T) + Style.RESET_ALL)
+
+        return self.solve_flow(**kwargs)
+
+    def _solution_state(self):
+        """attributes that describe the stored solution of the last solve"""
+        names = ["T", "T_sol", "traj", "conn", "tran", "layout", "vars"]
+        return {name: getattr(self, name) for name in names}
+
+    def diameter_solve_flow(self, incremental=False, search="linear", **kwargs):
+        """solve_flow for the smallest feasible horizon starting from a bound
+        derived from the graph diameter, and for larger horizons until the
+        frontier reward demand is met. See _horizon_search for `search`."""
 
         num_frontiers = len(
             [v for v in self.graph.nodes if self.graph.nodes[v]["frontiers"] != 0]
         )
 
-        D = nx.diameter(self.graph)
+        D = self.graph.diameter()
         Rp = len(set(v for r, v in self.graph.agents.items()))
 
         T = int(max(D / 2, D - int(Rp / 2)))
 
-        feasible_solution = False
-        small_optimal_value = True
-
         if "verbose" in kwargs and kwargs["verbose"]:
             print(
                 Fore.GREEN
@@ -601,91 +1113,151 @@ class ConnectivityProblem(AbstractConnectivityProblem):
                 + Style.RESET_ALL
             )
 
-        iter = 0
-        while not feasible_solution or small_optimal_value:
-            iter += 1
-            self.T = T
-
-            if "verbose" in kwargs and kwargs["verbose"]:
-                print(
-                    "Trying" + Style.BRIGHT + " T={}".format(self.T) + Style.RESET_ALL
-                )
+        if incremental:
+            self.start_persistent_model(kwargs.get("solver"))
 
-            # Solve
-            solution = self.solve_flow(**kwargs)
+        try:
+            solution = self._horizon_search(T, search, incremental, **kwargs)
 
-            if solution["status"] is not "infeasible":
-                feasible_solution = True
-
-            if (
+            # horizons a linear search from T would have tried
+            iter = self.T - T + 1
+            while (
                 num_frontiers > 0
                 and ("frontier_reward" in kwargs and kwargs["frontier_reward"])
-                and feasible_solution and iter < self.max_reward_demand_iter
+                and iter < self.max_reward_demand_iter
+                and solution["primal objective"]
+                >= -self.reward_demand * self.frontier_reward
             ):
-                if (
-                    solution["primal objective"]
-                    < -self.reward_demand * self.frontier_reward
-                ):
-                    small_optimal_value = False
-                else:
-                    print("small optimal value")
-            else:
-                small_optimal_value = False
+                print("small optimal value")
+                iter += 1
+                solution = self._solve_flow_horizon(self.T + 1, **kwargs)
+        finally:
+            if incremental:
+                self.stop_persistent_model()
 
-            T += 1
         return solution
 
-    def linear_search_solve_flow(self, **kwargs):
-
-        T = 0
-        feasible_solution = False
-        while not feasible_solution:
-
-            self.T = T
+    def linear_search_solve_flow(
+        self, incremental=False, T_max=None, search="linear", **kwargs
+    ):
+        """solve_flow for the smallest feasible horizon T <= T_max, see
+        _horizon_search for `search`"""
 
-            # Solve
-            solution = self.solve_flow(**kwargs)
+        if incremental:
+            self.start_persistent_model(kwargs.get("solver"))
 
-            if solution["status"] is not "infeasible":
-                feasible_solution = True
+        try:
+            solution = self._horizon_search(0, search, incremental, T_max, **kwargs)
+        finally:
+            if incremental:
+                self.stop_persistent_model()
 
-            T += 1
         return solution
 
-    def _solve(self, obj, constraint, cut=True, solver=None, verbose=False):
-
-        J_int = sum(
-            [
-                list(range(var.start, var.start + var.size))
-                for var in self.vars.values()
-                if not var.binary
-            ],
-            [],
-        )
-        J_bin = sum(
-            [
-                list(range(var.start, var.start + var.size))
-                for var in self.vars.values()
-                if var.binary
-            ],
-            [],
-        )
-
-        if verbose:
-            print(
-                "NumConst: {} ({} bin, {} int), NumVar: {}".format(
-                    self.num_vars,
-                    len(J_bin),
-                    len(J_int),
-                    constraint.A_eq.shape[0] + constraint.A_iq.shape[0],
+    def min_horizon_solve_flow(self, T_max, **kwargs):
+        """solve_flow once with horizon T_max, minimizing the time at which
+        the mission is finished before the other objective terms. Agents do
+        not move after the finishing time, which is returned in
+        solution["finish time"]"""
+
+        min_horizon = self.min_horizon
+        self.min_horizon = True
+        self.T = T_max
+        try:
+            return self.solve_flow(**kwargs)
+        finally:
+            self.min_horizon = min_horizon
+
+    def persistent_col_map(self):
+        """map variables of the current layout to columns of the persistent model.
+
+        The flow variable blocks either have time as their leading axis
+        (z, xf, f, fbar, m, mbar, mc) or do not depend on T (y), so when T grows
+        the entries of a block keep their offset and only the new time layers
+        are appended to the model."""
+        col_map = []
+        for name, var in self.vars.items():
+            cols = self.persistent_cols.get(name, np.zeros(0, dtype=int))
+            if len(cols) < var.size:
+                new_cols = self.persistent_model.add_vars(
+                    var.size - len(cols), var.binary
                 )
+                cols = np.hstack([cols, new_cols])
+                self.persistent_cols[name] = cols
+            col_map.append(cols[: var.size])
+        return np.hstack(col_map)
+
+    def start_persistent_model(self, solver=None):
+        """solve subsequent problems with a persistent solver model"""
+        self.persistent_model = PersistentModel(solver=solver)
+        self.persistent_cols = {}
+        self.persistent_T = None
+
+    def stop_persistent_model(self):
+        self.persistent_model = None
+        self.persistent_cols = None
+        self.persistent_T = None
+
+    def _solve(
+        self,
+        obj,
+        constraint,
+        cut=True,
+        solver=None,
+        verbose=False,
+        x0=None,
+        J_zero=None,
+        lazy=None,
+    ):
+        """solve the ILP and store the solution, if `constraint` is None the
+        constraints already in the persistent model are used. `x0` is an
+        optional MIP start, the variables in `J_zero` are fixed to zero and
+        `lazy` generates lazy constraints (see solve_ilp)"""
+
+        if constraint is None:
+            t0 = time.time()
+            solution = self.persistent_model.solve(
+                obj, self.persistent_col_map(), x0
             )
+        else:
+            vtype = self.layout.vtype()
 
-        # Solve it
-        t0 = time.time()
-        solution = solve_ilp(obj, constraint, J_int, J_bin, solver)
+            if verbose:
+                family_sizes = constraint.family_sizes()
+                print(
+                    "NumConst: {} ({} bin, {} int), NumVar: {}".format(
+                        self.num_vars,
+                        np.count_nonzero(vtype == BINARY),
+                        np.count_nonzero(vtype == INTEGER),
+                        sum(rows for rows, _ in family_sizes.values()),
+                    )
+                )
+                for name, (rows, nnz) in sorted(
+                    family_sizes.items(), key=lambda item: -item[1][1]
+                ):
+                    print("  constraint {}: {} rows, {} nnz".format(name, rows, nnz))
+                if J_zero is not None:
+                    print("Pruned {} unreachable variables".format(len(J_zero)))
+
+            # Solve it
+            t0 = time.time()
+            solution = solve_ilp(
+                obj,
+                constraint,
+                solver=solver,
+                x0=x0,
+                J_zero=J_zero,
+                vtype=vtype,
+                lazy=lazy,
+            )
 
         if verbose:
+            if "build time" in solution:
+                print(
+                    "Model build time {:.2f}s, solve time {:.2f}s".format(
+                        solution["build time"], solution["solve time"]
+                    )
+                )
             print("Solver time {:.2f}s".format(time.time() - t0))
 
         if solution["status"] == "infeasible":
@@ -701,55 +1273,27 @@ class ConnectivityProblem(AbstractConnectivityProblem):
                 solution = self.cut_solution(solution)
 
             # save info
-            self.traj = {}
+            self.traj = self.solution_traj(solution, self.T_sol)
             self.conn = {t: set() for t in range(self.T_sol + 1)}
             self.tran = {t: set() for t in range(self.T_sol)}
 
-            for r, v, t in product(
-                self.graph.agents, self.graph.nodes, range(self.T_sol + 1)
-            ):
-                if solution["x"][self.get_z_idx(r, v, t)] > 0.5:
-                    self.traj[(r, t)] = v
-
-            if "fbar" in self.vars:
-                for t, b, (v1, v2) in product(
-                    range(self.T_sol + 1),
-                    range(self.num_min_src_snk),
-                    self.graph.conn_edges(),
-                ):
-                    if solution["x"][self.get_fbar_idx(b, v1, v2, t)] > 0.5:
-                        b_r = (
-                            self.src[b]
-                            if self.always_src or len(self.src) <= len(self.snk)
-                            else self.snk[b]
-                        )
-                        self.conn[t].add((v1, v2, b_r))
-
-            if "mbar" in self.vars:
-                for t, (v1, v2) in product(
-                    range(self.T_sol + 1), self.graph.conn_edges()
-                ):
-                    if solution["x"][self.get_mbar_idx(v1, v2, t)] > 0.5:
-                        self.conn[t].add((v1, v2, "master"))
-
-            if "f" in self.vars:
-                for t, b, (v1, v2) in product(
-                    range(self.T_sol),
-                    range(self.num_min_src_snk),
-                    self.graph.tran_edges(),
-                ):
-                    if solution["x"][self.get_f_idx(b, v1, v2, t)] > 0.5:
-                        b_r = (
-                            self.src[b]
-                            if self.always_src or len(self.src) <= len(self.snk)
-                            else self.snk[b]
-                        )
-                        self.tran[t].add((v1, v2, b_r))
-
-            if "m" in self.vars:
-                for t, (v1, v2) in product(range(self.T_sol), self.graph.tran_edges()):
-                    if solution["x"][self.get_m_idx(v1, v2, t)] > 0.5:
-                        self.tran[t].add((v1, v2, "master"))
+            conn_edges = list(self.dict_conn)
+            tran_edges = list(self.dict_tran)
+            for name, flows, edges, T in [
+                ("fbar", self.conn, conn_edges, self.T_sol + 1),
+                ("mbar", self.conn, conn_edges, self.T_sol + 1),
+                ("f", self.tran, tran_edges, self.T_sol),
+                ("m", self.tran, tran_edges, self.T_sol),
+            ]:
+                if name not in self.vars:
+                    continue
+                x = self.layout.block(solution["x"], name)[:T]
+                if name in ["fbar", "f"]:
+                    for t, b, k in zip(*np.nonzero(x > 0.5)):
+                        flows[t].add(edges[k] + (self.min_src_snk[b],))
+                else:
+                    for t, k in zip(*np.nonzero(x > 0.5)):
+                        flows[t].add(edges[k] + ("master",))
         return solution
 
     ##GRAPH HELPER FUNCTIONS##
@@ -770,47 +1314,68 @@ class ConnectivityProblem(AbstractConnectivityProblem):
         s.remove(self.get_time_augmented_id(self.graph.agents[b], 0))
         return chain.from_iterable(combinations(s, r) for r in range(1, len(s) + 1))
 
+    def time_expanded_predecessors(self):
+        """CSR matrix whose row t * V + v holds the time-expanded predecessors
+        of (v, t): (v0, t - 1) over transition edges and (v0, t) over
+        connectivity edges. Cached for the current horizon and edges."""
+
+        key = (self.T, self.dict_node, self.dict_tran, self.dict_conn)
+        if self.te_pred_cache is not None and self.te_pred_cache[0] == key:
+            return self.te_pred_cache[1]
+
+        T, V = self.T, self.num_v
+        tran = self.edge_ends(self.dict_tran)
+        conn = self.edge_ends(self.dict_conn)
+        conn = conn[conn[:, 0] != conn[:, 1]]
+        t_tran = np.repeat(np.arange(1, T + 1), len(tran))
+        t_conn = np.repeat(np.arange(T + 1), len(conn))
+        row = np.hstack(
+            [
+                t_tran * V + np.tile(tran[:, 1], T),
+                t_conn * V + np.tile(conn[:, 1], T + 1),
+            ]
+        )
+        col = np.hstack(
+            [
+                (t_tran - 1) * V + np.tile(tran[:, 0], T),
+                t_conn * V + np.tile(conn[:, 0], T + 1),
+            ]
+        )
+        pred = sp.csr_matrix(
+            (np.ones(len(row), dtype=bool), (row, col)), shape=((T + 1) * V,) * 2
+        )
+
+        self.te_pred_cache = (key, pred)
+        return pred
+
     def test_solution(self, solution):
+        """check that the final position of each sink is connected to all
+        sources through occupied time-expanded nodes, returns (valid, add_S)
+        with the set S of occupied (v, t) that reach the final position for
+        each sink that is not connected"""
+
+        V = self.num_v
+        nodes = list(self.graph.nodes)
+        z = self.layout.block(solution["x"], "z") > 0.5  # (T+1, V, R)
+        occupied = z.any(axis=2).ravel()
+        pred = self.time_expanded_predecessors()
+        src = [self.dict_node[self.graph.agents[b]] for b in self.src]
+
         add_S = []
         for r in self.snk:
-            S = []
-            # Find end position of agent r and set as V
-            for v in self.graph.nodes:
-                z_idx = self.get_z_idx(r, v, self.T)
-                if solution["x"][z_idx] == 1:
-                    S.append((v, self.T))
-
-            # Backwards reachability
-            idx = 0
-            while idx < len(S):
-                pre_Svt_transition = self.graph.pre_tran_vt([S[idx]])
-                pre_Svt_connectivity = self.graph.pre_conn_vt([S[idx]])
-                for v0, _, t in pre_Svt_transition:
-                    occupied = False
-                    for robot in self.graph.agents:
-                        z_idx = self.get_z_idx(robot, v0, t)
-                        if solution["x"][z_idx] == 1:
-                            occupied = True
-                    if occupied == True and (v0, t) not in S:
-                        S.append((v0, t))
-                for v0, _, t in pre_Svt_connectivity:
-                    occupied = False
-                    for robot in self.graph.agents:
-                        z_idx = self.get_z_idx(robot, v0, t)
-                        if solution["x"][z_idx] == 1:
-                            occupied = True
-                    if occupied == True and (v0, t) not in S:
-                        S.append((v0, t))
-                idx += 1
-
-            valid = True
-            for b in self.src:
-                if (self.graph.agents[b], 0) not in S:
-                    valid = False
-            if valid == False:
-                add_S.append(S)
-            
-        if len(add_S) != 0:
-            return False, add_S
-        else:
-            return True, add_S
+            # Backwards reachability from the end position of agent r
+            frontier = self.T * V + np.flatnonzero(z[self.T, :, self.dict_agent[r]])
+            visited = np.zeros(len(occupied), dtype=bool)
+            visited[frontier] = True
+            S = [frontier]
+            while len(frontier) > 0:
+                frontier = np.unique(pred[frontier].indices)
+                frontier = frontier[occupied[frontier] & ~visited[frontier]]
+                visited[frontier] = True
+                S.append(frontier)
+
+            if not np.all(visited[src]):
+                t, v = np.divmod(np.hstack(S), V)
+                add_S.append([(nodes[v_], int(t_)) for v_, t_ in zip(v, t)])
+
+        return len(add_S) == 0, add_S
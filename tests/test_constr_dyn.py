@@ -0,0 +1,60 @@
+from itertools import product
+
+import numpy as np
+
+from cops.graph import Graph
+from cops.problem import ConnectivityProblem
+from cops.constr_dyn import _dynamic_constraint_30, _dynamic_constraint_46
+
+
+def get_problem():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_transition_path([1, 4])
+    G.add_connectivity_path([0, 1, 2, 3])
+    G.init_agents({0: 0, 1: 2, 2: 4})
+
+    cp = ConnectivityProblem(graph=G)
+    cp.T = 3
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+    return cp
+
+
+def test_dynamic_constraint_46():
+    cp = get_problem()
+
+    # row (t, v, r): z(r, v, t + 1) - sum of xf over in-edges of v
+    rows = []
+    for t, v, r in product(range(cp.T), cp.graph.nodes, cp.graph.agents):
+        row = np.zeros(cp.num_vars)
+        row[cp.get_z_idx(r, v, t + 1)] = 1
+        for i, j in cp.graph.tran_in_edges(v):
+            row[cp.get_xf_idx(r, i, j, t)] = -1
+        rows.append(row)
+
+    A = _dynamic_constraint_46(cp).A_eq.toarray()
+    np.testing.assert_equal(A, np.array(rows))
+
+    # a window of transition times
+    A = _dynamic_constraint_46(cp, range(1, 2)).A_eq.toarray()
+    n = cp.num_v * cp.num_r
+    np.testing.assert_equal(A, np.array(rows[n : 2 * n]))
+
+
+def test_dynamic_constraint_30():
+    cp = get_problem()
+    cp.src = [0]
+    cp.setup_powerset_variables()
+
+    # row (t, v, r): z(r, v, t) - sum of z(r, w, t + 1) over out-edges (v, w)
+    rows = []
+    for t, v, r in product(range(cp.T), cp.graph.nodes, cp.graph.agents):
+        row = np.zeros(cp.num_vars)
+        row[cp.get_z_idx(r, v, t)] = 1
+        for i, j in cp.graph.tran_out_edges(v):
+            row[cp.get_z_idx(r, j, t + 1)] -= 1
+        rows.append(row)
+
+    A = _dynamic_constraint_30(cp).A_iq.toarray()
+    np.testing.assert_equal(A, np.array(rows))
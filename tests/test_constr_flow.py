@@ -0,0 +1,152 @@
+from itertools import product
+
+import numpy as np
+
+from cops.graph import Graph
+from cops.problem import ConnectivityProblem
+from cops.constr_flow import (
+    _dynamic_constraint_48,
+    _dynamic_constraint_52_53,
+    _dynamic_constraint_outflow_bound,
+)
+
+
+def get_problem(src, snk):
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_transition_path([1, 4])
+    G.add_connectivity_path([0, 1, 2, 3])
+    G.add_connectivity_path([0, 4])
+    G.init_agents({0: 0, 1: 2, 2: 4, 3: 3})
+
+    cp = ConnectivityProblem(graph=G, master=[0])
+    cp.src = src
+    cp.snk = snk
+    cp.T = 3
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+    return cp
+
+
+def assert_coo_equal(A, row, col, data):
+    np.testing.assert_equal(A.row, row)
+    np.testing.assert_equal(A.col, col)
+    np.testing.assert_equal(A.data, data)
+
+
+def test_dynamic_constraint_48():
+    cp = get_problem([0], [1, 2, 3])
+    N = cp.num_r
+
+    row, col, data = [], [], []
+    i = 0
+    for end in [0, 1]:
+        for t, b, e in product(range(cp.T + 1), range(1), cp.graph.conn_edges()):
+            row.append(i)
+            col.append(cp.get_fbar_idx(b, e[0], e[1], t))
+            data.append(1)
+            for r in cp.graph.agents:
+                row.append(i)
+                col.append(cp.get_z_idx(r, e[end], t))
+                data.append(-N)
+            i += 1
+
+    assert_coo_equal(_dynamic_constraint_48(cp).iq_blocks[0][1], row, col, data)
+
+
+def test_dynamic_constraint_52_53():
+    for src, snk in [([0], [1, 2, 3]), ([1, 2, 3], [0])]:
+        cp = get_problem(src, snk)
+
+        row, col, data = [], [], []
+        for i, (t, v, (b, b_r)) in enumerate(
+            product(range(cp.T + 1), cp.graph.nodes, enumerate(cp.min_src_snk))
+        ):
+            entries = []
+            if t > 0:
+                entries += [
+                    (cp.get_f_idx(b, *e, t - 1), 1) for e in cp.graph.tran_in_edges(v)
+                ]
+            entries += [
+                (cp.get_fbar_idx(b, *e, t), 1) for e in cp.graph.conn_in_edges(v)
+            ]
+            if t < cp.T:
+                entries += [
+                    (cp.get_f_idx(b, *e, t), -1) for e in cp.graph.tran_out_edges(v)
+                ]
+            entries += [
+                (cp.get_fbar_idx(b, *e, t), -1) for e in cp.graph.conn_out_edges(v)
+            ]
+            if len(src) <= len(snk):
+                if t == 0:
+                    entries += [(cp.get_z_idx(b_r, v, t), len(snk))]
+                elif t == cp.T:
+                    entries += [(cp.get_z_idx(r, v, t), -1) for r in snk]
+            else:
+                if t == 0:
+                    entries += [(cp.get_z_idx(r, v, t), 1) for r in src]
+                elif t == cp.T:
+                    entries += [(cp.get_z_idx(b_r, v, t), -len(src))]
+            row += [i] * len(entries)
+            col += [c for c, _ in entries]
+            data += [d for _, d in entries]
+
+        assert_coo_equal(_dynamic_constraint_52_53(cp).eq_blocks[0][1], row, col, data)
+
+
+def test_dynamic_constraint_outflow_bound():
+    cp = get_problem([0], [1, 2, 3])
+    N = cp.num_r
+
+    def master_balance(v, tau):
+        entries = []
+        if tau > 0:
+            entries += [
+                (cp.get_m_idx(*e, tau - 1), -N) for e in cp.graph.tran_in_edges(v)
+            ]
+        entries += [(cp.get_mbar_idx(*e, tau), -N) for e in cp.graph.conn_in_edges(v)]
+        if tau < cp.T:
+            entries += [(cp.get_m_idx(*e, tau), N) for e in cp.graph.tran_out_edges(v)]
+        entries += [(cp.get_mbar_idx(*e, tau), N) for e in cp.graph.conn_out_edges(v)]
+        return entries
+
+    row, col, data = [], [], []
+    i = 0
+    for r, t in product([1, 2, 3], range(cp.T + 1)):
+        v0 = cp.graph.agents[r]
+        entries = sum([master_balance(v0, tau) for tau in range(t + 1)], [])
+        entries += [(cp.get_fbar_idx(0, *e, t), 1) for e in cp.graph.conn_out_edges(v0)]
+        row += [i] * len(entries)
+        col += [c for c, _ in entries]
+        data += [d for _, d in entries]
+        i += 1
+
+    assert_coo_equal(
+        _dynamic_constraint_outflow_bound(cp).iq_blocks[0][1], row, col, data
+    )
+
+
+def test_cumulative_master():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_connectivity_path([0, 1, 2, 3])
+    G.set_frontiers({1: 1})
+    G.init_agents({0: 0, 1: 2, 2: 3})
+
+    for frontier_reward in [False, True]:
+        sol = {}
+        for cumulative_master in [False, True]:
+            cp = ConnectivityProblem(
+                graph=G, master=0, cumulative_master=cumulative_master
+            )
+            cp.src = [2]
+            cp.snk = [1]
+            cp.T = 5
+            sol[cumulative_master] = cp.solve_flow(
+                frontier_reward=frontier_reward, master=True, solver="highs"
+            )
+
+        np.testing.assert_equal(sol[True]["status"], "optimal")
+        np.testing.assert_almost_equal(
+            sol[True]["primal objective"], sol[False]["primal objective"]
+        )
@@ -0,0 +1,45 @@
+import numpy as np
+
+from cops.graph import Graph
+from cops.problem import ConnectivityProblem
+from cops.constr_powerset import (
+    generate_connectivity_constraint_all,
+    separate_connectivity_constraint,
+)
+
+
+def test_separate_connectivity_constraint():
+    G = Graph()
+    G.add_transition_path([0, 1, 2])
+    G.add_transition_path([1, 3])
+    G.add_connectivity_path([0, 1, 2])
+    G.add_connectivity_path([0, 3])
+    G.init_agents({0: 0, 1: 2})
+
+    cp = ConnectivityProblem(graph=G)
+    cp.T = 2
+    cp.src = [0, 1]
+    cp.prepare_problem()
+    cp.setup_powerset_variables()
+
+    enumerated = generate_connectivity_constraint_all(cp)
+
+    rng = np.random.default_rng(0)
+    for trial in range(100):
+        x = np.zeros(cp.num_vars)
+        for name in ["x", "xbar", "yb"]:
+            var = cp.vars[name]
+            val = rng.random(var.size) * (rng.random(var.size) > 0.4)
+            if trial % 2:
+                val = np.round(val)
+            x[var.start : var.start + var.size] = val
+
+        cuts = separate_connectivity_constraint(cp, x)
+        violation = cuts.A_iq @ x - cuts.b_iq
+
+        # only violated rows, and some iff an enumerated row is violated
+        np.testing.assert_array_less(1e-6, violation)
+        np.testing.assert_equal(
+            len(violation) > 0,
+            np.max(enumerated.A_iq @ x - enumerated.b_iq) > 1e-6,
+        )
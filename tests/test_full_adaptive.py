@@ -93,3 +93,54 @@ def test_horiz2():
         np.testing.assert_equal(cp.traj[2, 0], 3)
         np.testing.assert_equal(cp.traj[2, 1], 3)
         np.testing.assert_equal(cp.traj[2, 2], 3)
+
+
+def test_lazy_highs():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_connectivity_path([0, 1, 2, 3])
+    G.init_agents({0: 0, 1: 1, 2: 3})
+
+    traj = {}
+    for lazy in [False, True]:
+        cp = ConnectivityProblem(graph=G)
+        cp.T = 2
+        cp.src = [2]
+        cp.static_agents = [0, 2]
+        cp.solve_adaptive(lazy=lazy, solver="highs")
+        traj[lazy] = cp.traj
+
+    np.testing.assert_equal(traj[True], traj[False])
+    np.testing.assert_equal(traj[True][1, 1], 2)
+
+
+def test_test_solution():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_connectivity_path([0, 1, 2, 3])
+    G.init_agents({0: 0, 1: 1, 2: 3})
+
+    cp = ConnectivityProblem(graph=G)
+    cp.T = 1
+    cp.src = [2]
+    cp.prepare_problem()
+    cp.setup_powerset_variables()
+
+    # all agents stay, node 2 is never occupied
+    x = np.zeros(cp.num_vars)
+    for r, v in G.agents.items():
+        x[cp.get_z_idx(r, v, 0)] = 1
+        x[cp.get_z_idx(r, v, 1)] = 1
+
+    valid, add_S = cp.test_solution({"x": x})
+    assert not valid
+    S = {(0, 0), (0, 1), (1, 0), (1, 1)}
+    np.testing.assert_equal([set(S_r) for S_r in add_S], [S, S])
+
+    # agent 1 moves to node 2 and connects itself and agent 2, but not agent 0
+    x[cp.get_z_idx(1, 1, 1)] = 0
+    x[cp.get_z_idx(1, 2, 1)] = 1
+
+    valid, add_S = cp.test_solution({"x": x})
+    assert not valid
+    np.testing.assert_equal([set(S_r) for S_r in add_S], [{(0, 0), (0, 1), (1, 0)}])
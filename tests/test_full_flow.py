@@ -1,16 +1,23 @@
+from itertools import product
+
 import numpy as np
+import pytest
 
 from cops.graph import Graph
 from cops.problem import ConnectivityProblem
 
+
 def import_gurobi():
     try:
         import gurobipy
+
         return True
     except ModuleNotFoundError as e:
         return False
 
-def test_horiz1():
+
+@pytest.mark.parametrize("solver", ["gurobi", "highs"])
+def test_horiz1(solver):
     G = Graph()
     connectivity_edges = [0, 1, 2, 3]  # directed connectivity path (one way)
     transition_edges = [0, 1, 2, 3]  # directed transition path (one way)
@@ -35,8 +42,8 @@ def test_horiz1():
 
     cp.static_agents = [2]
 
-    if import_gurobi():
-        cp.solve_flow()
+    if solver == "highs" or import_gurobi():
+        cp.solve_flow(solver=solver)
 
         # positions of robot 0
         np.testing.assert_equal(cp.traj[0, 0], 0)
@@ -93,3 +100,201 @@ def test_horiz2():
         np.testing.assert_equal(cp.traj[2, 0], 3)
         np.testing.assert_equal(cp.traj[2, 1], 3)
         np.testing.assert_equal(cp.traj[2, 2], 3)
+
+
+def test_warm_start():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_connectivity_path([0, 1, 2, 3])
+    G.init_agents({0: 0, 1: 1, 2: 3})
+
+    cp = ConnectivityProblem(graph=G, static_agents=[2])
+    cp.src = [2]
+    cp.T = 1
+    cp.solve_flow(solver="highs")
+
+    # the stored solution padded with a stay step is the start for T = 2
+    cp.T = 2
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+    x0 = cp.generate_flow_warm_start()
+    for r in cp.graph.agents:
+        for t in range(cp.T + 1):
+            v = cp.traj[r, min(t, cp.T_sol)]
+            np.testing.assert_equal(x0[cp.get_z_idx(r, v, t)], 1)
+        np.testing.assert_equal(x0[cp.get_xf_idx(r, v, v, cp.T - 1)], 1)
+    np.testing.assert_equal(np.isnan(x0[cp.vars["y"].start]), True)
+
+    sol = cp.solve_flow(solver="highs")
+    np.testing.assert_equal(sol["status"], "optimal")
+
+    cp.warm_start = False
+    np.testing.assert_equal(cp.generate_flow_warm_start(), None)
+
+
+def test_prune_unreachable():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3, 4])
+    G.add_connectivity_path([0, 1, 2, 3, 4])
+    G.init_agents({0: 0, 1: 4})
+
+    cp = ConnectivityProblem(graph=G, final_position={1: 3})
+    cp.T = 2
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+
+    reach = cp.reachable_z()
+    # agent 0 can only reach nodes within t steps of node 0
+    np.testing.assert_equal(
+        reach[:, 0, :], [[1, 0, 0, 0, 0], [1, 1, 0, 0, 0], [1, 1, 1, 0, 0]]
+    )
+    # agent 1 must also reach node 3 at T
+    np.testing.assert_equal(
+        reach[:, 1, :], [[0, 0, 0, 0, 1], [0, 0, 0, 1, 1], [0, 0, 0, 1, 0]]
+    )
+
+    J_zero = cp.unreachable_flow_vars()
+    assert cp.get_z_idx(0, 2, 1) in J_zero
+    assert cp.get_z_idx(0, 2, 2) not in J_zero
+    assert cp.get_xf_idx(1, 4, 4, 1) in J_zero
+    assert cp.get_xf_idx(1, 4, 3, 1) not in J_zero
+
+    sol = {}
+    for prune_unreachable in [False, True]:
+        cp = ConnectivityProblem(
+            graph=G, final_position={1: 3}, prune_unreachable=prune_unreachable
+        )
+        cp.T = 3
+        sol[prune_unreachable] = cp.solve_flow(frontier_reward=False, solver="highs")
+    np.testing.assert_equal(sol[True]["status"], "optimal")
+    np.testing.assert_almost_equal(
+        sol[True]["primal objective"], sol[False]["primal objective"]
+    )
+    np.testing.assert_almost_equal(sol[True]["x"], sol[False]["x"])
+
+
+def test_variable_layout():
+    G = Graph()
+    G.add_transition_path([0, 1, 2])
+    G.add_connectivity_path([0, 2])
+    G.init_agents({0: 0, 1: 2})
+
+    cp = ConnectivityProblem(graph=G)
+    cp.T = 2
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+    layout = cp.layout
+
+    z = layout.tensor("z")
+    np.testing.assert_equal(z.shape, (cp.T + 1, cp.num_v, cp.num_r))
+    for t, v, r in product(range(cp.T + 1), G.nodes, G.agents):
+        np.testing.assert_equal(
+            z[t, cp.dict_node[v], cp.dict_agent[r]], cp.get_z_idx(r, v, t)
+        )
+
+    # index functions broadcast integer ids
+    t = np.arange(cp.T + 1)[:, None]
+    k = np.arange(len(cp.dict_conn))
+    np.testing.assert_equal(layout.idx("fbar", t, 1, k), layout.tensor("fbar")[:, 1, :])
+    for (i, j), kk in cp.dict_tran.items():
+        np.testing.assert_equal(
+            layout.idx("xf", 1, cp.dict_agent[1], kk), cp.get_xf_idx(1, i, j, 1)
+        )
+
+    x = np.arange(cp.num_vars)
+    np.testing.assert_equal(layout.block(x, "m"), layout.tensor("m"))
+    np.testing.assert_equal(layout.num_vars, cp.num_vars)
+
+
+def test_cut_solution():
+    G = Graph()
+    G.add_transition_path([0, 1, 2])
+    G.add_connectivity_path([0, 1, 2])
+    G.init_agents({0: 0, 1: 2})
+
+    cp = ConnectivityProblem(graph=G)
+    cp.T = 4
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+
+    # agent 0 moves 0 -> 1 at t = 2, agent 1 stays at 2
+    path = {0: [0, 0, 1, 1, 1], 1: [2, 2, 2, 2, 2]}
+    x = np.zeros(cp.num_vars)
+    for r, t in product(G.agents, range(cp.T + 1)):
+        x[cp.get_z_idx(r, path[r][t], t)] = 1
+
+    cp.cut_solution({"x": x})
+    np.testing.assert_equal(cp.T_sol, 2)
+    traj = cp.solution_traj({"x": x}, cp.T_sol)
+    np.testing.assert_equal(
+        traj, {(r, t): path[r][t] for r, t in product(G.agents, range(3))}
+    )
+
+    cp.cut_solution({"x": np.zeros(cp.num_vars)})
+    np.testing.assert_equal(cp.T_sol, 0)
+
+
+def test_flow_objective():
+    G = Graph()
+    G.add_transition_path([0, 1, 2], w=2)
+    G.add_connectivity_path([0, 2])
+    G.set_frontiers({1: 2, 2: 1})
+    G.init_agents({0: 0, 1: 2})
+
+    cp = ConnectivityProblem(graph=G, reward_dict={0: 3})
+    cp.T = 2
+    cp.prepare_problem()
+    cp.setup_flow_variables()
+    obj = cp.generate_flow_objective(True)
+
+    for t, r in product(range(cp.T), G.agents):
+        np.testing.assert_equal(obj[cp.get_xf_idx(r, 0, 1, t)], 1.01**t * 2)
+        np.testing.assert_equal(obj[cp.get_xf_idx(r, 1, 1, t)], 0)
+    for t, b in product(range(cp.T + 1), range(cp.num_min_src_snk)):
+        np.testing.assert_equal(obj[cp.get_fbar_idx(b, 2, 0, t)], 1.01**t * 0.01)
+        np.testing.assert_equal(obj[cp.get_mbar_idx(2, 0, t)], 1.01**t * 0.01)
+
+    np.testing.assert_equal(obj[cp.get_y_idx(0, 1)], -3)
+    np.testing.assert_equal(obj[cp.get_y_idx(1, 1)], -cp.frontier_reward)
+    np.testing.assert_equal(
+        obj[cp.get_y_idx(2, 2)], -cp.frontier_reward_decay * cp.frontier_reward / 2
+    )
+
+
+def test_aggregate_agents():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3, 4])
+    G.add_transition_path([1, 5, 6])
+    G.add_connectivity_path([0, 1, 2, 3, 4])
+    G.add_connectivity_path([1, 5, 6])
+    G.set_frontiers({3: 1, 4: 1, 6: 1})
+    G.init_agents({0: 0, 1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+
+    for master in [False, True]:
+        sol = {}
+        for aggregate_agents in [False, True]:
+            cp = ConnectivityProblem(
+                graph=G, static_agents=[0], aggregate_agents=aggregate_agents
+            )
+            cp.T = 4
+            cp.src = [0]
+            cp.snk = [0]
+            cp.master = 0
+            sol[aggregate_agents] = cp.solve_flow(master=master, solver="highs")
+
+            # decoded trajectories follow transition edges
+            for r, t in product(G.agents, range(cp.T_sol)):
+                assert (cp.traj[r, t], cp.traj[r, t + 1]) in cp.dict_tran
+
+        np.testing.assert_equal(cp.agent_units, [[0], [1, 2, 3], [4, 5]])
+        np.testing.assert_equal(cp.vars["z"].binary, False)
+        np.testing.assert_almost_equal(
+            sol[True]["primal objective"], sol[False]["primal objective"]
+        )
+
+    # the powerset formulation has one variable per agent
+    try:
+        cp.solve_powerset(solver="highs")
+        assert False
+    except Exception as e:
+        assert "aggregate_agents" in str(e)
@@ -71,3 +71,141 @@ def test_pre():
     np.testing.assert_equal(G.pre_conn([0, 2]), set([1, 3]))
 
     np.testing.assert_equal(G.post_conn([0, 1, 2, 3]), set([2, 0]))
+
+
+def test_edge_index():
+    G = Graph()
+    G.add_transition_path(["a", "b", "c"])
+    G.add_connectivity_path(["a", "c"])
+    G.add_transition_path(["c", "a"])
+
+    def scan(edges, edge_type):
+        return [(i, j) for i, j, data in edges if data["type"] == edge_type]
+
+    for edge_type in ["transition", "connectivity"]:
+        index = G.edge_index(edge_type)
+        np.testing.assert_equal(index.edges, scan(G.edges(data=True), edge_type))
+        for v in G.nodes:
+            np.testing.assert_equal(
+                index.out_edges(v), scan(G.out_edges(v, data=True), edge_type)
+            )
+            np.testing.assert_equal(
+                index.in_edges(v), scan(G.in_edges(v, data=True), edge_type)
+            )
+        for k, (i, j) in enumerate(index.edges):
+            np.testing.assert_equal(index.edge_id[(i, j)], k)
+            np.testing.assert_equal(index.ends[k], [index.node_id[i], index.node_id[j]])
+            assert index.adjacency[index.node_id[i], index.node_id[j]] == 1
+            assert index.out_incidence[index.node_id[i], k] == 1
+            assert index.in_incidence[index.node_id[j], k] == 1
+
+    assert G.has_tran_edge("a", "c") and not G.has_conn_edge("a", "b")
+
+    # the index is rebuilt after the graph is modified
+    index = G.edge_index("transition")
+    assert G.edge_index("transition") is index
+    G.remove_node("c")
+    assert not G.has_tran_edge("a", "c")
+    np.testing.assert_equal(list(G.tran_out_edges("a")), [("a", "b"), ("a", "a")])
+    np.testing.assert_equal(G.edge_index("connectivity").num_edges, 0)
+
+
+def test_bulk_construction():
+    paths = [[0, 1, 2, 3], [1, 4, 5], [5, 6]]
+
+    G1 = Graph()
+    for path in paths:
+        G1.add_transition_path(path)
+        G1.add_connectivity_path(path)
+
+    G2 = Graph()
+    pairs = [(i, j) for path in paths for i, j in zip(path[:-1], path[1:])]
+    G2.add_transition_edges(np.array(pairs))
+    G2.add_connectivity_edges(pairs)
+
+    def edge_set(G):
+        return sorted((i, j, d["type"], d["weight"]) for i, j, d in G.edges(data=True))
+
+    np.testing.assert_equal(edge_set(G2), edge_set(G1))
+
+    # 3x3 grid with a blocked center cell
+    occupancy = np.zeros((3, 3))
+    occupancy[1, 1] = 1
+    G = Graph()
+    G.add_grid(occupancy, conn_dist=1.5, tran_w=2)
+    np.testing.assert_equal(sorted(G.nodes), [0, 1, 2, 3, 5, 6, 7, 8])
+    np.testing.assert_equal((G.nodes[5]["x"], G.nodes[5]["y"]), (2, 1))
+    np.testing.assert_equal(sorted(G.tran_out_edges(0)), [(0, 0), (0, 1), (0, 3)])
+    np.testing.assert_equal(
+        sorted(G.conn_out_edges(1)), [(1, 0), (1, 2), (1, 3), (1, 5)]
+    )
+    np.testing.assert_equal(G.number_of_tran_edges(), 8 + 2 * 8)
+    np.testing.assert_equal(G.edges[0, 1, 0]["weight"], 2)
+    np.testing.assert_equal(G.edges[0, 0, 0]["weight"], 0)
+
+
+def test_induced_edges():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3])
+    G.add_connectivity_path([0, 2, 3])
+
+    np.testing.assert_equal(G.number_of_tran_edges(), 6 + 4)
+    np.testing.assert_equal(G.number_of_tran_edges([0, 1, 5]), 2 + 2)
+    np.testing.assert_equal(G.number_of_conn_edges([0, 1, 3]), 0)
+    np.testing.assert_equal(
+        G.number_of_induced_edges([[0, 2], [2, 3], [], [1, 2, 3]], "connectivity"),
+        [2, 2, 0, 2],
+    )
+
+
+def test_adjacency_matrix():
+    G = Graph()
+    G.add_transition_path(["a", "b", "c"], w=2)
+    G.add_transition_path(["a", "b"], w=1)
+    G.add_connectivity_path(["c", "a"])
+
+    A, node_id = G.transition_adjacency_matrix(sparse=True)
+    a, b, c = (node_id[v] for v in "abc")
+    np.testing.assert_equal(A.shape, (3, 3))
+    np.testing.assert_equal(A[a, b], 1)
+    np.testing.assert_equal(A[a, c], 0)
+    np.testing.assert_equal(A.nnz, 4 + 3)
+
+    # smallest weight of parallel edges, zero weight self loops are kept
+    W, _ = G.adjacency_matrix("transition", weighted=True)
+    np.testing.assert_equal(W[a, b], 1)
+    np.testing.assert_equal(W[b, c], 2)
+    np.testing.assert_equal(W.nnz, 7)
+
+    C, _ = G.connectivity_adjacency_matrix(sparse=True, weighted=True)
+    np.testing.assert_equal(C[c, a], G.std_con_weight)
+    np.testing.assert_equal(C.nnz, 2)
+
+
+def test_distance_oracle():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3], w=2)
+    G.add_transition_path([0, 4, 3], w=0.5)
+    G.add_connectivity_path([1, 3])
+
+    hops = G.distance_oracle()
+    np.testing.assert_equal(hops.distance(0, 3), 2)
+    np.testing.assert_equal(
+        hops.lengths(3, reverse=True), {0: 2, 1: 2, 2: 1, 3: 0, 4: 1}
+    )
+
+    oracle = G.distance_oracle(weighted=True)
+    np.testing.assert_equal(oracle.distance(1, 3), 3)
+    np.testing.assert_equal(oracle.path(1, 3), [1, 0, 4, 3])
+    np.testing.assert_equal(oracle.nearest([0, 3], 2), (2, [3, 2]))
+    assert G.distance_oracle(weighted=True) is oracle
+
+    # connectivity edges count for the diameter
+    np.testing.assert_equal(G.diameter(), 2)
+    np.testing.assert_equal(G.diameter([0, 1, 2, 3]), 2)
+    np.testing.assert_equal(G.diameter([0, 1, 2, 3], ("transition",)), 3)
+
+    # the oracle is rebuilt after the graph is modified
+    G.remove_node(4)
+    np.testing.assert_equal(G.distance_oracle(weighted=True).distance(1, 3), 4)
+    np.testing.assert_equal(G.distance_oracle().all_pairs()[0], [0, 1, 2, 3])
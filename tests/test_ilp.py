@@ -1,7 +1,17 @@
 import numpy as np
 import scipy.sparse as sp
 
-from cops.optimization_wrappers import Constraint, solve_ilp
+import pytest
+
+from cops.optimization_wrappers import (
+    Constraint,
+    PersistentModel,
+    solve_ilp,
+    index_vtype,
+    CONTINUOUS,
+    INTEGER,
+    BINARY,
+)
 
 def import_gurobi():
     try:
@@ -44,3 +54,148 @@ def test_int_bin():
 
         sol_mix = solve_ilp(c, constr, [0], [1], solver="mosek")
         np.testing.assert_equal(sol_mix["x"], np.array([2, 1]))
+
+
+def test_int_bin_highs():
+    A_iq = sp.coo_matrix(np.array([[1, 0], [0, 1], [-1, 0], [0, -1]]))
+    b_iq = np.array([2.5, 2.5, 2.5, 2.5])
+
+    constr = Constraint(A_iq=A_iq, b_iq=b_iq)
+
+    c = np.array([-1, -1])
+
+    sol_int = solve_ilp(c, constr, [0, 1], [], solver="highs")
+    np.testing.assert_equal(sol_int["x"], np.array([2, 2]))
+    np.testing.assert_equal(sol_int["status"], "optimal")
+    np.testing.assert_almost_equal(sol_int["primal objective"], -4)
+
+    sol_bin = solve_ilp(c, constr, [], [0, 1], solver="highs")
+    np.testing.assert_equal(sol_bin["x"], np.array([1, 1]))
+
+    sol_mix = solve_ilp(c, constr, [0], [1], solver="highs")
+    np.testing.assert_equal(sol_mix["x"], np.array([2, 1]))
+
+
+def test_vtype_highs():
+    A_iq = sp.coo_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]]))
+    b_iq = np.array([2.5, 2.5, 2.5])
+
+    constr = Constraint(A_iq=A_iq, b_iq=b_iq)
+
+    c = np.array([-1, -1, -1])
+
+    vtype = np.array([INTEGER, BINARY, CONTINUOUS], dtype=np.uint8)
+    np.testing.assert_equal(index_vtype(3, [0], [1]), vtype)
+    np.testing.assert_equal(index_vtype(2), [INTEGER, INTEGER])
+    with pytest.raises(Exception):
+        index_vtype(3, [0, 1], [1])
+
+    sol = solve_ilp(c, constr, solver="highs", vtype=vtype)
+    np.testing.assert_almost_equal(sol["x"], np.array([2, 1, 2.5]))
+
+    # fixed variables are removed from the model
+    sol = solve_ilp(c, constr, solver="highs", vtype=vtype, J_zero=[1])
+    np.testing.assert_almost_equal(sol["x"], np.array([2, 0, 2.5]))
+
+
+def test_lazy_highs():
+    A_iq = sp.coo_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]]))
+    b_iq = np.array([2.5, 2.5, 2.5])
+
+    constr = Constraint(A_iq=A_iq, b_iq=b_iq)
+
+    c = np.array([-1, -2, -1])
+
+    # x0 + x1 <= 3, only added when violated
+    calls = []
+
+    def lazy(x):
+        calls.append(x)
+        if x[0] + x[1] <= 3:
+            return Constraint()
+        return Constraint(A_iq=sp.coo_matrix(np.array([[1, 1, 0]])), b_iq=[3])
+
+    sol = solve_ilp(c, constr, solver="highs", lazy=lazy)
+    np.testing.assert_equal(sol["x"], np.array([1, 2, 2]))
+    np.testing.assert_equal(len(calls), 2)
+
+    # lazy gets and returns all columns when variables are fixed to zero
+    calls = []
+    sol = solve_ilp(c, constr, solver="highs", lazy=lazy, J_zero=[2])
+    np.testing.assert_equal(sol["x"], np.array([1, 2, 0]))
+    np.testing.assert_equal(len(calls[0]), 3)
+
+
+def test_eq_infeasible_highs():
+    A_eq = sp.coo_matrix(np.array([[1, 1]]))
+    b_eq = np.array([1.5])
+
+    constr = Constraint(A_eq=A_eq, b_eq=b_eq)
+
+    c = np.array([1, 1])
+
+    sol = solve_ilp(c, constr, [0, 1], [], solver="highs")
+    np.testing.assert_equal(sol["status"], "infeasible")
+
+
+def test_constraint_blocks():
+    c1 = Constraint(
+        A_iq=sp.coo_matrix(np.array([[1, 0], [0, 1]])), b_iq=[1, 2], name="a"
+    )
+    c2 = Constraint(A_eq=sp.coo_matrix(np.array([[1, 1]])), b_eq=[3], name="b")
+    c3 = Constraint(A_iq=sp.coo_matrix(np.array([[1, 1]])), b_iq=[4], name="a")
+
+    constr = Constraint()
+    constr &= c1
+    constr &= c2 & c3
+
+    np.testing.assert_equal(constr.family_sizes(), {"a": (3, 4), "b": (1, 2)})
+
+    A_iq, b_iq, A_eq, b_eq = constr.assemble(2)
+    np.testing.assert_equal(A_iq.toarray(), np.array([[1, 0], [0, 1], [1, 1]]))
+    np.testing.assert_equal(b_iq, np.array([1, 2, 4]))
+    np.testing.assert_equal(A_eq.toarray(), np.array([[1, 1]]))
+    np.testing.assert_equal(b_eq, np.array([3]))
+
+    A_iq, b_iq, A_eq, b_eq = c2.assemble(2)
+    np.testing.assert_equal(A_iq.shape, (0, 2))
+
+
+def test_persistent_model_highs():
+    model = PersistentModel(solver="highs")
+    cols = model.add_vars(2, binary=False)
+
+    c = np.array([-1, -1])
+    model.add_constraint(
+        Constraint(A_iq=sp.coo_matrix(np.array([[1, 0]])), b_iq=np.array([2.5])),
+        cols,
+    )
+    model.add_constraint(
+        Constraint(A_iq=sp.coo_matrix(np.array([[0, 1]])), b_iq=np.array([2.5])),
+        cols,
+        group="terminal",
+    )
+    sol = model.solve(c, cols)
+    np.testing.assert_equal(sol["x"], np.array([2, 2]))
+    np.testing.assert_equal(model.group_sizes("terminal"), {None: 1})
+
+    # replace the terminal row and add a new variable
+    model.remove_group("terminal")
+    cols = np.hstack([cols, model.add_vars(1, binary=True)])
+    model.add_constraint(
+        Constraint(
+            A_iq=sp.coo_matrix(np.array([[0, 1, 0]])), b_iq=np.array([1]), name="bnd"
+        ),
+        cols,
+        group="terminal",
+    )
+    sol = model.solve(np.array([-1, -1, -1]), cols)
+    np.testing.assert_equal(sol["x"], np.array([2, 1, 1]))
+    np.testing.assert_equal(model.group_sizes("terminal"), {"bnd": 1})
+
+    # solve in a layout that skips the second column, the permanent row stays
+    model.remove_group("terminal")
+    np.testing.assert_equal(model.group_sizes("terminal"), {})
+    sol = model.solve(np.array([-1, -1]), cols[[0, 2]])
+    np.testing.assert_equal(sol["status"], "optimal")
+    np.testing.assert_equal(sol["x"], np.array([2, 1]))
@@ -0,0 +1,156 @@
+import numpy as np
+
+from cops.graph import Graph
+from cops.problem import ConnectivityProblem, INFEASIBLE_HORIZONS
+
+
+def get_problem():
+    G = Graph()
+    G.add_transition_path([0, 1, 2, 3, 4])
+    G.add_transition_path([2, 5, 6])
+    G.add_connectivity_path([0, 1, 2, 3, 4])
+    G.add_connectivity_path([2, 5, 6])
+    G.set_frontiers({})
+    G.init_agents({0: 0, 1: 4, 2: 6})
+
+    cp = ConnectivityProblem(graph=G, master=[0])
+    cp.src = [0]
+    cp.snk = [1, 2]
+    cp.final_position = {2: 5}
+    return cp
+
+
+def test_incremental_linear_search():
+    cp = get_problem()
+    sol = cp.linear_search_solve_flow(
+        master=True, frontier_reward=False, solver="highs", T_max=8
+    )
+    T, obj = cp.T, sol["primal objective"]
+
+    cp = get_problem()
+    sol = cp.linear_search_solve_flow(
+        master=True, frontier_reward=False, solver="highs", T_max=8, incremental=True
+    )
+    np.testing.assert_equal(cp.T, T)
+    np.testing.assert_almost_equal(sol["primal objective"], obj)
+    np.testing.assert_equal(cp.persistent_model, None)
+
+    # the final solution is a valid trajectory
+    for r in cp.graph.agents:
+        for t in range(cp.T_sol):
+            assert cp.traj[r, t + 1] == cp.traj[r, t] or cp.graph.has_edge(
+                cp.traj[r, t], cp.traj[r, t + 1]
+            )
+    np.testing.assert_equal(cp.traj[2, cp.T_sol], 5)
+
+
+def test_horizon_search():
+    horizons = {}
+    for search in ["linear", "bisect"]:
+        INFEASIBLE_HORIZONS.clear()
+        cp = get_problem()
+        solve_flow = cp.solve_flow
+        horizons[search] = []
+
+        def counting_solve_flow(**kwargs):
+            horizons[search].append(cp.T)
+            return solve_flow(**kwargs)
+
+        cp.solve_flow = counting_solve_flow
+        sol = cp.linear_search_solve_flow(
+            master=True, frontier_reward=False, solver="highs", search=search
+        )
+        assert sol["status"] == "optimal"
+        np.testing.assert_equal(cp.T_sol, cp.T)
+        np.testing.assert_equal(cp.traj[2, cp.T], 5)
+
+    # from the lower bound 2, galloping 2, 3, 5 then bisection on [4, 5]
+    np.testing.assert_equal(horizons["linear"], [2, 3, 4, 5])
+    np.testing.assert_equal(horizons["bisect"], [2, 3, 5, 4])
+    np.testing.assert_equal(cp.T, 5)
+
+    # proven infeasible horizons are not solved again
+    np.testing.assert_equal(INFEASIBLE_HORIZONS[cp.horizon_key(master=True)], 4)
+    horizons["bisect"] = []
+    cp.linear_search_solve_flow(
+        master=True, frontier_reward=False, solver="highs", search="bisect"
+    )
+    np.testing.assert_equal(horizons["bisect"], [5])
+
+
+def test_horizon_lower_bound():
+    cp = get_problem()
+    # agent 2 needs 2 steps to its final position 5
+    np.testing.assert_equal(cp.horizon_lower_bound(connectivity=False), 1)
+    np.testing.assert_equal(cp.horizon_lower_bound(), 2)
+
+    # information from node 0 reaches the static sink at node 4 at t = 3 at
+    # the earliest, when an agent can be at node 3
+    cp.final_position = None
+    cp.snk = [1]
+    cp.static_agents = [1]
+    np.testing.assert_equal(cp.horizon_lower_bound(), 3)
+
+    # a static sink that no other agent can reach
+    G = Graph()
+    G.add_transition_path([0, 1])
+    G.add_connectivity_path([0, 1])
+    G.add_connectivity_path([2, 3])
+    G.init_agents({0: 0, 1: 3})
+    cp = ConnectivityProblem(graph=G, src=[0], snk=[1], static_agents=[1])
+    np.testing.assert_equal(cp.horizon_lower_bound(), None)
+    try:
+        cp.linear_search_solve_flow(frontier_reward=False, solver="highs")
+        assert False
+    except Exception:
+        pass
+
+    # a static agent with a different final position
+    cp.final_position = {1: 2}
+    np.testing.assert_equal(cp.horizon_lower_bound(connectivity=False), None)
+
+
+def test_min_horizon():
+    for master in [False, True]:
+        cp = get_problem()
+        sol = cp.linear_search_solve_flow(
+            master=master, frontier_reward=False, solver="highs"
+        )
+        T, obj = cp.T, sol["primal objective"]
+
+        # one model with horizon 8 finishes at the same T
+        cp = get_problem()
+        sol = cp.min_horizon_solve_flow(
+            8, master=master, frontier_reward=False, solver="highs"
+        )
+        np.testing.assert_equal(sol["finish time"], T)
+        np.testing.assert_almost_equal(sol["primal objective"], obj)
+        np.testing.assert_equal(cp.T, 8)
+        assert cp.T_sol <= T
+        assert not cp.min_horizon
+
+        # agents stay after the finishing time
+        z = cp.layout.block(sol["x"], "z")
+        np.testing.assert_equal(z[T:], np.broadcast_to(z[T], z[T:].shape))
+
+
+def test_incremental_terminal_rows():
+    cp = get_problem()
+    cp.T = 1
+    cp.start_persistent_model("highs")
+    cp.solve_flow(master=True, frontier_reward=False, solver="highs")
+    sizes = cp.persistent_model.group_sizes("terminal")
+    assert sizes["final_position"] > 0 and sizes["58"] > 0
+
+    # terminal rows are replaced, not accumulated, when the horizon grows
+    cp.T = 2
+    cp.solve_flow(master=True, frontier_reward=False, solver="highs")
+    np.testing.assert_equal(cp.persistent_model.group_sizes("terminal"), sizes)
+
+    # the horizon can only grow
+    try:
+        cp.solve_flow(master=True, frontier_reward=False, solver="highs")
+        assert False
+    except Exception:
+        pass
+    cp.stop_persistent_model()